@@ -1,5 +1,8 @@
 import streamlit as st
-from utils.db_utils import init_db, initialize_session_state
+from utils.db_utils import init_db, initialize_session_state, load_setting
+from utils.http_pool import get_session_pool, DEFAULT_POOL_MAXSIZE, DEFAULT_KEEPALIVE_TIMEOUT
+from utils.retention import get_retention_manager, RETENTION_SETTING_KEY, DEFAULT_RETENTION_DAYS
+from utils.enhance_prompt import warm_up_tokenizer
 import pages.simple_qa
 import pages.chat
 import pages.settings
@@ -21,6 +24,18 @@ def main():
     init_db()
     initialize_session_state()
 
+    # 保存済みの接続プール設定をプロセス共有のプールに反映
+    get_session_pool().configure(
+        pool_maxsize=load_setting("http_pool_maxsize", DEFAULT_POOL_MAXSIZE),
+        keepalive_timeout=load_setting("http_keepalive_timeout", DEFAULT_KEEPALIVE_TIMEOUT)
+    )
+
+    # 保存期間を過ぎた履歴をバックグラウンドでアーカイブに移す（一定間隔ごと）
+    get_retention_manager().maybe_run(load_setting(RETENTION_SETTING_KEY, DEFAULT_RETENTION_DAYS))
+
+    # キーワード抽出用のトークナイザの辞書をバックグラウンドで読み込んでおく（初回の質問改善を待たせない）
+    warm_up_tokenizer()
+
     # サイドバーナビゲーション
     with st.sidebar:
         st.title("🤖 AI Assistant")
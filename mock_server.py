@@ -1,12 +1,16 @@
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware, DEFAULT_EXCLUDED_CONTENT_TYPES
+from starlette.datastructures import Headers, MutableHeaders
 from pydantic import BaseModel
 import uvicorn
 from typing import Optional, List, Dict, Any, Union
 import json
 import uuid
 from datetime import datetime
-import json
+import asyncio
+import gzip
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -36,8 +40,67 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+class RequestDecompressionMiddleware:
+    """gzip圧縮されたリクエストボディを展開し、対応形式をAccept-Encodingヘッダーで通知する"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_accept_encoding(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Accept-Encoding", "gzip")
+            await send(message)
+
+        encoding = Headers(scope=scope).get("content-encoding", "identity").lower()
+        if encoding == "identity":
+            await self.app(scope, receive, send_with_accept_encoding)
+            return
+        if encoding != "gzip":
+            response = JSONResponse({"detail": f"Unsupported Content-Encoding: {encoding}"}, status_code=415)
+            await response(scope, receive, send_with_accept_encoding)
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        body = gzip.decompress(body)
+        print(f"\nDecompressed request body: {len(body)} bytes")
+
+        headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        scope = {**scope, "headers": headers}
+
+        consumed = False
+
+        async def receive_decompressed():
+            nonlocal consumed
+            if not consumed:
+                consumed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, receive_decompressed, send_with_accept_encoding)
+
 app = FastAPI(title="Mock API Server")
 app.add_middleware(RequestLoggingMiddleware)
+app.add_middleware(RequestDecompressionMiddleware)
+# ストリーミング（NDJSON）はチャンクごとに届けるため圧縮しない
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1000,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",)
+)
 
 # メモリ内データストア
 threads: Dict[str, Dict] = {}  # スレッド情報
@@ -253,6 +316,86 @@ async def ask(request: AskRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MOCK_DATA_POINTS = [
+    "Azure OpenAI Service: 大規模言語モデルを活用した自然言語処理",
+    "Azure Cognitive Search: 高度な検索機能とAIによる文書理解",
+    "ハイブリッド検索: ベクトル検索とキーワード検索の組み合わせ"
+]
+
+def split_into_chunks(text: str, size: int = 8) -> List[str]:
+    """ストリーミング用に文字列を小さな断片に分割"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+async def ndjson_stream(first_chunk: Dict[str, Any], content: str, last_chunk: Optional[Dict[str, Any]] = None):
+    """NDJSON形式でチャンクを順に送信"""
+    yield json.dumps(first_chunk, ensure_ascii=False) + "\n"
+    for piece in split_into_chunks(content):
+        await asyncio.sleep(0.05)
+        yield json.dumps({"delta": {"role": "assistant", "content": piece}}, ensure_ascii=False) + "\n"
+    if last_chunk:
+        yield json.dumps(last_chunk, ensure_ascii=False) + "\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """/chat のストリーミング版（NDJSON）"""
+    last_user_message = request.messages[-1].content if request.messages else None
+    if not last_user_message:
+        raise HTTPException(status_code=400, detail="No user message found")
+
+    session_state = request.session_state or str(uuid.uuid4())
+    content = (
+        f"これは「{last_user_message}」に対するストリーミングのモック応答です。\n\n"
+        "1. 検索エンジンを使用してドキュメントを検索\n"
+        "2. 関連する情報を抽出して文脈を理解\n"
+        "3. ユーザーの質問に対する具体的な回答を生成\n\n"
+        "以下のドキュメントを参照しました。"
+    )
+    first_chunk = {
+        "delta": {"role": "assistant"},
+        "context": {
+            "data_points": MOCK_DATA_POINTS,
+            "thoughts": "質問を分析して関連ドキュメントを検索しました"
+        },
+        "session_state": session_state
+    }
+    last_chunk = {
+        "delta": {"role": "assistant"},
+        "context": {
+            "followup_questions": [
+                "Azure OpenAI Serviceの特徴について詳しく知りたいですか？",
+                "検索機能の具体的な実装方法を見てみましょうか？"
+            ]
+        }
+    }
+    return StreamingResponse(
+        ndjson_stream(first_chunk, content, last_chunk),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """/ask のストリーミング版（NDJSON）"""
+    content = (
+        f"これは「{request.question}」に対するストリーミングのモック応答です。\n\n"
+        f"検索設定：\n"
+        f"- アプローチ: {request.approach}\n"
+        f"- 検索モード: {request.overrides.get('retrieval_mode', 'hybrid')}\n"
+        f"- 上位件数: {request.overrides.get('top', 3)}\n\n"
+        "以下のドキュメントを参照しました。"
+    )
+    first_chunk = {
+        "data_points": MOCK_DATA_POINTS,
+        "thoughts": (
+            "1. 質問を分析して検索クエリを生成\n"
+            "2. 関連ドキュメントを検索して情報を抽出\n"
+            "3. 抽出した情報を基に回答を生成"
+        )
+    }
+    return StreamingResponse(
+        ndjson_stream(first_chunk, content),
+        media_type="application/x-ndjson"
+    )
+
 if __name__ == "__main__":
     import logging
     logging.basicConfig(level=logging.DEBUG)
@@ -9,9 +9,11 @@ from utils.db_utils import (
     save_chat_message,
     load_chat_threads,
     load_chat_messages,
-    delete_chat_thread
+    delete_chat_thread,
+    search_chat_messages
 )
 from utils.chat_backends.manager import ChatBackendManager
+from utils.api_utils import StreamCollector
 from datetime import datetime
 
 def initialize_chat_state():
@@ -98,59 +100,63 @@ def handle_chat_interaction(prompt):
         backend_manager = ChatBackendManager()
         current_backend = backend_manager.get_current_backend()
         
-        with st.spinner("応答を生成中..."):
-            response = current_backend.handle_chat(
-                messages_with_new,
-                st.session_state.chat_settings
-            )
-            
-            if "message" in response:
-                # Save messages
-                save_chat_message(thread_id, "user", prompt)
-                assistant_message = response["message"]
-                save_chat_message(
-                    thread_id,
-                    "assistant",
-                    assistant_message["content"],
-                    response.get("context", {})
+        # Stream the response into the assistant message as it arrives
+        collector = StreamCollector()
+        with st.chat_message("assistant"):
+            st.write_stream(collector.text_deltas(
+                current_backend.stream_chat(
+                    messages_with_new,
+                    st.session_state.chat_settings
                 )
-                update_thread_order(thread_id)
-                
-                # Display response
-                with st.chat_message("assistant"):
-                    st.markdown(assistant_message["content"])
-                    
-                    # Display reference information and thoughts
-                    context = response.get("context", {})
-                    if "data_points" in context and context["data_points"]:
-                        with st.expander("🔍 参照情報", expanded=False):
-                            for idx, data_point in enumerate(context["data_points"], 1):
-                                st.markdown(f"**{idx}.** {data_point}")
-                                if idx < len(context["data_points"]):
-                                    st.divider()
-
-                    if "thoughts" in context:
-                        with st.expander("💭 思考プロセス", expanded=False):
-                            st.write(context["thoughts"])
-
-                    # Display followup questions
-                    if "followup_questions" in context and context["followup_questions"]:
-                        st.markdown("**💭 関連する質問:**")
-                        for question in context["followup_questions"]:
-                            timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-                            if st.button(
-                                question,
-                                key=f"followup_{thread_id}_{hash(question)}_{timestamp}",
-                                use_container_width=True
-                            ):
-                                handle_chat_interaction(question)
-            
-            elif "error" in response:
-                st.error(f"エラー: {response['error']}")
+            ))
+        response = collector.chat_response()
+        
+        if "error" in response:
+            st.error(f"エラー: {response['error']}")
+        elif response["message"]["content"]:
+            # Save messages
+            save_chat_message(thread_id, "user", prompt)
+            assistant_message = response["message"]
+            save_chat_message(
+                thread_id,
+                "assistant",
+                assistant_message["content"],
+                response.get("context", {})
+            )
+            # Rerun to render the saved message with its context and followup questions
+            update_thread_order(thread_id)
     
     except Exception as e:
         st.error(f"エラーが発生しました: {str(e)}")
 
+def render_message_search():
+    """Render full-text search over chat messages"""
+    query = st.sidebar.text_input("🔍 メッセージを検索", key="chat_message_search").strip()
+    if not query:
+        return
+
+    try:
+        results = search_chat_messages(query)
+    except Exception as e:
+        st.sidebar.error(f"検索中にエラーが発生しました: {str(e)}")
+        return
+
+    if not results:
+        st.sidebar.caption("一致するメッセージがありません")
+        return
+
+    for i, result in enumerate(results):
+        role = "👤" if result["role"] == "user" else "🤖"
+        if st.sidebar.button(
+            f"{role} {result['thread_name']}",
+            key=f"search_result_{i}_{result['thread_id']}",
+            help=result["created_at"],
+            use_container_width=True
+        ):
+            st.session_state.current_thread_id = result["thread_id"]
+            st.rerun()
+        st.sidebar.caption(result["snippet"])
+
 def render_thread_sidebar():
     """Render thread management sidebar"""
     st.sidebar.title("💭 スレッド管理")
@@ -169,6 +175,8 @@ def render_thread_sidebar():
         </style>
     """, unsafe_allow_html=True)
     
+    render_message_search()
+
     # Thread list
     st.sidebar.markdown("### 会話一覧")
     threads = load_chat_threads()
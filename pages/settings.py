@@ -1,6 +1,15 @@
 import streamlit as st
-from utils.db_utils import save_urls, load_urls, get_saved_url_names
+from utils.db_utils import (
+    save_urls, load_urls, get_saved_url_names, save_setting, load_setting, get_db_writer, get_storage_stats
+)
 from utils.api_utils import is_valid_proxy_url
+from utils.http_pool import get_session_pool, get_single_flight, DEFAULT_POOL_MAXSIZE, DEFAULT_KEEPALIVE_TIMEOUT
+from utils.hedging import get_request_hedger
+from utils.compression import get_compression_negotiator
+from utils.proxy_pool import get_proxy_pool
+from utils.resilience import DEFAULT_RESILIENCE_SETTINGS, get_circuit_breakers
+from utils.retention import get_retention_manager, RETENTION_SETTING_KEY, DEFAULT_RETENTION_DAYS
+from utils.kwmatch import get_tokenizer_registry
 from utils.chat_backends.manager import ChatBackendManager
 
 def show():
@@ -27,10 +36,12 @@ def show():
         saved_urls = load_urls(selected_backend)
         initial_target_url = saved_urls.get("target_url", "") if saved_urls else ""
         initial_proxy_url = saved_urls.get("proxy_url", "") if saved_urls else ""
+        initial_proxy_pool = load_setting(f"proxy_pool_{selected_backend}", []) or []
     except Exception as e:
         st.error(f"URL設定の読み込みに失敗しました: {str(e)}")
         initial_target_url = ""
         initial_proxy_url = ""
+        initial_proxy_pool = []
     
     with st.form(f"url_settings_form_{selected_backend}", clear_on_submit=False):
         st.markdown("""
@@ -54,9 +65,23 @@ def show():
             placeholder="http://proxy.example.com"
         )
 
+        # 予備プロキシの入力フィールド
+        proxy_pool_text = st.text_area(
+            f"{selected_backend} の予備プロキシURL（1行に1つ・オプション）",
+            value="\n".join(initial_proxy_pool),
+            help="プロキシURLと合わせてヘルスチェックを行い、最も速い正常なプロキシを使用します。"
+                 "接続に失敗したプロキシは一定時間使用されません",
+            placeholder="http://proxy2.example.com"
+        )
+        proxy_pool = [line.strip().rstrip('/') for line in proxy_pool_text.splitlines() if line.strip()]
+
+        # タイムアウト・リトライ・サーキットブレーカーの設定
+        resilience = render_resilience_settings(selected_backend)
+
         # プロキシURLの形式チェック
-        if proxy_url and not is_valid_proxy_url(proxy_url):
-            st.error("プロキシURLの形式が正しくありません")
+        invalid_proxies = [url for url in [proxy_url] + proxy_pool if url and not is_valid_proxy_url(url)]
+        if invalid_proxies:
+            st.error(f"プロキシURLの形式が正しくありません: {', '.join(invalid_proxies)}")
             valid_proxy = False
         else:
             valid_proxy = True
@@ -77,7 +102,7 @@ def show():
                 st.error("ターゲットURLを入力してください")
                 return
             
-            if proxy_url and not valid_proxy:
+            if not valid_proxy:
                 st.error("プロキシURLの形式が正しくないため、保存できません")
                 return
 
@@ -91,6 +116,15 @@ def show():
                 try:
                     # バックエンド別の設定として保存
                     save_urls(selected_backend, target_url, proxy_url)
+                    save_setting(f"resilience_{selected_backend}", resilience)
+                    save_setting(f"proxy_pool_{selected_backend}", proxy_pool)
+                    if "backend_proxies" not in st.session_state:
+                        st.session_state.backend_proxies = {}
+                    st.session_state.backend_proxies[selected_backend] = proxy_pool
+                    get_proxy_pool().configure(target_url, [proxy_url] + proxy_pool)
+                    if "backend_resilience" not in st.session_state:
+                        st.session_state.backend_resilience = {}
+                    st.session_state.backend_resilience[selected_backend] = resilience
                     # セッション状態も更新
                     if "backend_urls" not in st.session_state:
                         st.session_state.backend_urls = {}
@@ -100,4 +134,323 @@ def show():
                     }
                     st.success(f"{selected_backend} のURL設定を保存しました")
                 except Exception as e:
-                    st.error(f"URL設定の保存に失敗しました: {str(e)}")
\ No newline at end of file
+                    st.error(f"URL設定の保存に失敗しました: {str(e)}")
+
+    show_connection_pool_settings()
+    show_db_writer_status()
+    show_retention_settings()
+    show_tokenizer_status()
+
+def render_resilience_settings(backend_id):
+    """バックエンドごとのタイムアウト・リトライ設定のウィジェットを表示し、入力値を返す"""
+    try:
+        saved = load_setting(f"resilience_{backend_id}", {}) or {}
+    except Exception as e:
+        st.error(f"通信設定の読み込みに失敗しました: {str(e)}")
+        saved = {}
+    current = {**DEFAULT_RESILIENCE_SETTINGS, **saved}
+
+    with st.expander("タイムアウト・リトライ設定", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            connect_timeout = st.number_input(
+                "接続タイムアウト（秒）", min_value=0.5, max_value=120.0,
+                value=float(current["connect_timeout"]), key=f"connect_timeout_{backend_id}"
+            )
+        with col2:
+            read_timeout = st.number_input(
+                "読み取りタイムアウト（秒）", min_value=1.0, max_value=600.0,
+                value=float(current["read_timeout"]), key=f"read_timeout_{backend_id}"
+            )
+        with col3:
+            deadline = st.number_input(
+                "全体の制限時間（秒）", min_value=1.0, max_value=1800.0,
+                value=float(current["deadline"]), key=f"deadline_{backend_id}",
+                help="リトライを含めたリクエスト全体の上限時間です"
+            )
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            max_retries = st.number_input(
+                "最大リトライ回数", min_value=0, max_value=10,
+                value=int(current["max_retries"]), key=f"max_retries_{backend_id}"
+            )
+        with col2:
+            backoff_base = st.number_input(
+                "バックオフ初期値（秒）", min_value=0.0, max_value=30.0,
+                value=float(current["backoff_base"]), key=f"backoff_base_{backend_id}"
+            )
+        with col3:
+            backoff_max = st.number_input(
+                "バックオフ上限（秒）", min_value=0.0, max_value=120.0,
+                value=float(current["backoff_max"]), key=f"backoff_max_{backend_id}"
+            )
+
+        retry_post = st.checkbox(
+            "POSTリクエストもリトライする", value=bool(current["retry_post"]),
+            key=f"retry_post_{backend_id}",
+            help="無効の場合、POSTは呼び出し側で明示的に許可されたもの（Simple Q&Aの/askなど）のみリトライします"
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            breaker_failure_threshold = st.number_input(
+                "ブレーカーが開く連続失敗回数", min_value=1, max_value=100,
+                value=int(current["breaker_failure_threshold"]), key=f"breaker_threshold_{backend_id}"
+            )
+        with col2:
+            breaker_reset_timeout = st.number_input(
+                "ブレーカーの復旧確認までの時間（秒）", min_value=1.0, max_value=3600.0,
+                value=float(current["breaker_reset_timeout"]), key=f"breaker_reset_{backend_id}"
+            )
+
+        hedge_enabled = st.checkbox(
+            "ヘッジリクエストを有効にする", value=bool(current["hedge_enabled"]),
+            key=f"hedge_enabled_{backend_id}",
+            help="リトライ可能なリクエストの応答が遅い場合に、同じリクエストをもう1本送って先に返った方を使います"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            hedge_percentile = st.number_input(
+                "ヘッジを送るまでの待ち時間（直近レイテンシのパーセンタイル）", min_value=50.0, max_value=99.9,
+                value=float(current["hedge_percentile"]), key=f"hedge_percentile_{backend_id}"
+            )
+        with col2:
+            hedge_max_ratio = st.number_input(
+                "ヘッジの上限（全リクエストに対する割合）", min_value=0.0, max_value=1.0, step=0.01,
+                value=float(current["hedge_max_ratio"]), key=f"hedge_max_ratio_{backend_id}"
+            )
+
+        compress_requests = st.checkbox(
+            "リクエストボディを圧縮する", value=bool(current["compress_requests"]),
+            key=f"compress_requests_{backend_id}",
+            help="バックエンドがAccept-Encodingヘッダーで対応を通知した形式（gzip/br/zstd）で1KB以上のボディを圧縮します"
+        )
+
+    return {
+        "connect_timeout": float(connect_timeout),
+        "read_timeout": float(read_timeout),
+        "deadline": float(deadline),
+        "max_retries": int(max_retries),
+        "backoff_base": float(backoff_base),
+        "backoff_max": float(backoff_max),
+        "retry_post": bool(retry_post),
+        "breaker_failure_threshold": int(breaker_failure_threshold),
+        "breaker_reset_timeout": float(breaker_reset_timeout),
+        "hedge_enabled": bool(hedge_enabled),
+        "hedge_percentile": float(hedge_percentile),
+        "hedge_max_ratio": float(hedge_max_ratio),
+        "compress_requests": bool(compress_requests),
+    }
+
+@st.fragment(run_every=5)
+def show_proxy_status():
+    """プロキシのヘルスチェック結果の表示（5秒ごとに更新）"""
+    proxies = get_proxy_pool().snapshot()
+    if not proxies:
+        return
+
+    st.subheader("プロキシの状態")
+    rows = []
+    for target_url, states in proxies.items():
+        for state in states:
+            latency = state["latency_ms"]
+            rows.append({
+                "ターゲットURL": target_url,
+                "プロキシURL": state["proxy_url"],
+                "状態": "🟢 正常" if state["healthy"] else f"🔴 除外中（残り{state['ejected_for']:.0f}秒）",
+                "レイテンシ（ms）": f"{latency:.0f}" if latency is not None else "計測中",
+                "連続失敗回数": state["failures"],
+                "最後のエラー": state["last_error"]
+            })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def show_connection_pool_settings():
+    """HTTP接続プールの設定と統計の表示"""
+    st.header("HTTP接続プール")
+    pool = get_session_pool()
+
+    with st.form("connection_pool_form", clear_on_submit=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            pool_maxsize = st.number_input(
+                "ホストごとの最大コネクション数",
+                min_value=1,
+                max_value=100,
+                value=int(load_setting("http_pool_maxsize", DEFAULT_POOL_MAXSIZE)),
+                help="同一バックエンドに対して保持するkeep-aliveコネクションの上限です"
+            )
+        with col2:
+            keepalive_timeout = st.number_input(
+                "keep-aliveタイムアウト（秒）",
+                min_value=1.0,
+                max_value=3600.0,
+                value=float(load_setting("http_keepalive_timeout", DEFAULT_KEEPALIVE_TIMEOUT)),
+                help="この時間使われなかったセッションは閉じられます"
+            )
+
+        if st.form_submit_button("接続プール設定を保存", use_container_width=True):
+            try:
+                save_setting("http_pool_maxsize", int(pool_maxsize))
+                save_setting("http_keepalive_timeout", float(keepalive_timeout))
+                pool.configure(pool_maxsize=pool_maxsize, keepalive_timeout=keepalive_timeout)
+                st.success("接続プール設定を保存しました")
+            except Exception as e:
+                st.error(f"接続プール設定の保存に失敗しました: {str(e)}")
+
+    stats = pool.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("リクエスト数", stats["requests"])
+    col2.metric("新規コネクション数", stats["connections"])
+    col3.metric("コネクション再利用率", f"{stats['reuse_ratio']:.1%}")
+    col4.metric("オープン中のコネクション", stats["open_connections"])
+
+    flight_stats = get_single_flight().stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("上流へ送信した呼び出し", flight_stats["executed"])
+    col2.metric("集約された重複リクエスト", flight_stats["coalesced"])
+    col3.metric("実行中の呼び出し", flight_stats["in_flight"])
+
+    hedge_stats = get_request_hedger().stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("ヘッジ送信数", hedge_stats["hedges"])
+    col2.metric("ヘッジが先着した回数", hedge_stats["hedge_wins"])
+    col3.metric("追加負荷（ヘッジ率）", f"{hedge_stats['hedge_ratio']:.1%}")
+
+    compression = get_compression_negotiator().stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric(
+        "送信量（転送 / 展開後）",
+        f"{compression['request_wire_bytes'] / 1024:,.1f} / {compression['request_bytes'] / 1024:,.1f} KB",
+        f"-{compression['request_savings']:.1%}", delta_color="inverse"
+    )
+    col2.metric(
+        "受信量（転送 / 展開後）",
+        f"{compression['response_wire_bytes'] / 1024:,.1f} / {compression['response_bytes'] / 1024:,.1f} KB",
+        f"-{compression['response_savings']:.1%}", delta_color="inverse"
+    )
+    col3.metric("圧縮して送信したリクエスト", compression["compressed_requests"])
+    st.caption(f"利用可能なリクエスト圧縮形式: {', '.join(compression['encoders'])}")
+
+    show_proxy_status()
+
+    breakers = get_circuit_breakers().snapshot()
+    if breakers:
+        st.subheader("サーキットブレーカー")
+        states = {"closed": "🟢 正常", "open": "🔴 遮断中", "half_open": "🟡 復旧確認中"}
+        st.dataframe(
+            [
+                {
+                    "ターゲットURL": url,
+                    "状態": states.get(info["state"], info["state"]),
+                    "連続失敗回数": info["failures"],
+                    "遮断したリクエスト": info["rejected"]
+                }
+                for url, info in breakers.items()
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+
+def show_db_writer_status():
+    """履歴・チャットの書き込みキューの統計の表示"""
+    st.header("データベース書き込み")
+    stats = get_db_writer().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("キューの書き込み", f"{stats['queue_depth']} / {stats['queue_size']}")
+    col2.metric("最大キュー長", stats["max_queue_depth"])
+    col3.metric("コミット済み", stats["committed"])
+    col4.metric("失敗", stats["failed"])
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("平均バッチサイズ", f"{stats['avg_batch_size']:.1f}")
+    col2.metric("平均コミット時間", f"{stats['avg_commit_ms']:.1f} ms")
+    col3.metric(
+        "キュー満杯で待った回数",
+        stats["blocked"],
+        help=f"合計 {stats['blocked_seconds']:.2f} 秒"
+    )
+    col4.metric(
+        "読み込み前に待った回数",
+        stats["flush_waits"],
+        help=f"合計 {stats['flush_wait_seconds']:.2f} 秒、タイムアウト {stats['flush_timeouts']} 回"
+    )
+
+def show_retention_settings():
+    """履歴の保存期間とアーカイブの設定・状態の表示"""
+    st.header("履歴の保存期間")
+    manager = get_retention_manager()
+
+    with st.form("retention_form", clear_on_submit=False):
+        retention_days = st.number_input(
+            "ライブのDBに残す日数（0はアーカイブしない）",
+            min_value=0,
+            max_value=3650,
+            value=int(load_setting(RETENTION_SETTING_KEY, DEFAULT_RETENTION_DAYS)),
+            help="これより古い履歴は月ごとのアーカイブファイルに移され、履歴一覧では「アーカイブも含める」で表示できます"
+        )
+        if st.form_submit_button("保存期間を保存", use_container_width=True):
+            try:
+                save_setting(RETENTION_SETTING_KEY, int(retention_days))
+                st.success("保存期間を保存しました")
+            except Exception as e:
+                st.error(f"保存期間の保存に失敗しました: {str(e)}")
+
+    status = manager.status()
+    if st.button(
+        "今すぐアーカイブを実行",
+        disabled=status["running"] or int(retention_days) < 1,
+        use_container_width=True
+    ):
+        try:
+            with st.spinner("古い履歴をアーカイブに移しています..."):
+                result = manager.run(int(retention_days))
+            moved = sum(result["moved"].values())
+            st.success(f"{moved}件の履歴をアーカイブに移しました")
+            status = manager.status()
+        except Exception as e:
+            st.error(f"アーカイブに失敗しました: {str(e)}")
+
+    if status["running"]:
+        st.info("アーカイブを実行中です")
+    elif status["last_error"]:
+        st.warning(f"前回のアーカイブに失敗しました: {status['last_error']}")
+
+    storage = get_storage_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("ライブのDBのサイズ", f"{storage['live_bytes'] / 1024 / 1024:,.1f} MB")
+    col2.metric("ライブの履歴件数", storage["live_rows"])
+    col3.metric("アーカイブ", f"{len(storage['archives'])}ファイル")
+    if storage["archives"]:
+        st.dataframe(
+            [
+                {"月": archive["month"], "ファイル": archive["path"], "サイズ（MB）": f"{archive['bytes'] / 1024 / 1024:,.2f}"}
+                for archive in storage["archives"]
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+
+def show_tokenizer_status():
+    """キーワード抽出用トークナイザの読み込み時間と再利用回数の表示"""
+    st.header("トークナイザ")
+    stats = get_tokenizer_registry().stats()
+    if not stats:
+        st.caption("まだトークナイザは読み込まれていません")
+        return
+    st.dataframe(
+        [
+            {
+                "種類": item["tokenizer_type"],
+                "引数": ", ".join(f"{k}={v}" for k, v in item["tokenizer_args"].items()),
+                "状態": "準備完了" if item["ready"] else ("失敗" if item["error"] else "読み込み中"),
+                "読み込み時間（秒）": f"{item['build_seconds']:.2f}",
+                "使用回数": item["uses"],
+                "再利用回数": item["reuses"],
+                "エラー": item["error"]
+            }
+            for item in stats
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
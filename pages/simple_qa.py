@@ -1,13 +1,19 @@
 import streamlit as st
 import pandas as pd
 import json
+import os
 from utils.enhance_prompt import refine_query
 from utils.db_utils import (
-    load_requests_summary, delete_request, update_request_memo, save_request,
+    load_requests_summary, load_requests_page, search_requests, delete_request, update_request_memo, save_request,
+    REQUEST_METRIC_COLUMNS,
     save_post_data, load_post_data, get_saved_post_data_names,
     get_all_post_data, import_post_data, delete_post_data
 )
-from utils.api_utils import make_request
+from utils.api_utils import (
+    make_request, stream_request, StreamCollector, resolve_backend_urls, build_url, get_current_backend_id
+)
+from utils.response_cache import get_response_cache, make_cache_key
+from utils.history_export import EXPORT_FORMATS, available_export_formats, export_history
 from datetime import datetime
 
 from utils.chat_backends.manager import ChatBackendManager
@@ -283,6 +289,262 @@ def render_settings_panel():
                 except Exception as e:
                     st.error(f"設定のインポートに失敗しました: {str(e)}")
 
+def fetch_answer(data, bypass_cache=False):
+    """/ask に質問を送信して回答を取得する
+
+    同一ペイロード・同一URLの回答がキャッシュにあればそれを返す。
+    ストリーミングが有効な場合は受信しながら回答本文を表示する。
+
+    Args:
+        data (dict): create_qa_request で作成したペイロード
+        bypass_cache (bool): Trueの場合はキャッシュを参照せずに送信する
+
+    Returns:
+        tuple: (レスポンス, 回答本文を表示済みかどうか, 通信の付帯情報)
+    """
+    meta = {}
+    cache = get_response_cache()
+    base_url, _ = resolve_backend_urls()
+    url = build_url(base_url, "/ask") if base_url else ""
+    cache_key = make_cache_key(data, url)
+
+    if bypass_cache:
+        cache.record_bypass()
+    else:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            st.caption("⚡ キャッシュから回答を表示しています")
+            # 通信していないため、通信の付帯情報はすべて未計測（NULL）として保存する
+            return cached, False, dict.fromkeys(REQUEST_METRIC_COLUMNS)
+
+    # ストリーミング対応のバックエンドでは回答を逐次表示する
+    chunks = None
+    if st.session_state.get("stream_answer", True):
+        # /ask は副作用がないため、応答の遅いリクエストはヘッジしてよい
+        chunks = stream_request("POST", "/ask/stream", json.dumps(data), meta=meta, retryable=True)
+
+    if chunks is not None:
+        collector = StreamCollector()
+        st.markdown("### 💡 回答")
+        with st.expander("回答内容", expanded=True):
+            st.write_stream(collector.text_deltas(chunks))
+        response = collector.qa_response()
+    else:
+        # /ask は副作用がないため一時的なエラー時にリトライしてよい
+        response = make_request(
+            "POST",
+            "/ask",
+            json.dumps(data),
+            retryable=True,
+            meta=meta
+        )
+
+    if url:
+        cache.put(cache_key, url, response, status_code=meta.get("status_code"))
+    return response, chunks is not None, meta
+
+def render_cache_stats():
+    """レスポンスキャッシュの統計をサイドバーに表示"""
+    with st.sidebar.expander("🗄️ レスポンスキャッシュ", expanded=False):
+        cache = get_response_cache()
+        stats = cache.stats()
+        col1, col2 = st.columns(2)
+        col1.metric("ヒット", stats["hits"])
+        col2.metric("ミス", stats["misses"])
+        st.caption(
+            f"ヒット率 {stats['hit_ratio']:.1%}（メモリ {stats['memory_hits']} / "
+            f"SQLite {stats['sqlite_hits']}）・キャッシュ不使用 {stats['bypassed']}件"
+        )
+        if st.button("キャッシュをクリア", use_container_width=True):
+            try:
+                cache.clear()
+                st.success("キャッシュをクリアしました")
+            except Exception as e:
+                st.error(f"キャッシュのクリアに失敗しました: {str(e)}")
+
+# 履歴一覧の1ページの件数の選択肢
+HISTORY_PAGE_SIZES = [20, 50, 100, 200]
+
+def get_history_filters():
+    """履歴一覧の絞り込み条件の入力欄を表示し、load_requests_page に渡す条件を返す"""
+    backend_names = list(ChatBackendManager().get_available_backends().keys())
+    col1, col2, col3, col4, col5 = st.columns([3, 3, 2, 2, 2])
+    with col1:
+        filter_name = st.text_input("履歴を検索", key="filter_name")
+    with col2:
+        date_range = st.date_input("期間", value=(), key="history_date_range")
+    with col3:
+        status_text = st.text_input("ステータスコード", key="history_status_code")
+    with col4:
+        backend_id = st.selectbox("バックエンド", ["すべて"] + backend_names, key="history_backend")
+    with col5:
+        include_archives = st.checkbox(
+            "アーカイブも含める",
+            key="history_include_archives",
+            help="保存期間を過ぎてアーカイブに移した履歴も表示します（アーカイブの履歴はメモの編集・削除の対象外です）"
+        )
+
+    status_code = None
+    if status_text.strip():
+        try:
+            status_code = int(status_text.strip())
+        except ValueError:
+            st.warning("ステータスコードは数値で入力してください")
+
+    date_range = tuple(date_range) if isinstance(date_range, (list, tuple)) else (date_range,)
+    return {
+        "name_filter": filter_name.strip() or None,
+        "date_from": date_range[0] if len(date_range) > 0 else None,
+        "date_to": date_range[1] if len(date_range) > 1 else (date_range[0] if date_range else None),
+        "status_code": status_code,
+        "backend_id": None if backend_id == "すべて" else backend_id,
+        "include_archives": include_archives
+    }
+
+def move_history_page(cursor, direction, step):
+    """履歴一覧のページを移動する（ボタンのコールバック）"""
+    st.session_state["history_cursor"] = cursor
+    st.session_state["history_direction"] = direction
+    st.session_state["history_page_number"] = max(st.session_state.get("history_page_number", 1) + step, 1)
+    st.session_state["history_expanded"] = True
+
+def reset_history_page():
+    """履歴一覧を最新のページに戻す"""
+    st.session_state["history_cursor"] = None
+    st.session_state["history_direction"] = "next"
+    st.session_state["history_page_number"] = 1
+
+def load_history_page(filters, page_size):
+    """現在のページ位置で履歴を1ページ分読み込む（条件が変わった場合は最新のページに戻す）"""
+    query_key = (tuple(sorted(filters.items())), page_size)
+    if st.session_state.get("history_query") != query_key:
+        st.session_state["history_query"] = query_key
+        reset_history_page()
+    return load_requests_page(
+        page_size,
+        cursor=st.session_state.get("history_cursor"),
+        direction=st.session_state.get("history_direction", "next"),
+        **filters
+    )
+
+def load_history(filters, page_size, text_query):
+    """履歴一覧に表示する行を読み込む
+
+    全文検索の語があれば関連度順の検索結果（ページングなし）を、なければ現在のページを返す。
+
+    Returns:
+        tuple: (DataFrame, ページ情報。検索結果の場合はNone)
+    """
+    if text_query:
+        return search_requests(text_query, limit=page_size, **filters), None
+    return load_history_page(filters, page_size)
+
+def render_history_export(filters, columns, default_columns):
+    """絞り込み条件に合う履歴（全ページ）をファイルに書き出してダウンロードボタンを表示"""
+    st.divider()
+    st.caption("履歴のエクスポート（全文検索の語は対象外で、期間などの絞り込み条件に合うすべての履歴を書き出します）")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox(
+            "形式",
+            available_export_formats(),
+            format_func=lambda x: EXPORT_FORMATS[x][0],
+            key="history_export_format"
+        )
+    with col2:
+        export_columns = st.multiselect(
+            "書き出すカラム",
+            list(columns.keys()),
+            default=default_columns,
+            format_func=lambda x: columns[x],
+            key="history_export_columns"
+        )
+
+    if st.button("エクスポートファイルを作成", disabled=not export_columns):
+        # 前回作成したファイルは不要になるので削除する
+        previous = st.session_state.pop("history_export", None)
+        if previous and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+
+        status = st.empty()
+        try:
+            path, rows = export_history(
+                export_format,
+                export_columns,
+                filters,
+                progress=lambda n: status.caption(f"{n:,}件を書き出しました...")
+            )
+            st.session_state["history_export"] = {
+                "path": path,
+                "rows": rows,
+                "format": export_format,
+                "file_name": f"qa_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[export_format][1]}"
+            }
+            status.empty()
+        except Exception as e:
+            status.empty()
+            st.error(f"エクスポート中にエラーが発生しました: {str(e)}")
+
+    export = st.session_state.get("history_export")
+    if export and os.path.exists(export["path"]):
+        label, _, mime = EXPORT_FORMATS[export["format"]]
+        with open(export["path"], "rb") as f:
+            st.download_button(
+                label=f"{label}をダウンロード（{export['rows']:,}件）",
+                data=f,
+                file_name=export["file_name"],
+                mime=mime
+            )
+
+def render_history_navigation(page):
+    """履歴一覧の前後のページへの移動ボタンを表示"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button(
+            "← 新しい履歴",
+            disabled=not page["has_prev"],
+            on_click=move_history_page,
+            args=(page["first"], "prev", -1),
+            use_container_width=True,
+            key="history_prev"
+        )
+    with col2:
+        st.caption(f"ページ {st.session_state.get('history_page_number', 1)}")
+    with col3:
+        st.button(
+            "古い履歴 →",
+            disabled=not page["has_next"],
+            on_click=move_history_page,
+            args=(page["last"], "next", 1),
+            use_container_width=True,
+            key="history_next"
+        )
+
+def render_answer(response, answer_rendered=False):
+    """回答・参照情報・思考プロセスを表示する
+
+    Args:
+        response (dict): /ask のレスポンス
+        answer_rendered (bool): 回答本文をストリーミングで表示済みの場合はTrue
+    """
+    if not answer_rendered:
+        st.markdown("### 💡 回答")
+    with st.container():
+        if not answer_rendered:
+            with st.expander("回答内容", expanded=True):
+                st.write(response["answer"])
+        
+        if "data_points" in response:
+            with st.expander("🔍 参照情報", expanded=False):
+                for i, point in enumerate(response["data_points"], 1):
+                    st.markdown(f"**{i}.** {point}")
+                    if i < len(response["data_points"]):
+                        st.divider()
+        
+        if "thoughts" in response:
+            with st.expander("💭 思考プロセス", expanded=False):
+                st.write(response["thoughts"])
+
 def show():
     """Simple Q&A ページの表示"""
     st.title("🤔 Simple Q&A")
@@ -292,31 +554,31 @@ def show():
 
     # サイドバーに設定パネルを表示
     render_settings_panel()
+    render_cache_stats()
 
     # 質問入力フォーム
     st.markdown("### ❓ 質問を入力してください")
     
     # 過去の質問サジェスト
     with st.expander("💭 過去の質問から選択", expanded=False):
+        # 履歴の概要はプロセス内でキャッシュされ、履歴が変わった場合のみ読み込み直される
         requests = load_requests_summary()
-        if requests is not None and not requests.empty:
-            unique_questions = requests['question'].dropna().unique()
-            
-            if 'unique_questions_list' not in st.session_state:
-                st.session_state['unique_questions_list'] = list(unique_questions)
-            
-            for i, question in enumerate(st.session_state['unique_questions_list']):
-                display_text = (question[:100] + "...") if len(question) > 100 else question
-                tooltip = question if len(question) > 100 else None
-                
-                if st.button(
-                    display_text,
-                    key=f"q_{i}",
-                    use_container_width=True,
-                    help=tooltip
-                ):
-                    st.session_state["current_question"] = question
-                    st.rerun()
+        if st.session_state.get('unique_questions_version') != requests.attrs.get('summary_version'):
+            st.session_state['unique_questions_version'] = requests.attrs.get('summary_version')
+            st.session_state['unique_questions_list'] = list(requests['question'].dropna().unique())
+
+        for i, question in enumerate(st.session_state.get('unique_questions_list', [])):
+            display_text = (question[:100] + "...") if len(question) > 100 else question
+            tooltip = question if len(question) > 100 else None
+
+            if st.button(
+                display_text,
+                key=f"q_{i}",
+                use_container_width=True,
+                help=tooltip
+            ):
+                st.session_state["current_question"] = question
+                st.rerun()
 
     # 質問入力フォーム
     with st.form("qa_form", clear_on_submit=False):
@@ -339,6 +601,21 @@ def show():
                 help="保存時のリクエスト名を指定できます。空の場合は自動生成されます。",
                 placeholder="例: 製品仕様の確認_20240305"
             )
+
+            if "stream_answer" not in st.session_state:
+                st.session_state["stream_answer"] = True
+
+            st.checkbox(
+                "回答をストリーミング表示",
+                key="stream_answer",
+                help="バックエンドが対応している場合、生成中の回答を逐次表示します。"
+            )
+
+            st.checkbox(
+                "キャッシュを使用しない",
+                key="bypass_cache",
+                help="同じ質問・設定の回答がキャッシュにあっても、バックエンドに再送信します。"
+            )
         
         # 送信ボタン
         col1, col2 = st.columns(2)
@@ -399,11 +676,10 @@ def show():
                 )
 
                 st.session_state["_next_question"] = current_question
-                
-                response = make_request(
-                    "POST",
-                    "/ask",
-                    json.dumps(data)
+
+                response, answer_rendered, metrics = fetch_answer(
+                    data,
+                    bypass_cache=st.session_state.get("bypass_cache", False)
                 )
 
                 request_name = (
@@ -416,7 +692,9 @@ def show():
                     post_data=json.dumps(data),
                     response=response,
                     proxy_url=st.session_state.get("proxy_url", ""),
-                    request_name=request_name
+                    request_name=request_name,
+                    metrics=metrics,
+                    backend_id=get_current_backend_id()
                 )
 
                 if "custom_request_name" in st.session_state:
@@ -427,21 +705,7 @@ def show():
                     return
 
                 if "answer" in response:
-                    st.markdown("### 💡 回答")
-                    with st.container():
-                        with st.expander("回答内容", expanded=True):
-                            st.write(response["answer"])
-                        
-                        if "data_points" in response:
-                            with st.expander("🔍 参照情報", expanded=False):
-                                for i, point in enumerate(response["data_points"], 1):
-                                    st.markdown(f"**{i}.** {point}")
-                                    if i < len(response["data_points"]):
-                                        st.divider()
-                        
-                        if "thoughts" in response:
-                            with st.expander("💭 思考プロセス", expanded=False):
-                                st.write(response["thoughts"])
+                    render_answer(response, answer_rendered=answer_rendered)
 
             except Exception as e:
                 st.error(f"エラーが発生しました: {str(e)}")
@@ -449,18 +713,25 @@ def show():
     # 履歴の表示
     st.markdown("### 📜 履歴")
     with st.expander("履歴一覧", expanded=st.session_state.get("history_expanded", False)):
-        filter_name = st.text_input("履歴を検索", key="filter_name")
-        
-        requests = load_requests_summary()
+        text_query = st.text_input(
+            "質問・回答・メモ・参照情報を全文検索",
+            key="history_text_query",
+            help="空白で区切った語をすべて含む履歴を関連度順に表示します"
+        ).strip()
+        filters = get_history_filters()
+        page_size = st.selectbox("表示件数", HISTORY_PAGE_SIZES, index=1, key="history_page_size")
+
+        requests, page = load_history(filters, page_size, text_query)
         if requests is not None and not requests.empty:
-            if filter_name:
-                requests = requests[requests['request_name'].str.contains(filter_name, case=False, na=False)]
+            if page is not None:
+                render_history_navigation(page)
 
             st.subheader("表示カラムの選択")
             columns = {
                 "request_time": "日時",
                 "request_name": "リクエスト名",
                 "url": "URL",
+                "backend_id": "バックエンド",
                 "status_code": "ステータスコード",
                 "question": "質問",
                 "error": "エラー",
@@ -468,13 +739,28 @@ def show():
                 "thoughts": "思考プロセス",
                 "data_points": "参照情報",
                 "prompt_template": "プロンプトテンプレート",
+                "hedge_won": "ヘッジ先着",
+                "request_bytes": "送信サイズ（展開後）",
+                "request_wire_bytes": "送信サイズ（転送量）",
+                "response_bytes": "受信サイズ（展開後）",
+                "response_wire_bytes": "受信サイズ（転送量）",
+                "dns_ms": "DNS（ms）",
+                "connect_ms": "TCP接続（ms）",
+                "proxy_connect_ms": "プロキシCONNECT（ms）",
+                "tls_ms": "TLS（ms）",
+                "ttfb_ms": "TTFB（ms）",
+                "download_ms": "本文受信（ms）",
+                "total_ms": "合計（ms）",
                 "memo": "メモ"
             }
+            if text_query:
+                columns = {"snippet": "一致箇所", **columns}
 
+            default_columns = ["request_time", "request_name", "question", "prompt_template", "answer", "data_points", "memo"]
             selected_columns = st.multiselect(
                 "表示するカラムを選択",
                 list(columns.keys()),
-                default=["request_time", "request_name", "question", "prompt_template", "answer", "data_points", "memo"],
+                default=(["snippet"] if text_query else []) + default_columns,
                 format_func=lambda x: columns[x]
             )
 
@@ -503,6 +789,10 @@ def show():
                         "data_points": st.column_config.TextColumn(
                             "参照情報",
                             width="large"
+                        ),
+                        "snippet": st.column_config.TextColumn(
+                            "一致箇所",
+                            width="large"
                         )
                     },
                     hide_index=True,
@@ -520,32 +810,16 @@ def show():
                             if original_memo != new_memo:
                                 update_request_memo(requests.iloc[idx]["request_name"], new_memo)
 
-                        requests = load_requests_summary()
-                        if filter_name:
-                            requests = requests[requests['request_name'].str.contains(filter_name, case=False, na=False)]
+                        requests, page = load_history(filters, page_size, text_query)
                         st.success("メモを保存しました")
                     except Exception as e:
                         st.error(f"メモの保存中にエラーが発生しました: {str(e)}")
 
-            if st.button("履歴をCSVでエクスポート"):
-                try:
-                    export_df = requests[selected_columns].copy()
-                    
-                    for col in export_df.columns:
-                        if export_df[col].dtype == 'object':
-                            export_df[col] = export_df[col].fillna('').astype(str)
-                    
-                    csv_data = export_df.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
-                    
-                    now = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    st.download_button(
-                        label="CSVをダウンロード",
-                        data=csv_data,
-                        file_name=f"qa_history_{now}.csv",
-                        mime="text/csv;charset=utf-8-sig"
-                    )
-                except Exception as e:
-                    st.error(f"CSVエクスポート中にエラーが発生しました: {str(e)}")
+            render_history_export(
+                filters,
+                {k: v for k, v in columns.items() if k != "snippet"},
+                [c for c in selected_columns if c != "snippet"]
+            )
 
             st.divider()
             st.caption("⚠️ 履歴の削除")
@@ -570,5 +844,10 @@ def show():
                         st.rerun()
                     except Exception as e:
                         st.error(f"履歴の削除中にエラーが発生しました: {str(e)}")
+        elif text_query:
+            st.info("一致する履歴がありません")
+        elif st.session_state.get("history_cursor") is not None:
+            st.info("このページに表示する履歴がありません")
+            st.button("最新の履歴に戻る", on_click=reset_history_page, key="history_reset")
         else:
             st.info("履歴がありません")
\ No newline at end of file
@@ -0,0 +1,124 @@
+import http.server
+import json
+import shutil
+import ssl
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+
+class RecordedRequest:
+    """FakeBackendが受信したリクエスト1件分"""
+
+    def __init__(self, handler: http.server.BaseHTTPRequestHandler, body: bytes):
+        self.method = handler.command
+        self.path = handler.path
+        self.headers = dict(handler.headers)
+        self.body = body
+        self.client_port = handler.client_address[1]
+
+
+def ok_response(request: RecordedRequest) -> Tuple[int, Dict[str, str], bytes]:
+    return 200, {"Content-Type": "application/json"}, json.dumps({"answer": "ok"}).encode("utf-8")
+
+
+class FakeBackend:
+    """テスト用のローカルHTTPサーバー（keep-alive対応）
+
+    respond に (RecordedRequest) -> (ステータス, ヘッダー, 本文) の関数を設定して応答を決める。
+    ssl_contextを指定した場合はHTTPSで待ち受ける。
+    """
+
+    def __init__(self, ssl_context: Optional[ssl.SSLContext] = None):
+        self.requests: List[RecordedRequest] = []
+        self.respond: Callable[[RecordedRequest], Tuple[int, Dict[str, str], bytes]] = ok_response
+        backend = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = RecordedRequest(self, self.rfile.read(length))
+                backend.requests.append(request)
+                status, headers, body = backend.respond(request)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            do_GET = do_POST = do_HEAD = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        if ssl_context is not None:
+            self.server.socket = ssl_context.wrap_socket(self.server.socket, server_side=True)
+        scheme = "https" if ssl_context is not None else "http"
+        self.url = f"{scheme}://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def backend():
+    server = FakeBackend()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def tls_backend(tmp_path):
+    """自己署名証明書でHTTPSを待ち受けるFakeBackend（証明書のパスは cert 属性）"""
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is not available")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", str(key), "-out", str(cert), "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = FakeBackend(ssl_context=context)
+    server.cert = str(cert)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """一時ディレクトリにスキーマを作成したDBを使う（db_utilsモジュールを返す）"""
+    from utils import db_utils
+
+    db_utils.get_db_writer().flush_all()
+    db_utils.get_connection_manager().close_all()
+    monkeypatch.setattr(db_utils, "DB_PATH", str(tmp_path / "config.db"))
+    monkeypatch.setattr(db_utils, "ARCHIVE_DIR", str(tmp_path / "archives"))
+    db_utils.get_requests_summary_cache().clear()
+    db_utils.init_db()
+    yield db_utils
+    db_utils.get_db_writer().flush_all()
+    db_utils.get_connection_manager().close_all()
+    db_utils.get_requests_summary_cache().clear()
+
+
+@pytest.fixture
+def session_state():
+    """空のst.session_stateを使う"""
+    import streamlit as st
+
+    st.session_state.clear()
+    yield st.session_state
+    st.session_state.clear()
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+from utils.api_utils import amake_request, load_proxy_list, load_retry_policy
+from utils.http_pool import get_async_client_pool
+
+
+def test_async_client_pool_reuses_the_connection_across_event_loops(backend):
+    async def ping():
+        response = await get_async_client_pool().request("GET", f"{backend.url}/ping", target_url=backend.url)
+        return response.status_code
+
+    # asyncio.run のたびにイベントループが変わっても、プール専用のループのクライアントを使い続ける
+    assert [asyncio.run(ping()) for _ in range(3)] == [200] * 3
+    assert len({request.client_port for request in backend.requests}) == 1
+
+
+def test_amake_request_retries_and_resends_uncompressed_on_415(temp_db, session_state, backend):
+    temp_db.save_setting("resilience_azure_openai_legacy", {"retry_post": True, "backoff_base": 0.01})
+
+    def respond(request):
+        if len(backend.requests) == 1:
+            # 最初の応答で受け付ける圧縮形式を通知する
+            return 503, {"Accept-Encoding": "gzip"}, b"{}"
+        if request.headers.get("Content-Encoding"):
+            return 415, {}, b"{}"
+        return 200, {}, json.dumps({"answer": "ok"}).encode("utf-8")
+
+    backend.respond = respond
+    data = json.dumps({"question": "x" * 2000})
+    result = asyncio.run(amake_request("POST", "/ask", data, base_url=backend.url, proxy_url=""))
+
+    assert result == {"answer": "ok"}
+    assert [request.headers.get("Content-Encoding") for request in backend.requests] == [None, "gzip", None]
+    assert backend.requests[-1].body == data.encode("utf-8")
+
+
+def test_amake_request_does_not_retry_post_by_default(temp_db, session_state, backend):
+    backend.respond = lambda request: (503, {}, json.dumps({"detail": "busy"}).encode("utf-8"))
+    result = asyncio.run(amake_request("POST", "/ask", "{}", base_url=backend.url, proxy_url=""))
+    assert result == {"detail": "busy"}
+    assert len(backend.requests) == 1
+
+
+def test_load_retry_policy_picks_up_settings_saved_by_another_session(temp_db, session_state):
+    assert load_retry_policy("azure_openai_legacy").max_retries == 2
+    # 設定画面（別のセッション）から保存された値は、このセッションのキャッシュを破棄して読み直す
+    temp_db.save_setting("resilience_azure_openai_legacy", {"max_retries": 5})
+    assert load_retry_policy("azure_openai_legacy").max_retries == 5
+
+
+def test_load_proxy_list_picks_up_proxies_saved_by_another_session(temp_db, session_state):
+    assert load_proxy_list("azure_openai_legacy") == []
+    temp_db.save_setting("proxy_pool_azure_openai_legacy", ["http://proxy.test:8080", "not a url"])
+    assert load_proxy_list("azure_openai_legacy") == ["http://proxy.test:8080"]
@@ -0,0 +1,71 @@
+import gzip
+import json
+import zlib
+
+from utils.api_utils import send_compressed
+from utils.compression import MIN_COMPRESS_BYTES, decode_body, get_compression_negotiator, parse_accept_encoding
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_negotiator_compresses_only_with_advertised_encodings():
+    negotiator = get_compression_negotiator()
+    target = "http://compression.test/advertised"
+    body = "x" * MIN_COMPRESS_BYTES
+
+    # 通知されるまでは圧縮しない
+    assert negotiator.encode(target, body) == (body, None)
+    negotiator.observe(target, FakeResponse({"Accept-Encoding": "gzip, br;q=0"}))
+    encoded, encoding = negotiator.encode(target, body)
+    assert encoding == "gzip"
+    assert gzip.decompress(encoded) == body.encode("utf-8")
+
+    assert negotiator.encode(target, "x" * (MIN_COMPRESS_BYTES - 1))[1] is None
+    assert negotiator.encode(target, body, enabled=False)[1] is None
+    negotiator.reject(target, "gzip")
+    assert negotiator.encode(target, body) == (body, None)
+
+
+def test_parse_accept_encoding_skips_disabled_encodings():
+    assert parse_accept_encoding("gzip;q=0.5, br;q=0, zstd, ") == {"gzip", "zstd"}
+    assert parse_accept_encoding(None) == set()
+
+
+def test_decode_body_reverses_stacked_encodings():
+    data = b"payload" * 100
+    deflated = zlib.compress(gzip.compress(data))
+    assert decode_body(deflated, "gzip, deflate") == data
+    assert decode_body(data, "identity") == data
+
+
+def test_send_compressed_resends_uncompressed_after_415(backend):
+    def respond(request):
+        if request.headers.get("Content-Encoding"):
+            return 415, {}, b""
+        body = gzip.compress(json.dumps({"answer": "a" * 4000}).encode("utf-8"))
+        return 200, {"Accept-Encoding": "gzip", "Content-Encoding": "gzip"}, body
+
+    backend.respond = respond
+    data = json.dumps({"question": "q" * 2000})
+
+    def send():
+        return send_compressed(
+            "POST", f"{backend.url}/ask", base_url=backend.url, proxy_url="",
+            data=data, headers={"Content-Type": "application/json"}, timeout=5
+        )
+
+    # 1回目で対応する形式を知り、2回目はgzipで送って415を受け、非圧縮で送り直す
+    send()
+    response = send()
+    assert [request.headers.get("Content-Encoding") for request in backend.requests] == [None, "gzip", None]
+    assert backend.requests[-1].body == data.encode("utf-8")
+    assert response.status_code == 200
+    assert response.json() == {"answer": "a" * 4000}
+    assert response.wire_bytes < len(response.content)
+
+    # 415を返した形式はそのターゲットURLでは以後使わない
+    send()
+    assert backend.requests[-1].headers.get("Content-Encoding") is None
@@ -0,0 +1,503 @@
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+
+import pytest
+
+from utils.payload_store import decompress_value, ref_hash
+
+
+def test_connection_is_reused_per_thread_and_tuned(temp_db):
+    manager = temp_db.get_connection_manager()
+    conn = temp_db.get_db_connection()
+    assert temp_db.get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # synchronous=NORMAL
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+    # 別のスレッドには別の接続を開く
+    other = []
+    thread = threading.Thread(target=lambda: other.append(temp_db.get_db_connection()))
+    thread.start()
+    thread.join(5)
+    assert other[0] is not conn
+
+    opened = manager.opened
+    for _ in range(10):
+        temp_db.get_db_connection().execute("SELECT 1")
+    assert manager.opened == opened
+
+
+def test_connection_is_reopened_after_close(temp_db):
+    manager = temp_db.get_connection_manager()
+    conn = temp_db.get_db_connection()
+    manager.close()
+    reopened = temp_db.get_db_connection()
+    assert reopened is not conn
+    assert reopened.execute("SELECT count(*) FROM requests").fetchone()[0] == 0
+
+    # open()はスレッドの接続とは別の接続を返す
+    separate = manager.open()
+    try:
+        assert separate is not reopened
+        assert separate.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        separate.close()
+
+
+def _create_baseline_db(db_utils, path, rows):
+    """マイグレーション導入前（v1）のスキーマと行だけを持つDBを作成する"""
+    conn = sqlite3.connect(path)
+    db_utils._migrate_baseline(conn.cursor())
+    conn.executemany(
+        """
+        INSERT INTO requests (request_time, request_name, url, post_data, response, status_code, prompt_template)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows
+    )
+    conn.execute("INSERT INTO chat_threads (id, name) VALUES ('t1', 'thread')")
+    conn.execute(
+        "INSERT INTO chat_messages (thread_id, role, content, context) VALUES ('t1', 'user', ?, ?)",
+        ("議事録の要約をお願いします", json.dumps({"data_points": ["x" * 300]}))
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+
+def test_migrations_upgrade_a_baseline_db(temp_db, tmp_path, monkeypatch):
+    template = "テンプレート" * 100
+    data_points = ["社内規程の第" + str(i) + "条" * 100 for i in range(3)]
+    rows = [
+        (
+            f"2026-01-0{i} 10:00:00",
+            f"baseline-{i}",
+            "http://backend/ask",
+            json.dumps({"question": f"経費精算の締め日 {i}", "prompt_template": template}),
+            json.dumps({"answer": f"毎月25日です {i}", "data_points": data_points}),
+            200,
+            template,
+        )
+        for i in range(1, 4)
+    ]
+    path = str(tmp_path / "baseline.db")
+    _create_baseline_db(temp_db, path, rows)
+
+    temp_db.get_connection_manager().close_all()
+    monkeypatch.setattr(temp_db, "DB_PATH", path)
+    temp_db.init_db()
+
+    conn = temp_db.get_db_connection()
+    assert temp_db.get_schema_version(conn) == temp_db.MIGRATIONS[-1][0]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {
+        "idx_requests_time_id", "idx_requests_name", "idx_chat_messages_thread_time",
+        "idx_requests_backend_time_id", "idx_requests_status_time_id",
+    } <= indexes
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"response_cache", "payload_blobs", "requests_fts", "chat_messages_fts", "requests_revision"} <= tables
+    # v8の後のVACUUMでインクリメンタルのauto_vacuumが有効になる
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    # 既存の行の表示用カラムが埋まり、大きな値は圧縮・共有ブロブになる
+    stored = conn.execute(
+        "SELECT question, answer, typeof(post_data), typeof(data_points_text) FROM requests ORDER BY id"
+    ).fetchall()
+    assert [row[:2] for row in stored] == [(f"経費精算の締め日 {i}", f"毎月25日です {i}") for i in range(1, 4)]
+    assert all(row[2:] == ("blob", "blob") for row in stored)
+    # 同じ内容は1件のブロブを共有する
+    shared = conn.execute(
+        "SELECT count(DISTINCT data_points_text), count(DISTINCT prompt_template), "
+        "count(DISTINCT response_data_points) FROM requests"
+    ).fetchone()
+    assert shared == (1, 1, 1)
+    assert conn.execute("SELECT typeof(context_data_points) FROM chat_messages").fetchone()[0] == "blob"
+
+    # 既存の行が全文検索の索引に入っている
+    assert len(temp_db.search_requests("経費精算")) == 3
+    assert [message["snippet"] for message in temp_db.search_chat_messages("議事録")] == ["【議事録】の要約をお願いします"]
+    df, _ = temp_db.load_requests_page(page_size=10)
+    assert df["data_points"].iloc[0].startswith("1. 社内規程の第0条")
+    assert df["prompt_template"].iloc[0] == template
+
+    # 適用済みなら何もしない
+    temp_db.init_db()
+    assert temp_db.get_schema_version() == temp_db.MIGRATIONS[-1][0]
+
+
+def test_migrated_db_stays_writable_from_a_plain_connection(temp_db):
+    # 展開用の関数（payload_text）を持たない接続からも、トリガーを通して更新・削除できる
+    temp_db.save_request("http://backend/ask", json.dumps({"question": "a"}), {"answer": "b", "status_code": 200},
+                         request_name="plain")
+    temp_db.get_db_writer().flush_all()
+    conn = sqlite3.connect(temp_db.DB_PATH)
+    try:
+        conn.execute("UPDATE requests SET memo = 'memo' WHERE request_name = 'plain'")
+        conn.execute("DELETE FROM requests WHERE request_name = 'plain'")
+        conn.commit()
+    finally:
+        conn.close()
+    assert temp_db.search_requests("plain").empty
+
+
+def _add_request(db_utils, name, request_time, question="質問", answer="回答", status_code=200,
+                 backend_id=None, data_points=None):
+    """リクエストを保存し、request_timeを指定の時刻に書き換える"""
+    response = {"answer": answer, "status_code": status_code}
+    if data_points is not None:
+        response["data_points"] = data_points
+    db_utils.save_request("http://backend/ask", json.dumps({"question": question}), response,
+                          request_name=name, backend_id=backend_id)
+    db_utils.get_db_writer().flush_all()
+    conn = db_utils.get_db_connection()
+    conn.execute("UPDATE requests SET request_time = ? WHERE request_name = ?", (request_time, name))
+    conn.commit()
+
+
+def test_keyset_paging_walks_pages_in_both_directions(temp_db):
+    # 同じ時刻の行（r3〜r5）はidの順で並ぶ
+    times = ["2026-03-01 09:00:00", "2026-03-02 09:00:00"] + ["2026-03-03 09:00:00"] * 3 + [
+        "2026-03-04 09:00:00", "2026-03-05 09:00:00"
+    ]
+    for i, request_time in enumerate(times, start=1):
+        _add_request(temp_db, f"r{i}", request_time)
+
+    def names(df):
+        return list(df["request_name"])
+
+    first, page = temp_db.load_requests_page(page_size=3)
+    assert names(first) == ["r7", "r6", "r5"]
+    assert page["has_next"] and not page["has_prev"]
+
+    second, page = temp_db.load_requests_page(page_size=3, cursor=page["last"])
+    assert names(second) == ["r4", "r3", "r2"]
+    assert page["has_next"] and page["has_prev"]
+
+    third, page = temp_db.load_requests_page(page_size=3, cursor=page["last"])
+    assert names(third) == ["r1"]
+    assert not page["has_next"] and page["has_prev"]
+
+    # 戻る方向も新しい順の1ページ分を返す
+    back, page = temp_db.load_requests_page(page_size=3, cursor=page["first"], direction="prev")
+    assert names(back) == ["r4", "r3", "r2"]
+    assert page["has_prev"] and page["has_next"]
+    back, page = temp_db.load_requests_page(page_size=3, cursor=page["first"], direction="prev")
+    assert names(back) == ["r7", "r6", "r5"]
+    assert not page["has_prev"]
+
+
+def test_keyset_paging_applies_filters_in_sql(temp_db):
+    _add_request(temp_db, "alpha-1", "2026-03-01 09:00:00", status_code=200, backend_id="east")
+    _add_request(temp_db, "alpha-2", "2026-03-02 09:00:00", status_code=500, backend_id="west")
+    _add_request(temp_db, "beta_1", "2026-03-03 09:00:00", status_code=200, backend_id="east")
+    _add_request(temp_db, "ALPHA-3", "2026-03-04 09:00:00", status_code=200, backend_id="west")
+
+    def names(**filters):
+        df, _ = temp_db.load_requests_page(page_size=10, **filters)
+        return list(df["request_name"])
+
+    assert names(name_filter="alpha") == ["ALPHA-3", "alpha-2", "alpha-1"]
+    # LIKEのワイルドカードは文字として扱う
+    assert names(name_filter="a_1") == ["beta_1"]
+    assert names(status_code=500) == ["alpha-2"]
+    assert names(backend_id="east") == ["beta_1", "alpha-1"]
+    assert names(date_from=date(2026, 3, 2), date_to=date(2026, 3, 3)) == ["beta_1", "alpha-2"]
+    assert names(name_filter="alpha", backend_id="west", status_code=200) == ["ALPHA-3"]
+
+    with pytest.raises(ValueError):
+        temp_db.load_requests_page(direction="sideways")
+
+
+def test_history_columns_are_materialized_at_write_time(temp_db):
+    post_data = json.dumps({"question": "有給休暇の申請方法", "overrides": {"prompt_template": "丁寧に答えてください"}})
+    response = {"answer": "ポータルから申請します", "thoughts": "規程を参照", "data_points": ["規程A", "規程B"],
+                "status_code": 200}
+    temp_db.save_request("http://backend/ask", post_data, response, request_name="leave")
+    temp_db.get_db_writer().flush_all()
+
+    row = temp_db.get_db_connection().execute(
+        "SELECT question, answer, thoughts, error, effective_prompt_template FROM requests"
+    ).fetchone()
+    assert row == ("有給休暇の申請方法", "ポータルから申請します", "規程を参照", "", "丁寧に答えてください")
+
+    df, _ = temp_db.load_requests_page()
+    assert df["data_points"].iloc[0] == "1. 規程A\n=========================\n2. 規程B"
+    assert df["prompt_template"].iloc[0] == "丁寧に答えてください"
+
+
+def test_derive_request_columns_reports_unreadable_payloads(temp_db):
+    question, answer, _, error, data_points, _ = temp_db.derive_request_columns("not json", "not json")
+    assert (question, answer, data_points) == ("JSONの解析に失敗", "", "")
+    assert error == "JSONの解析に失敗しました"
+    # data_pointsがリストでなければ空として扱う
+    assert temp_db.derive_request_columns('{"question": "q"}', {"data_points": "x"})[4] == ""
+
+
+def test_search_uses_trigram_index_and_falls_back_to_like_for_short_terms(temp_db):
+    _add_request(temp_db, "close", "2026-03-01 09:00:00", question="経費精算の締め日はいつですか", answer="毎月25日です")
+    _add_request(temp_db, "travel", "2026-03-02 09:00:00", question="出張の経費", answer="旅費規程を参照",
+                 data_points=["旅費規程 第3条"])
+    _add_request(temp_db, "other", "2026-03-03 09:00:00", question="会議室の予約", answer="ポータルから")
+
+    # 3文字以上の語は索引で検索し、関連度と抜粋を返す
+    hits = temp_db.search_requests("締め日")
+    assert list(hits["request_name"]) == ["close"]
+    assert hits["rank"].notna().all()
+    assert "【締め日】" in hits["snippet"].iloc[0]
+
+    # 3文字未満の語はLIKEで検索し、新しい順に並べる（関連度はNaN）
+    hits = temp_db.search_requests("経費")
+    assert list(hits["request_name"]) == ["travel", "close"]
+    assert hits["rank"].isna().all()
+    assert "【経費】" in hits["snippet"].iloc[0]
+
+    # 語をすべて含む行だけが一致する（索引とLIKEの組み合わせも同様）
+    assert list(temp_db.search_requests("経費 旅費規程")["request_name"]) == ["travel"]
+    assert list(temp_db.search_requests("第3条")["request_name"]) == ["travel"]
+    assert temp_db.search_requests("経費 予約").empty
+
+    # FTS5の演算子や引用符は文字として扱う
+    assert temp_db.search_requests('"締め日 OR 予約').empty
+    with pytest.raises(ValueError):
+        temp_db.search_requests("   ")
+
+
+def test_search_index_follows_memo_updates_and_deletes(temp_db):
+    _add_request(temp_db, "memo", "2026-03-01 09:00:00", question="年末調整の書類")
+    assert temp_db.search_requests("要確認事項").empty
+
+    temp_db.update_request_memo("memo", "要確認事項あり")
+    assert list(temp_db.search_requests("要確認事項")["request_name"]) == ["memo"]
+
+    temp_db.delete_request("memo")
+    assert temp_db.search_requests("年末調整").empty
+    assert temp_db.search_requests("書類").empty
+
+
+def test_search_chat_messages_with_index_and_like(temp_db):
+    temp_db.save_chat_thread("t1", "総務")
+    temp_db.save_chat_message("t1", "user", "備品の発注方法を教えて")
+    temp_db.save_chat_message("t1", "assistant", "購買システムから発注します")
+
+    messages = temp_db.search_chat_messages("発注方法")
+    assert [(m["thread_name"], m["role"]) for m in messages] == [("総務", "user")]
+    assert "【発注方法】" in messages[0]["snippet"]
+
+    messages = temp_db.search_chat_messages("発注")
+    assert {m["role"] for m in messages} == {"user", "assistant"}
+    assert all("【発注】" in m["snippet"] for m in messages)
+
+
+def test_large_payloads_are_stored_compactly_and_read_back(temp_db):
+    data_points = [f"社内規程 第{i}条 " + "本文" * 200 for i in range(3)]
+    template = "以下の資料をもとに回答してください。" * 20
+    for name in ("p1", "p2"):
+        temp_db.save_request("http://backend/ask",
+                             json.dumps({"question": "q" * 400, "prompt_template": template}),
+                             {"answer": "回答", "data_points": data_points, "status_code": 200}, request_name=name)
+    temp_db.get_db_writer().flush_all()
+
+    conn = temp_db.get_db_connection()
+    rows = conn.execute(
+        "SELECT post_data, data_points_text, effective_prompt_template, response_data_points FROM requests"
+    ).fetchall()
+    for post_data, data_points_text, prompt_template, response_data_points in rows:
+        assert decompress_value(post_data) == json.dumps({"question": "q" * 400, "prompt_template": template})
+        assert all(ref_hash(value) for value in (data_points_text, prompt_template, response_data_points))
+    # 2件の行が同じブロブを参照する
+    assert rows[0][1:] == rows[1][1:]
+    assert conn.execute("SELECT count(*) FROM payload_blobs").fetchone()[0] == 3
+
+    df, _ = temp_db.load_requests_page()
+    assert df["data_points"].iloc[0].startswith("1. 社内規程 第0条")
+    assert df["prompt_template"].iloc[0] == template
+
+    # チャットのコンテキストとレスポンスキャッシュも元の値に戻る
+    temp_db.save_chat_thread("t1", "thread")
+    temp_db.save_chat_message("t1", "assistant", "回答", context={"data_points": data_points, "thoughts": "t"})
+    assert temp_db.load_chat_messages("t1")[0]["context"] == {"thoughts": "t", "data_points": data_points}
+    cached = {"answer": "a" * 1000, "data_points": data_points}
+    temp_db.save_cached_response("key", "http://backend/ask", cached, created_at=1.0)
+    assert temp_db.load_cached_response("key") == (cached, 1.0)
+
+
+def test_prune_payload_blobs_keeps_referenced_blobs(temp_db):
+    shared = ["共有の資料 " * 100]
+    _add_request(temp_db, "a", "2026-03-01 09:00:00", data_points=shared)
+    _add_request(temp_db, "b", "2026-03-02 09:00:00", data_points=shared)
+    blobs = temp_db.get_db_connection().execute("SELECT count(*) FROM payload_blobs").fetchone()[0]
+    assert blobs > 0
+
+    temp_db.delete_request("a")
+    # bがまだ参照している
+    assert temp_db.prune_payload_blobs() == 0
+    df, _ = temp_db.load_requests_page()
+    assert df["data_points"].iloc[0] == "1. " + shared[0]
+
+    temp_db.delete_request("b")
+    assert temp_db.prune_payload_blobs() == blobs
+    assert temp_db.get_db_connection().execute("SELECT count(*) FROM payload_blobs").fetchone()[0] == 0
+
+
+def _block_writer(writer):
+    """書き込みスレッドを止め、再開させるためのEventを返す（以降の書き込みは同じバッチになる）"""
+    started = threading.Event()
+    gate = threading.Event()
+
+    def block(c):
+        started.set()
+        gate.wait(5)
+
+    writer.submit(block, "blocked")
+    assert started.wait(5)
+    return gate
+
+
+def test_reads_flush_the_sessions_pending_writes(temp_db):
+    writer = temp_db.get_db_writer()
+    # 書き込みスレッドを止めておき、読み込みがコミットを待つことを確かめる
+    gate = _block_writer(writer)
+    temp_db.save_request("http://backend/ask", json.dumps({"question": "q"}), {"answer": "a"}, request_name="queued")
+    flush_waits = writer.stats()["flush_waits"]
+    threading.Timer(0.05, gate.set).start()
+
+    df, _ = temp_db.load_requests_page()
+    assert list(df["request_name"]) == ["queued"]
+    assert writer.stats()["flush_waits"] == flush_waits + 1
+
+
+def test_queued_writes_are_group_committed_and_failures_are_isolated(temp_db):
+    writer = temp_db.get_db_writer()
+    before = writer.stats()
+    gate = _block_writer(writer)
+    for i in range(20):
+        temp_db.save_request("http://backend/ask", json.dumps({"question": f"q{i}"}), {"answer": "a"},
+                             request_name=f"batch-{i}")
+
+    def fail(c):
+        raise sqlite3.IntegrityError("broken")
+
+    writer.submit(fail, "書き込みに失敗しました")
+    temp_db.save_chat_thread("t1", "after failure")
+    gate.set()
+
+    # 失敗した書き込みだけが戻され、同じバッチの他の書き込みはコミットされる
+    assert writer.flush() == ["書き込みに失敗しました: broken"]
+    assert writer.flush() == []
+    stats = writer.stats()
+    assert stats["committed"] - before["committed"] == 22
+    assert stats["failed"] - before["failed"] == 1
+    assert stats["max_batch_size"] >= 22
+    assert stats["batches"] - before["batches"] == 2
+    df, _ = temp_db.load_requests_page(page_size=50)
+    assert len(df) == 20
+    assert [thread["name"] for thread in temp_db.load_chat_threads()] == ["after failure"]
+
+
+def test_archive_moves_old_months_and_reads_can_include_them(temp_db):
+    shared = ["アーカイブ対象の資料 " * 50]
+    _add_request(temp_db, "jan-1", "2026-01-10 09:00:00", question="一月の経費精算", data_points=shared)
+    _add_request(temp_db, "jan-2", "2026-01-20 09:00:00", question="一月の勤怠締め")
+    _add_request(temp_db, "feb-1", "2026-02-15 09:00:00", question="二月の経費精算")
+    _add_request(temp_db, "may-1", "2026-05-20 09:00:00", question="五月の経費精算", data_points=shared)
+
+    result = temp_db.archive_old_requests(30, now=datetime(2026, 6, 1))
+    assert result["moved"] == {"2026-01": 2, "2026-02": 1}
+    assert [month for month, _ in temp_db.list_archives()] == ["2026-02", "2026-01"]
+    # may-1がまだ参照しているブロブは残す
+    assert result["pruned_blobs"] == 0
+
+    def names(df):
+        return list(df["request_name"])
+
+    df, _ = temp_db.load_requests_page()
+    assert names(df) == ["may-1"]
+    df, page = temp_db.load_requests_page(page_size=2, include_archives=True)
+    assert names(df) == ["may-1", "feb-1"] and page["has_next"]
+    df, page = temp_db.load_requests_page(page_size=2, cursor=page["last"], include_archives=True)
+    assert names(df) == ["jan-2", "jan-1"] and not page["has_next"]
+    # アーカイブの行の共有ブロブも展開できる
+    assert df["data_points"].iloc[1] == "1. " + shared[0]
+
+    assert names(temp_db.search_requests("経費精算")) == ["may-1"]
+    assert names(temp_db.search_requests("経費精算", include_archives=True)) == ["may-1", "feb-1", "jan-1"]
+    assert names(temp_db.search_requests("勤怠", include_archives=True)) == ["jan-2"]
+
+    # 読み込みを中断している間も、同じスレッドから別の読み込みができる
+    chunks = temp_db.iter_requests(["request_name", "question"], chunk_size=1, include_archives=True)
+    seen = [next(chunks)["request_name"].iloc[0]]
+    temp_db.load_requests_page(include_archives=True)
+    seen += [chunk["request_name"].iloc[0] for chunk in chunks]
+    assert seen == ["may-1", "feb-1", "jan-2", "jan-1"]
+
+    # 期間外のアーカイブは読まない
+    df, _ = temp_db.load_requests_page(include_archives=True, date_from=date(2026, 2, 1))
+    assert names(df) == ["may-1", "feb-1"]
+
+
+def test_archive_is_idempotent_and_prunes_unreferenced_blobs(temp_db):
+    _add_request(temp_db, "old", "2026-01-10 09:00:00", data_points=["古い資料 " * 100])
+    _add_request(temp_db, "new", "2026-05-20 09:00:00")
+
+    result = temp_db.archive_old_requests(30, now=datetime(2026, 6, 1))
+    assert result["moved"] == {"2026-01": 1}
+    assert result["pruned_blobs"] > 0
+    assert temp_db.archive_old_requests(30, now=datetime(2026, 6, 1))["moved"] == {}
+
+    stats = temp_db.get_storage_stats()
+    assert stats["live_rows"] == 1
+    assert [archive["month"] for archive in stats["archives"]] == ["2026-01"]
+    with pytest.raises(ValueError):
+        temp_db.archive_old_requests(0)
+
+
+def test_summary_cache_detects_appends_updates_and_deletes(temp_db):
+    cache = temp_db.get_requests_summary_cache()
+
+    def load():
+        before = cache.stats()
+        frame = temp_db.load_requests_summary()
+        after = cache.stats()
+        change = next((key for key in ("hits", "appends", "reloads") if after[key] != before[key]), None)
+        return frame, change
+
+    _add_request(temp_db, "a", "2026-03-01 09:00:00")
+    frame, change = load()
+    assert (list(frame["request_name"]), change) == (["a"], "reloads")
+    version = frame.attrs["summary_version"]
+
+    # 変更がなければキャッシュを返す（呼び出し側で書き換えても影響しない）
+    frame["request_name"] = "changed"
+    frame, change = load()
+    assert (list(frame["request_name"]), change) == (["a"], "hits")
+    assert frame.attrs["summary_version"] == version
+
+    # 追加は増えた行だけを読み、新しい順の先頭に加える（request_timeを書き換えると更新として扱われる）
+    temp_db.save_request("http://backend/ask", json.dumps({"question": "q"}), {"answer": "a"}, request_name="b")
+    frame, change = load()
+    assert (list(frame["request_name"]), change) == (["b", "a"], "appends")
+    assert frame.attrs["summary_version"] > version
+
+    _add_request(temp_db, "c", "2026-03-02 09:00:00")
+    temp_db.update_request_memo("a", "memo")
+    frame, change = load()
+    assert (list(frame["request_name"]), change) == (["b", "c", "a"], "reloads")
+    assert frame.set_index("request_name").loc["a", "memo"] == "memo"
+
+    temp_db.delete_request("c")
+    frame, change = load()
+    assert (list(frame["request_name"]), change) == (["b", "a"], "reloads")
+
+    # 他のプロセスからの更新もリビジョンのトリガーで検出する
+    conn = sqlite3.connect(temp_db.DB_PATH)
+    try:
+        conn.execute("UPDATE requests SET status_code = 404 WHERE request_name = 'b'")
+        conn.commit()
+    finally:
+        conn.close()
+    frame, change = load()
+    assert change == "reloads"
+    assert frame.set_index("request_name").loc["b", "status_code"] == 404
@@ -0,0 +1,77 @@
+import itertools
+import threading
+import uuid
+
+from utils.hedging import MIN_LATENCY_SAMPLES, get_request_hedger
+
+
+class FakeResponse:
+    def __init__(self, name, status_code=200):
+        self.name = name
+        self.status_code = status_code
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def _primed_key(seconds=0.01):
+    """ヘッジを始めるのに十分なレイテンシを記録したキーを返す"""
+    key = f"http://hedge.test/{uuid.uuid4()}"
+    for _ in range(MIN_LATENCY_SAMPLES):
+        get_request_hedger().latencies.record(key, seconds)
+    return key
+
+
+def _slow_primary(release):
+    """1本目は release まで応答せず、2本目以降はすぐに応答するsendと、送信したレスポンスの一覧"""
+    counter = itertools.count()
+    responses = {}
+
+    def send():
+        index = next(counter)
+        response = responses[index] = FakeResponse("hedge" if index else "primary")
+        if index == 0:
+            assert release.wait(5)
+        return response
+
+    return send, responses
+
+
+def test_hedge_wins_over_a_slow_primary_and_the_loser_is_closed():
+    release = threading.Event()
+    send, responses = _slow_primary(release)
+    response, hedge_won = get_request_hedger().send(
+        _primed_key(), send, enabled=True, percentile=95.0, max_ratio=1.0
+    )
+    assert response.name == "hedge"
+    assert hedge_won is True
+
+    # 負けた方は応答した時点で閉じてコネクションをプールに返す
+    assert not responses[0].closed.is_set()
+    release.set()
+    assert responses[0].closed.wait(5)
+    assert not response.closed.is_set()
+
+
+def test_no_hedge_when_the_primary_answers_within_the_percentile():
+    calls = []
+
+    def send():
+        calls.append(1)
+        return FakeResponse("primary")
+
+    response, hedge_won = get_request_hedger().send(
+        _primed_key(seconds=1.0), send, enabled=True, percentile=95.0, max_ratio=1.0
+    )
+    assert (response.name, hedge_won, len(calls)) == ("primary", None, 1)
+
+
+def test_no_hedge_beyond_max_ratio():
+    release = threading.Event()
+    send, responses = _slow_primary(release)
+    threading.Timer(0.1, release.set).start()
+    response, hedge_won = get_request_hedger().send(
+        _primed_key(), send, enabled=True, percentile=95.0, max_ratio=0.0
+    )
+    assert (response.name, hedge_won, len(responses)) == ("primary", None, 1)
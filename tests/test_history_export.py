@@ -0,0 +1,79 @@
+import json
+
+import pandas as pd
+import pytest
+
+from utils import history_export
+
+COLUMNS = ["request_time", "request_name", "question", "status_code", "total_ms"]
+
+
+@pytest.fixture
+def history(temp_db, tmp_path, monkeypatch):
+    """5件の履歴を保存したDB（エクスポート先は一時ディレクトリ）"""
+    monkeypatch.setattr(history_export, "EXPORT_DIR", str(tmp_path / "exports"))
+    for i in range(1, 6):
+        temp_db.save_request("http://backend/ask", json.dumps({"question": f"質問{i}"}),
+                             {"answer": "回答", "status_code": 200 if i % 2 else 500},
+                             request_name=f"r{i}", metrics={"total_ms": i * 10.0})
+    temp_db.get_db_writer().flush_all()
+    conn = temp_db.get_db_connection()
+    conn.executemany("UPDATE requests SET request_time = ? WHERE request_name = ?",
+                     [(f"2026-03-0{i} 09:00:00", f"r{i}") for i in range(1, 6)])
+    conn.commit()
+    return temp_db
+
+
+def _export(fmt, filters=None):
+    calls = []
+    path, total = history_export.export_history(fmt, COLUMNS, filters=filters, progress=calls.append, chunk_size=2)
+    return path, total, calls
+
+
+def test_export_csv_in_chunks(history):
+    path, total, calls = _export("csv")
+    assert total == 5
+    # 2件ずつ書き出すたびに、それまでの件数が通知される
+    assert calls == [2, 4, 5]
+    with open(path, "rb") as f:
+        raw = f.read()
+    # BOMは先頭の1回だけで、ヘッダー行も1回だけ
+    assert raw.startswith(b"\xef\xbb\xbf") and raw.count(b"\xef\xbb\xbf") == 1
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    assert list(df.columns) == COLUMNS
+    assert list(df["request_name"]) == ["r5", "r4", "r3", "r2", "r1"]
+    assert df["request_time"].iloc[0] == "2026-03-05 09:00:00"
+    assert list(df["total_ms"]) == [50.0, 40.0, 30.0, 20.0, 10.0]
+
+
+def test_export_jsonl_in_chunks(history):
+    path, total, calls = _export("jsonl", filters={"status_code": 200})
+    assert (total, calls) == (3, [2, 3])
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["request_name"] for record in records] == ["r5", "r3", "r1"]
+    assert records[0]["question"] == "質問5"
+    assert records[0]["request_time"] == "2026-03-05 09:00:00"
+
+
+def test_export_parquet_writes_one_row_group_per_chunk(history):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path, total, calls = _export("parquet")
+    assert (total, calls) == (5, [2, 4, 5])
+    parquet = pq.ParquetFile(path)
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert table.schema.field("status_code").type == "int64"
+    assert table.schema.field("total_ms").type == "double"
+    df = table.to_pandas()
+    assert list(df["request_name"]) == ["r5", "r4", "r3", "r2", "r1"]
+    assert df["request_time"].iloc[0] == pd.Timestamp("2026-03-05 09:00:00")
+
+
+def test_export_without_matches_still_writes_a_header(history):
+    path, total, calls = _export("csv", filters={"name_filter": "missing"})
+    assert (total, calls) == (0, [])
+    assert list(pd.read_csv(path, encoding="utf-8-sig").columns) == COLUMNS
+
+    with pytest.raises(ValueError):
+        history_export.export_history("xlsx", COLUMNS)
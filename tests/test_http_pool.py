@@ -0,0 +1,109 @@
+import threading
+import time
+
+from utils.http_pool import SingleFlight, get_session_pool, get_single_flight
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_session_pool_reuses_the_connection(backend):
+    pool = get_session_pool()
+    for _ in range(3):
+        response = pool.request("GET", f"{backend.url}/ping", target_url=backend.url)
+        assert response.status_code == 200
+        response.close()
+    # 3回とも同じTCP接続（送信元ポート）で届く
+    assert len({request.client_port for request in backend.requests}) == 1
+
+
+def test_session_pool_keeps_one_session_per_target_and_proxy(backend):
+    pool = get_session_pool()
+    session = pool.get_session(backend.url)
+    assert pool.get_session(backend.url) is session
+    assert pool.get_session(backend.url, "http://127.0.0.1:1") is not session
+
+
+def test_session_pool_drops_idle_sessions(backend, monkeypatch):
+    pool = get_session_pool()
+    session = pool.get_session(backend.url)
+    monkeypatch.setattr(pool, "keepalive_timeout", 0.0)
+    time.sleep(0.01)
+    assert pool.get_session(backend.url) is not session
+
+
+def _call_concurrently(key, func, callers):
+    """先頭の呼び出しがfuncを実行中の間に残りを呼び出し、全員が待ち始めてからfuncを終わらせる"""
+    single_flight = get_single_flight()
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = []
+
+    def blocking():
+        started.set()
+        assert release.wait(5)
+        return func()
+
+    def call():
+        try:
+            outcomes.append(single_flight.do(key, blocking))
+        except Exception as e:
+            outcomes.append(e)
+
+    coalesced = single_flight.stats()["coalesced"]
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_until(lambda: single_flight.stats()["coalesced"] == coalesced + callers - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_single_flight_runs_concurrent_identical_calls_once():
+    key = SingleFlight.make_key("POST", "http://single-flight/ask", '{"question": "a"}')
+    calls = []
+
+    def func():
+        calls.append(1)
+        return {"data_points": ["a"]}
+
+    results = _call_concurrently(key, func, 5)
+    assert len(calls) == 1
+    assert results == [{"data_points": ["a"]}] * 5
+    # 呼び出し側で結果を書き換えても互いに影響しないようにコピーを返す
+    assert len({id(result) for result in results}) == 5
+
+    # 完了後の呼び出しは新たに実行する
+    get_single_flight().do(key, func)
+    assert len(calls) == 2
+
+
+def test_single_flight_raises_the_error_in_every_waiting_caller():
+    key = SingleFlight.make_key("POST", "http://single-flight/ask", '{"question": "b"}')
+
+    def func():
+        raise ConnectionError("upstream failed")
+
+    errors = _call_concurrently(key, func, 4)
+    assert len(errors) == 4
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert get_single_flight().stats()["in_flight"] == 0
+
+
+def test_single_flight_keys_differ_by_method_url_and_body():
+    keys = {
+        SingleFlight.make_key("POST", "http://a/ask", "{}"),
+        SingleFlight.make_key("GET", "http://a/ask", "{}"),
+        SingleFlight.make_key("POST", "http://b/ask", "{}"),
+        SingleFlight.make_key("POST", "http://a/ask", '{"x": 1}'),
+    }
+    assert len(keys) == 4
+    assert SingleFlight.make_key("post", "http://a/ask", "{}") == SingleFlight.make_key("POST", "http://a/ask", b"{}")
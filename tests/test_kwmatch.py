@@ -0,0 +1,239 @@
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+import pytest
+
+pytest.importorskip("konoha")
+
+from utils.kwmatch import (
+    CHUNKS_IN_FLIGHT_PER_PROCESS, _init_worker, _match_chunk_in_worker, filter_candidates,
+    find_covered_positions, get_keyword_automaton, get_unique_candidates, load_keyword_index, match_keywords,
+    match_keywords_many,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Reference implementations of the original quadratic matching code, kept as test oracles.
+
+def find_possible_matches(sentence: str, keyword_list: List[str]) -> Set[str]:
+    return {str(k) for k in keyword_list if str(k) in sentence}
+
+def find_positions(sentence: str, possible_matches: Set[str]) -> Dict[int, List[str]]:
+    positions_matches = {}
+    for m in possible_matches:
+        possible_positions = [
+            i for i in range(len(sentence)) if sentence.startswith(m, i)
+        ]
+        for p in possible_positions:
+            positions_matches.setdefault(p, []).append(m)
+    return positions_matches
+
+def find_overlapping_ranges(
+    ranges: List[Tuple[int, int, str]]
+) -> List[Tuple[Tuple[int, int, str], Tuple[int, int, str]]]:
+    overlapping_ranges = []
+    for i in range(len(ranges)):
+        for j in range(i + 1, len(ranges)):
+            if ranges[j][0] < ranges[i][1]:
+                overlapping_ranges.append((ranges[i], ranges[j]))
+    return overlapping_ranges
+
+def remove_overlapping_positions(
+    positions_matches: Dict[int, List[str]],
+    overlapping_ranges: List[Tuple[Tuple[int, int, str], Tuple[int, int, str]]],
+) -> None:
+    to_remove_range = [
+        min(c, key=lambda tup: len(tup[-1]))[0] for c in overlapping_ranges
+    ]
+    for k in to_remove_range:
+        positions_matches.pop(k, None)
+
+def baseline_get_unique_candidates(positions_matches: Dict[int, List[str]]) -> List[str]:
+    unique_candidates = []
+    for v in positions_matches.values():
+        if len(v) == 1:
+            if v[0] not in unique_candidates:
+                unique_candidates.append(v[0])
+        else:
+            longest = max(v, key=len)
+            if longest not in unique_candidates:
+                unique_candidates.append(longest)
+    return unique_candidates
+
+def baseline_filter_candidates(unique_candidates: List[str], names: Set[str]) -> List[str]:
+    to_remove = [c for c in unique_candidates if len(c) == 1 and c not in names]
+    for c in unique_candidates:
+        if c not in to_remove:
+            for name in names:
+                if c in name and c != name:
+                    to_remove.append(c)
+                    break
+    return [u for u in unique_candidates if u not in to_remove]
+
+def _sorted_values(positions_matches: Dict[int, List[str]]) -> Dict[int, List[str]]:
+    return {p: sorted(v) for p, v in positions_matches.items()}
+
+def _random_text(rng: random.Random, alphabet: str, low: int, high: int) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(low, high)))
+
+def _load_golden():
+    with open(os.path.join(FIXTURES, "kwmatch_golden.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+@pytest.mark.parametrize("case", _load_golden(), ids=lambda case: case["sentence"])
+def test_match_keywords_golden(case):
+    # the order within the result follows set iteration, so compare sorted
+    result = match_keywords(case["sentence"], keyword_list=case["keywords"], tokenizer_type="whitespace")
+    assert sorted(result) == case["expected"]
+
+def test_automaton_positions_match_oracle():
+    rng = random.Random(21)
+    for _ in range(300):
+        keywords = [_random_text(rng, "abcあい", 1, 4) for _ in range(rng.randint(1, 12))]
+        sentence = _random_text(rng, "abcあい ", 0, 40)
+        expected = find_positions(sentence, find_possible_matches(sentence, keywords))
+        assert _sorted_values(get_keyword_automaton(keywords).find_positions(sentence)) == _sorted_values(expected)
+
+def _random_ranges(rng: random.Random, n: int, span: int) -> List[Tuple[int, int, str]]:
+    ranges = []
+    for start in sorted(rng.sample(range(span), n)):
+        keyword = _random_text(rng, "ab", 1, 6)
+        ranges.append((start, start + len(keyword) - 1, keyword))
+    return ranges
+
+def test_find_covered_positions_matches_oracle():
+    rng = random.Random(23)
+    for _ in range(500):
+        n = rng.randint(0, 30)
+        ranges = _random_ranges(rng, n, rng.randint(n, 3 * n + 1))
+        positions_matches = {start: [keyword] for start, _, keyword in ranges}
+        remove_overlapping_positions(positions_matches, find_overlapping_ranges(ranges))
+        expected = {start for start, _, _ in ranges} - set(positions_matches)
+        assert find_covered_positions(ranges) == expected
+
+def test_get_unique_candidates_matches_baseline():
+    rng = random.Random(231)
+    for _ in range(300):
+        positions_matches = {
+            p: [_random_text(rng, "abc", 1, 4) for _ in range(rng.randint(1, 3))]
+            for p in rng.sample(range(50), rng.randint(0, 20))
+        }
+        assert get_unique_candidates(positions_matches) == baseline_get_unique_candidates(positions_matches)
+
+def test_filter_candidates_matches_baseline():
+    rng = random.Random(232)
+    for _ in range(300):
+        candidates = list(dict.fromkeys(_random_text(rng, "abc", 1, 4) for _ in range(rng.randint(0, 15))))
+        names = {_random_text(rng, "abc", 1, 6) for _ in range(rng.randint(0, 10))}
+        assert filter_candidates(candidates, names) == baseline_filter_candidates(candidates, names)
+
+def _best_time(func: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def _assert_near_linear(build: Callable[[int], Callable[[], object]], n: int) -> None:
+    # 8x the input takes ~8x (n log n: a little more) the time; the quadratic originals took ~64x
+    ratio = _best_time(build(8 * n)) / _best_time(build(n))
+    assert ratio < 24, f"8x input took {ratio:.1f}x the time"
+
+def test_find_covered_positions_scales_near_linearly():
+    def build(n):
+        # every range overlaps every other one: the worst case for the pairwise scan
+        keywords = ["k" * (8 * n + i) for i in range(8)]
+        ranges = [(i, i + len(keywords[i % 8]) - 1, keywords[i % 8]) for i in range(n)]
+        return lambda: find_covered_positions(ranges)
+
+    _assert_near_linear(build, 1000)
+
+def test_filter_candidates_scales_near_linearly():
+    def build(n):
+        candidates = [f"c{i:06d}" for i in range(n)]
+        names = {f"n{i:06d}" for i in range(n)}
+        return lambda: filter_candidates(candidates, names)
+
+    _assert_near_linear(build, 500)
+
+def test_match_keywords_many_reads_lazy_input_with_backpressure():
+    cases = _load_golden()
+    read = 0
+
+    def sentences():
+        nonlocal read
+        for i in range(10000):
+            read += 1
+            yield cases[i % len(cases)]["sentence"]
+
+    keywords = sorted({k for case in cases for k in case["keywords"]})
+    results = match_keywords_many(
+        sentences(), keyword_list=keywords, tokenizer_type="whitespace", processes=2, chunksize=4
+    )
+    first = [sorted(next(results)) for _ in range(len(cases))]
+    assert first == [sorted(match_keywords(case["sentence"], keyword_list=keywords, tokenizer_type="whitespace"))
+                     for case in cases]
+    # only the chunks in flight (plus the one being yielded) have been read
+    assert read <= len(cases) + (2 * CHUNKS_IN_FLIGHT_PER_PROCESS + 1) * 4
+    results.close()
+
+def test_match_keywords_many_close_terminates_the_pool():
+    def sentences():
+        while True:
+            yield "東京都 渋谷区 の 天気"
+
+    results = match_keywords_many(
+        sentences(), keyword_list=["東京都", "渋谷区"], tokenizer_type="whitespace", processes=2, chunksize=4
+    )
+    assert sorted(next(results)) == ["東京都", "渋谷区"]
+    started = time.perf_counter()
+    results.close()
+    assert time.perf_counter() - started < 10
+    assert multiprocessing.active_children() == []
+
+def test_match_keywords_many_raises_task_errors_in_the_caller():
+    # a non-str sentence fails inside the worker
+    sentences = ["東京都 渋谷区"] * 8 + [None] + ["東京都 渋谷区"] * 8
+    results = match_keywords_many(
+        sentences, keyword_list=["東京都", "渋谷区"], tokenizer_type="whitespace", processes=2, chunksize=2
+    )
+    assert [sorted(next(results)) for _ in range(8)] == [["東京都", "渋谷区"]] * 8
+    with pytest.raises((AttributeError, TypeError)):
+        next(results)
+    assert multiprocessing.active_children() == []
+
+def _golden_inputs():
+    cases = _load_golden()
+    keywords = sorted({k for case in cases for k in case["keywords"]})
+    sentences = [case["sentence"] for case in cases]
+    expected = [sorted(match_keywords(sentence, keyword_list=keywords, tokenizer_type="whitespace"))
+                for sentence in sentences]
+    return keywords, sentences, expected
+
+def test_match_keywords_many_compiles_keywords_when_index_file_was_replaced(tmp_path):
+    keywords, sentences, expected = _golden_inputs()
+    source = tmp_path / "dictionary.txt"
+    source.write_text("\n".join(keywords), encoding="utf-8")
+    index_path = tmp_path / "dictionary.kwidx"
+    keyword_index = load_keyword_index(str(index_path), str(source), lambda: keywords)
+    assert keyword_index.path == str(index_path)
+
+    # replaced (not truncated in place) like save() does, so the parent's mapping stays valid
+    replacement = tmp_path / "replacement.kwidx"
+    replacement.write_bytes(b"not an index")
+    os.replace(replacement, index_path)
+
+    results = match_keywords_many(
+        sentences, keyword_index=keyword_index, tokenizer_type="whitespace", processes=2, chunksize=2
+    )
+    assert [sorted(r) for r in results] == expected
+
+def test_worker_compiles_keywords_when_index_cannot_be_loaded(tmp_path):
+    keywords, sentences, expected = _golden_inputs()
+    _init_worker(tuple(keywords), (str(tmp_path / "missing.kwidx"), bytes(32)), "whitespace", {})
+    assert [sorted(r) for r in _match_chunk_in_worker(sentences)] == expected
@@ -0,0 +1,35 @@
+import pytest
+
+from utils.payload_store import (
+    PAYLOAD_COMPRESS_MIN,
+    compress_text,
+    content_hash,
+    decompress_value,
+    make_ref,
+    ref_hash,
+)
+
+
+def test_compress_text_round_trips_large_text():
+    text = "就業規則 第1条 " * 100
+    stored = compress_text(text)
+    assert isinstance(stored, bytes) and len(stored) < len(text.encode("utf-8"))
+    assert decompress_value(stored) == text
+
+
+def test_compress_text_keeps_short_text_as_is():
+    short = "a" * (PAYLOAD_COMPRESS_MIN - 1)
+    assert compress_text(short) == short
+    assert decompress_value(short) == short
+    assert compress_text(None) is None
+    assert decompress_value(None) is None
+
+
+def test_refs_are_recognized_but_not_decompressed():
+    digest = content_hash("x" * 500)
+    ref = make_ref(digest)
+    assert ref_hash(ref) == digest
+    assert ref_hash(compress_text("x" * 500)) is None
+    assert ref_hash("plain") is None
+    with pytest.raises(ValueError):
+        decompress_value(ref)
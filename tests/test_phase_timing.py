@@ -0,0 +1,99 @@
+import http.server
+import select
+import socket
+import threading
+
+import pytest
+import requests
+
+from utils.api_utils import send_compressed
+from utils.phase_timing import CONNECTION_PHASES, TimedHTTPAdapter, collect_phases, connection_count
+
+
+def _timed_session(**proxies):
+    session = requests.Session()
+    adapter = TimedHTTPAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.proxies = proxies
+    return session
+
+
+def test_plain_http_records_dns_and_connect_once_per_connection(backend):
+    session = _timed_session()
+    connects = connection_count()
+    with collect_phases() as first:
+        session.get(f"{backend.url}/ping").close()
+    with collect_phases() as reused:
+        session.get(f"{backend.url}/ping").close()
+
+    assert set(first.seconds) == set(CONNECTION_PHASES)
+    assert first.seconds["dns"] > 0 and first.seconds["connect"] > 0
+    assert first.seconds["proxy_connect"] == 0 and first.seconds["tls"] == 0
+    # keep-aliveで再利用した接続では接続フェーズがかからない
+    assert reused.connection_seconds() == 0
+    assert connection_count() == connects + 1
+
+
+def test_send_compressed_reports_every_phase(backend):
+    response = send_compressed(
+        "POST", f"{backend.url}/ask", base_url=backend.url, proxy_url="",
+        data="{}", headers={"Content-Type": "application/json"}, timeout=5
+    )
+    assert set(response.timings) == {
+        "dns_ms", "connect_ms", "proxy_connect_ms", "tls_ms", "ttfb_ms", "download_ms", "total_ms"
+    }
+    assert all(value is not None and value >= 0 for value in response.timings.values())
+    assert response.timings["total_ms"] >= response.timings["ttfb_ms"]
+
+
+class TunnelProxy:
+    """CONNECTだけを扱うHTTPプロキシ"""
+
+    def __init__(self):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_CONNECT(self):
+                host, port = self.path.rsplit(":", 1)
+                upstream = socket.create_connection((host, int(port)))
+                self.send_response(200, "Connection established")
+                self.end_headers()
+                sockets = [self.connection, upstream]
+                while True:
+                    readable, _, _ = select.select(sockets, [], [], 5)
+                    if not readable:
+                        break
+                    data = b""
+                    for sock in readable:
+                        data = sock.recv(65536)
+                        if not data:
+                            break
+                        (upstream if sock is self.connection else self.connection).sendall(data)
+                    if not data:
+                        break
+                upstream.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_https_through_a_proxy_records_every_connection_phase(tls_backend):
+    proxy = TunnelProxy()
+    try:
+        session = _timed_session(https=proxy.url)
+        with collect_phases() as phases:
+            response = session.get(f"{tls_backend.url}/ping", verify=tls_backend.cert)
+        assert response.status_code == 200
+        response.close()
+    finally:
+        proxy.close()
+
+    assert all(phases.seconds[phase] > 0 for phase in CONNECTION_PHASES), phases.seconds
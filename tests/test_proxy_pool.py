@@ -0,0 +1,63 @@
+import socket
+import time
+import uuid
+
+import pytest
+
+from utils.api_utils import send_via_proxies
+from utils.proxy_pool import get_proxy_pool
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def dead_proxy():
+    """接続を受け付けないプロキシURL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def _state(target, proxy_url):
+    return next(state for state in get_proxy_pool().snapshot()[target] if state["proxy_url"] == proxy_url)
+
+
+def test_send_via_proxies_fails_over_and_ejects_the_dead_proxy(backend, dead_proxy):
+    # 絶対URIで届いたリクエストにも応答するため、ローカルサーバーをHTTPプロキシとして使う
+    target = f"http://{uuid.uuid4().hex}.test"
+    pool = get_proxy_pool()
+    pool.configure(target, [dead_proxy, backend.url])
+
+    response = send_via_proxies("GET", f"{target}/ask", base_url=target, proxy_url=dead_proxy, timeout=5)
+    assert response.status_code == 200
+    # プロバーのHEADも届くため、転送されたGETだけを見る
+    assert [request.path for request in backend.requests if request.method == "GET"] == [f"{target}/ask"]
+
+    dead = _state(target, dead_proxy)
+    assert not dead["healthy"]
+    assert dead["failures"] >= 1
+    assert pool.candidates(target) == [backend.url, dead_proxy]
+
+
+def test_prober_measures_live_proxies_and_ejects_dead_ones(backend, dead_proxy):
+    target = f"http://{uuid.uuid4().hex}.test"
+    get_proxy_pool().configure(target, [dead_proxy, backend.url])
+    _wait_until(lambda: _state(target, backend.url)["latency_ms"] is not None and _state(target, dead_proxy)["failures"])
+
+    assert _state(target, backend.url)["healthy"]
+    assert any(request.method == "HEAD" for request in backend.requests)
+    dead = _state(target, dead_proxy)
+    assert not dead["healthy"]
+    assert dead["last_error"]
+
+
+def test_candidates_fall_back_to_the_default_without_a_proxy_list():
+    assert get_proxy_pool().candidates(f"http://{uuid.uuid4().hex}.test", "http://default:8080") == [
+        "http://default:8080"
+    ]
@@ -0,0 +1,123 @@
+import random
+import time
+
+import pytest
+import requests
+
+from utils.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, RetryPolicy, send_with_retry,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_backoff_delay_stays_within_the_exponential_cap():
+    policy = RetryPolicy({"backoff_base": 0.5, "backoff_max": 4.0})
+    random.seed(6)
+    for attempt in range(8):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        delays = [policy.backoff_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        # full jitter: 0から上限までの範囲に散らばる
+        assert max(delays) > cap / 2
+
+
+def test_send_with_retry_gives_up_at_the_deadline():
+    policy = RetryPolicy({
+        "deadline": 0.3, "max_retries": 100, "backoff_base": 0.02, "backoff_max": 0.05,
+        "connect_timeout": 10.0, "read_timeout": 10.0,
+    })
+    timeouts = []
+
+    def send(timeout):
+        timeouts.append(timeout)
+        time.sleep(0.02)
+        raise requests.ConnectionError("connection refused")
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        send_with_retry(send, policy=policy, breaker=CircuitBreaker(1000, 30.0), retryable=True)
+    assert time.monotonic() - started < 0.5
+    assert len(timeouts) > 1
+    # 各試行のタイムアウトは残り時間に縮める
+    assert all(max(timeout) <= 0.3 for timeout in timeouts)
+    assert timeouts[-1][1] < timeouts[0][1]
+
+
+def test_send_with_retry_returns_the_last_response_after_max_retries():
+    policy = RetryPolicy({"max_retries": 2, "backoff_base": 0.001})
+    responses = []
+
+    def send(timeout):
+        responses.append(FakeResponse(503))
+        return responses[-1]
+
+    response = send_with_retry(send, policy=policy, breaker=CircuitBreaker(1000, 30.0), retryable=True)
+    assert len(responses) == 3
+    assert response is responses[-1]
+
+
+def test_send_with_retry_does_not_retry_non_retryable_calls():
+    calls = []
+
+    def send(timeout):
+        calls.append(timeout)
+        raise requests.ConnectionError("connection refused")
+
+    with pytest.raises(requests.ConnectionError):
+        send_with_retry(send, policy=RetryPolicy(), breaker=CircuitBreaker(1000, 30.0), retryable=False)
+    assert len(calls) == 1
+
+
+def test_send_with_retry_waits_for_retry_after():
+    policy = RetryPolicy({"backoff_base": 0.0})
+    responses = iter([FakeResponse(429, {"Retry-After": "0.1"}), FakeResponse(200)])
+    started = time.monotonic()
+    response = send_with_retry(
+        lambda timeout: next(responses), policy=policy, breaker=CircuitBreaker(1000, 30.0), retryable=True
+    )
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.1
+
+
+def test_circuit_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # 制限時間の経過後は1件だけ試行を通す
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.snapshot()["rejected"] == 2
+
+
+def test_circuit_breaker_reopens_when_the_half_open_probe_fails():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_send_with_retry_fails_fast_while_the_breaker_is_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        send_with_retry(lambda timeout: calls.append(timeout), policy=RetryPolicy(), breaker=breaker, retryable=True)
+    assert calls == []
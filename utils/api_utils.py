@@ -3,6 +3,15 @@ import json
 import streamlit as st
 from urllib.parse import urlparse
 import html
+import time
+import httpx
+from utils.http_pool import get_session_pool, get_async_client_pool, get_single_flight, SingleFlight
+from utils.resilience import RetryPolicy, get_circuit_breakers, send_with_retry, asend_with_retry
+from utils.hedging import get_request_hedger
+from utils.compression import get_compression_negotiator, read_body
+from utils.proxy_pool import get_proxy_pool, PROXY_FAILURES, ASYNC_PROXY_FAILURES
+from utils.phase_timing import collect_phases
+from utils.db_utils import load_setting, get_settings_revision
 
 def is_valid_proxy_url(url):
     try:
@@ -137,7 +146,179 @@ def escape_js_string(s):
     """Escape string for use in JavaScript"""
     return json.dumps(s)[1:-1]  # Remove the surrounding quotes
 
-def make_request(method, endpoint, data=None):
+def get_current_backend_id():
+    """現在選択されているバックエンドのIDを取得する"""
+    return st.session_state.get("qa_backend_id", "azure_openai_legacy")
+
+def _sync_settings_cache():
+    """設定が保存されていれば、セッションにキャッシュした通信設定と予備プロキシを破棄する
+
+    他のセッション（設定画面）で保存された変更も、次のリクエストから反映されるようにする。
+    """
+    try:
+        revision = get_settings_revision()
+    except Exception:
+        return
+    if st.session_state.get("settings_revision") != revision:
+        st.session_state.backend_resilience = {}
+        st.session_state.backend_proxies = {}
+        st.session_state.settings_revision = revision
+
+def load_retry_policy(backend_id):
+    """バックエンドの通信設定（タイムアウト・リトライ・ブレーカー）を取得する"""
+    _sync_settings_cache()
+    if "backend_resilience" not in st.session_state:
+        st.session_state.backend_resilience = {}
+    if backend_id not in st.session_state.backend_resilience:
+        try:
+            settings = load_setting(f"resilience_{backend_id}", {}) or {}
+        except Exception:
+            settings = {}
+        st.session_state.backend_resilience[backend_id] = settings
+    return RetryPolicy(st.session_state.backend_resilience[backend_id])
+
+def load_proxy_list(backend_id):
+    """バックエンドの予備プロキシURLの一覧を取得する"""
+    _sync_settings_cache()
+    if "backend_proxies" not in st.session_state:
+        st.session_state.backend_proxies = {}
+    if backend_id not in st.session_state.backend_proxies:
+        try:
+            proxies = load_setting(f"proxy_pool_{backend_id}", []) or []
+        except Exception:
+            proxies = []
+        st.session_state.backend_proxies[backend_id] = proxies
+    return [url for url in st.session_state.backend_proxies[backend_id] if is_valid_proxy_url(url)]
+
+def resolve_backend_urls():
+    """現在のバックエンドのベースURLとプロキシURLを取得する
+
+    プロキシURLと予備プロキシの一覧をプロキシプールに登録する。実際に使うプロキシは
+    送信時にプロキシプールが（ヘルスチェックの結果に応じて）選択する。
+
+    Returns:
+        tuple: (base_url, proxy_url)。プロキシURLが不正な形式の場合は空文字
+    """
+    backend_id = get_current_backend_id()
+    if "backend_urls" in st.session_state and backend_id in st.session_state.backend_urls:
+        urls = st.session_state.backend_urls[backend_id]
+        base_url = urls.get("target_url", "")
+        proxy_url = urls.get("proxy_url", "")
+    else:
+        # 後方互換性のために残す（古い設定がある場合）
+        base_url = st.session_state.get("target_url", "")
+        proxy_url = st.session_state.get("proxy_url", "")
+
+    # プロキシ設定（不正な形式の場合はプロキシなしで接続）
+    if not (proxy_url and is_valid_proxy_url(proxy_url)):
+        proxy_url = ""
+
+    if base_url:
+        get_proxy_pool().configure(base_url, [proxy_url] + load_proxy_list(backend_id))
+
+    return base_url, proxy_url
+
+def build_url(base_url, endpoint):
+    """ベースURLとエンドポイントから完全なURLを構築する"""
+    return f"{base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+
+def resolve_endpoint(endpoint, data):
+    """エンドポイントに応じてパスを補完する"""
+    if endpoint == "/chat" or endpoint == "/ask":
+        return endpoint
+    # Simple Q&AとChatで適切なパスを選択
+    if "chat_history" in data:  # チャットの場合
+        return "/chat"
+    return "/ask"  # Simple Q&Aの場合
+
+def send_via_proxies(method, url, *, base_url, proxy_url, **kwargs):
+    """プロキシプールの候補を速い順に試してリクエストを送信する
+
+    プロキシへの接続に失敗した場合はそのプロキシを一定時間除外し、次の候補で送り直す。
+    """
+    proxy_pool = get_proxy_pool()
+    error = None
+    for candidate in proxy_pool.candidates(base_url, proxy_url):
+        try:
+            response = get_session_pool().request(
+                method, url, target_url=base_url, proxy_url=candidate, **kwargs
+            )
+        except PROXY_FAILURES as e:
+            proxy_pool.record_failure(base_url, candidate, e)
+            error = e
+            continue
+        proxy_pool.record_success(base_url, candidate)
+        return response
+    raise error
+
+def send_compressed(method, url, *, base_url, proxy_url, data, headers, compress=True, stream=False, **kwargs):
+    """リクエストボディを（バックエンドが対応していれば）圧縮して送信する
+
+    バックエンドがAccept-Encodingで通知した形式で圧縮し、415が返った場合は非圧縮で送り直す。
+    stream=Falseの場合は本文まで読み込み、受信した（圧縮された）バイト数を
+    response.wire_bytes に設定する。
+
+    フェーズごとの所要時間（ミリ秒）を response.timings に設定する:
+    dns_ms、connect_ms、proxy_connect_ms、tls_ms（新規接続時のみ）、
+    ttfb_ms（接続後、レスポンスヘッダーを受信するまで）、download_ms（本文の受信）、total_ms
+    """
+    negotiator = get_compression_negotiator()
+    body, encoding = negotiator.encode(base_url, data, compress)
+    request_headers = {**headers, "Content-Encoding": encoding} if encoding else headers
+    with collect_phases() as phases:
+        start = time.perf_counter()
+        response = send_via_proxies(
+            method.upper(), url, base_url=base_url, proxy_url=proxy_url,
+            data=body, headers=request_headers, stream=True, **kwargs
+        )
+        if encoding and response.status_code == 415:
+            negotiator.reject(base_url, encoding)
+            response.close()
+            response = send_via_proxies(
+                method.upper(), url, base_url=base_url, proxy_url=proxy_url,
+                data=data, headers=headers, stream=True, **kwargs
+            )
+        headers_received = time.perf_counter()
+        negotiator.observe(base_url, response)
+        if not stream:
+            response.wire_bytes = read_body(response)
+        finished = time.perf_counter()
+
+    # stream=Trueの場合、呼び出し側が本文を受信し終えた時点でdownload_ms・total_msを求めるために使う
+    response.sent_at = start
+    response.headers_received_at = headers_received
+    response.timings = {
+        **phases.as_milliseconds(),
+        "ttfb_ms": round((headers_received - start - phases.connection_seconds()) * 1000, 3),
+        "download_ms": round((finished - headers_received) * 1000, 3) if not stream else None,
+        "total_ms": round((finished - start) * 1000, 3) if not stream else None
+    }
+    return response
+
+def record_transfer_sizes(response, data, response_bytes=None, response_wire_bytes=None):
+    """送受信したバイト数（展開後と実際の転送量）を集計して返す
+
+    ストリーミングで本文を読み込んだ場合は、受信したバイト数を response_bytes / response_wire_bytes で渡す。
+    """
+    raw_body = data.encode("utf-8") if isinstance(data, str) else (data or b"")
+    sent_body = response.request.body if response.request is not None else raw_body
+    if isinstance(sent_body, str):
+        sent_body = sent_body.encode("utf-8")
+    if response_bytes is None:
+        response_bytes = len(response.content or b"")
+        response_wire_bytes = getattr(response, "wire_bytes", response_bytes)
+
+    negotiator = get_compression_negotiator()
+    negotiator.record_request(len(raw_body), len(sent_body or b""))
+    negotiator.record_response(response_bytes, response_wire_bytes)
+    return {
+        "request_bytes": len(raw_body),
+        "request_wire_bytes": len(sent_body or b""),
+        "response_bytes": response_bytes,
+        "response_wire_bytes": response_wire_bytes
+    }
+
+def make_request(method, endpoint, data=None, retryable=None, meta=None):
     """
     汎用的なAPIリクエスト関数
 
@@ -145,62 +326,170 @@ def make_request(method, endpoint, data=None):
         method (str): HTTPメソッド（"GET", "POST"など）
         endpoint (str): APIエンドポイント（例: "/chat"）
         data (str, optional): JSON形式のリクエストボディ
+        retryable (bool, optional): 一時的なエラー時にリトライしてよいか。
+            省略時はメソッドの冪等性とバックエンドの通信設定で判断する。
+            リトライしてよい呼び出しはヘッジ（重複送信）の対象にもなる
+        meta (dict, optional): 指定した場合、通信の付帯情報（status_code、hedge_won、送受信バイト数など）を書き込む
 
     Returns:
         dict: レスポンスデータ
     """
     try:
         # バックエンド固有のURL設定を取得
-        backend_id = st.session_state.get("qa_backend_id", "azure_openai_legacy")
-        if "backend_urls" in st.session_state and backend_id in st.session_state.backend_urls:
-            urls = st.session_state.backend_urls[backend_id]
-            base_url = urls.get("target_url", "")
-            proxy_url = urls.get("proxy_url", "")
-        else:
-            # 後方互換性のために残す（古い設定がある場合）
-            base_url = st.session_state.get("target_url", "")
-            proxy_url = st.session_state.get("proxy_url", "")
+        base_url, proxy_url = resolve_backend_urls()
         
         if not base_url:
             return {"error": "選択されたバックエンドのベースURLが設定されていません"}
 
-        # エンドポイントに応じてパスを補完
-        if endpoint == "/chat" or endpoint == "/ask":
-            full_endpoint = endpoint
-        else:
-            # Simple Q&AとChatで適切なパスを選択
-            if "chat_history" in data:  # チャットの場合
-                full_endpoint = "/chat"
-            else:  # Simple Q&Aの場合
-                full_endpoint = "/ask"
-        
-        # プロキシ設定
-        proxies = None
-        if proxy_url and is_valid_proxy_url(proxy_url):
-            proxies = {
-                "http": proxy_url,
-                "https": proxy_url
-            }
-
         # リクエストヘッダー
         headers = {
             "Content-Type": "application/json"
         }
 
         # 完全なURLを構築
-        url = f"{base_url.rstrip('/')}/{full_endpoint.lstrip('/')}"
+        url = build_url(base_url, resolve_endpoint(endpoint, data))
+
+        # バックエンドごとのタイムアウト・リトライ設定とサーキットブレーカー
+        policy = load_retry_policy(get_current_backend_id())
+        breaker = get_circuit_breakers().get(base_url, policy)
+
+        is_retryable = policy.is_retryable(method, retryable)
+
+        def send():
+            info = {"hedge_won": None}
+
+            def attempt(timeout):
+                # リクエストの実行（プロセス共有のkeep-aliveセッションを再利用）。
+                # 応答が遅い場合は直近レイテンシのパーセンタイル経過後に重複リクエストを送る
+                response, info["hedge_won"] = get_request_hedger().send(
+                    url,
+                    lambda: send_compressed(
+                        method,
+                        url,
+                        base_url=base_url,
+                        proxy_url=proxy_url,
+                        data=data,
+                        headers=headers,
+                        compress=policy.compress_requests,
+                        timeout=timeout
+                    ),
+                    enabled=policy.hedge_enabled and is_retryable,
+                    percentile=policy.hedge_percentile,
+                    max_ratio=policy.hedge_max_ratio
+                )
+                return response
+
+            response = send_with_retry(attempt, policy=policy, breaker=breaker, retryable=is_retryable)
+            info["status_code"] = response.status_code
+            info.update(record_transfer_sizes(response, data))
+            info.update(getattr(response, "timings", {}))
+
+            # レスポンスの解析
+            try:
+                return response.json(), info
+            except json.JSONDecodeError:
+                return {
+                    "error": f"JSONの解析に失敗しました: {response.text}"
+                }, info
+
+        # 同一URL・同一ボディの実行中リクエストがあれば結果を共有する
+        result, info = get_single_flight().do(SingleFlight.make_key(method, url, data), send)
+        if meta is not None:
+            meta.update(info)
+        return result
 
-        # リクエストの実行
-        response = requests.request(
-            method=method.upper(),
-            url=url,
-            data=data,
-            proxies=proxies,
-            headers=headers,
-            timeout=30
+    except Exception as e:
+        return {
+            "error": f"リクエストエラー: {str(e)}"
+        }
+
+async def asend_via_proxies(method, url, *, base_url, proxy_url, **kwargs):
+    """send_via_proxies の非同期版（AsyncClientPoolで送信する）"""
+    proxy_pool = get_proxy_pool()
+    error = None
+    for candidate in proxy_pool.candidates(base_url, proxy_url):
+        try:
+            response = await get_async_client_pool().request(
+                method, url, target_url=base_url, proxy_url=candidate, **kwargs
+            )
+        except ASYNC_PROXY_FAILURES as e:
+            proxy_pool.record_failure(base_url, candidate, e)
+            error = e
+            continue
+        proxy_pool.record_success(base_url, candidate)
+        return response
+    raise error
+
+async def asend_compressed(method, url, *, base_url, proxy_url, data, headers, compress=True, **kwargs):
+    """send_compressed の非同期版（圧縮の選択と415時の非圧縮での再送を行う）"""
+    negotiator = get_compression_negotiator()
+    body, encoding = negotiator.encode(base_url, data, compress)
+    request_headers = {**headers, "Content-Encoding": encoding} if encoding else headers
+    response = await asend_via_proxies(
+        method.upper(), url, base_url=base_url, proxy_url=proxy_url,
+        content=body, headers=request_headers, **kwargs
+    )
+    if encoding and response.status_code == 415:
+        negotiator.reject(base_url, encoding)
+        response = await asend_via_proxies(
+            method.upper(), url, base_url=base_url, proxy_url=proxy_url,
+            content=data, headers=headers, **kwargs
+        )
+    negotiator.observe(base_url, response)
+    return response
+
+async def amake_request(method, endpoint, data=None, base_url=None, proxy_url=None, retryable=None):
+    """
+    make_request の非同期版（asyncioトランスポートを使用）
+
+    タイムアウト・リトライ・サーキットブレーカー・圧縮・プロキシのフェイルオーバーは make_request と同じ設定で適用する。
+    ヘッジと同一リクエストの集約は適用しない（どちらもスレッドで待ち合わせるため、イベントループを止めてしまう）。
+
+    Args:
+        method (str): HTTPメソッド（"GET", "POST"など）
+        endpoint (str): APIエンドポイント（例: "/chat"）
+        data (str, optional): JSON形式のリクエストボディ
+        base_url (str, optional): ベースURL。省略時は現在のバックエンドの設定を使用
+        proxy_url (str, optional): プロキシURL。base_url省略時は現在のバックエンドの設定を使用
+        retryable (bool, optional): 一時的なエラー時にリトライしてよいか（make_request と同じ）
+
+    Returns:
+        dict: レスポンスデータ
+    """
+    try:
+        if base_url is None:
+            base_url, proxy_url = resolve_backend_urls()
+
+        if not base_url:
+            return {"error": "選択されたバックエンドのベースURLが設定されていません"}
+
+        headers = {
+            "Content-Type": "application/json"
+        }
+
+        url = build_url(base_url, resolve_endpoint(endpoint, data))
+        policy = load_retry_policy(get_current_backend_id())
+
+        async def attempt(timeout):
+            connect_timeout, read_timeout = timeout
+            return await asend_compressed(
+                method,
+                url,
+                base_url=base_url,
+                proxy_url=proxy_url or "",
+                data=data,
+                headers=headers,
+                compress=policy.compress_requests,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+            )
+
+        response = await asend_with_retry(
+            attempt,
+            policy=policy,
+            breaker=get_circuit_breakers().get(base_url, policy),
+            retryable=policy.is_retryable(method, retryable)
         )
 
-        # レスポンスの解析
         try:
             return response.json()
         except json.JSONDecodeError:
@@ -211,4 +500,230 @@ def make_request(method, endpoint, data=None):
     except Exception as e:
         return {
             "error": f"リクエストエラー: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+# ストリーミング非対応とみなすステータスコード
+STREAM_UNSUPPORTED_STATUS = (404, 405, 501)
+
+def _iter_body_chunks(response, received):
+    """本文を受信した単位で返し、展開後のバイト数を received["bytes"] に加算する"""
+    for chunk in response.iter_content(chunk_size=None):
+        received["bytes"] += len(chunk)
+        yield chunk
+
+def _iter_lines(response, received):
+    """本文を行（bytes）ごとに返す"""
+    pending = b""
+    for chunk in _iter_body_chunks(response, received):
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+def _iter_sse_events(response, received):
+    """SSE（text/event-stream）のdataフィールドをJSONとして順に返す"""
+    data_lines = []
+    for raw_line in _iter_lines(response, received):
+        line = raw_line.decode("utf-8")
+        if not line:
+            if data_lines:
+                payload = "\n".join(data_lines)
+                data_lines = []
+                if payload.strip() != "[DONE]":
+                    yield json.loads(payload)
+            continue
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+    if data_lines:
+        payload = "\n".join(data_lines)
+        if payload.strip() != "[DONE]":
+            yield json.loads(payload)
+
+def _iter_ndjson_events(response, received):
+    """NDJSON（1行1JSON）のレスポンスを順に返す"""
+    for raw_line in _iter_lines(response, received):
+        line = raw_line.decode("utf-8")
+        if line.strip():
+            yield json.loads(line)
+
+def _record_stream_metrics(response, data, received, meta):
+    """ストリームを読み終えた時点の受信バイト数と所要時間を meta に書き込む"""
+    finished = time.perf_counter()
+    wire_bytes = response.raw.tell() if hasattr(response.raw, "tell") else received["bytes"]
+    meta.update(record_transfer_sizes(response, data, received["bytes"], wire_bytes or received["bytes"]))
+    meta.update(getattr(response, "timings", {}))
+    sent_at = getattr(response, "sent_at", None)
+    if sent_at is not None:
+        meta["download_ms"] = round((finished - response.headers_received_at) * 1000, 3)
+        meta["total_ms"] = round((finished - sent_at) * 1000, 3)
+
+def iter_stream_events(response, data=None, meta=None):
+    """レスポンスのContent-Typeに応じてイベント（dict）を順に返す
+
+    NDJSONとSSEはイベント単位で、それ以外はレスポンス全体を1イベントとして返す。
+    metaを指定した場合、本文を読み終えた時点で送受信バイト数とフェーズごとの所要時間を書き込む。
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    received = {"bytes": 0}
+    try:
+        if "text/event-stream" in content_type:
+            yield from _iter_sse_events(response, received)
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            yield from _iter_ndjson_events(response, received)
+        else:
+            body = b"".join(_iter_body_chunks(response, received))
+            try:
+                yield json.loads(body)
+            except json.JSONDecodeError:
+                yield {"error": f"JSONの解析に失敗しました: {body.decode('utf-8', errors='replace')}"}
+    except json.JSONDecodeError as e:
+        yield {"error": f"ストリームのJSON解析に失敗しました: {str(e)}"}
+    except Exception as e:
+        yield {"error": f"ストリームの受信中にエラーが発生しました: {str(e)}"}
+    finally:
+        try:
+            if meta is not None:
+                _record_stream_metrics(response, data, received, meta)
+        finally:
+            response.close()
+
+def stream_request(method, endpoint, data=None, meta=None, retryable=None):
+    """
+    ストリーミング対応のAPIリクエスト関数
+
+    Args:
+        method (str): HTTPメソッド（"GET", "POST"など）
+        endpoint (str): ストリーミング用エンドポイント（例: "/chat/stream"）
+        data (str, optional): JSON形式のリクエストボディ
+        meta (dict, optional): 指定した場合、通信の付帯情報を書き込む。status_codeとレスポンスヘッダーまでの
+            所要時間は返る時点で、送受信バイト数とdownload_ms・total_msはイテレータを読み終えた時点で書き込まれる
+        retryable (bool, optional): 重複して送ってよい呼び出しか（make_request と同じ判断）。
+            該当する場合はレスポンスヘッダーまでの待ち時間に対してヘッジ（重複送信）する
+
+    Returns:
+        Iterator[dict] | None: 受信したイベントを順に返すイテレータ。
+            バックエンドがストリーミングに対応していない場合はNone（呼び出し側で
+            make_request にフォールバックする）
+    """
+    base_url, proxy_url = resolve_backend_urls()
+    if not base_url:
+        return iter([{"error": "選択されたバックエンドのベースURLが設定されていません"}])
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/x-ndjson, text/event-stream, application/json"
+    }
+
+    url = build_url(base_url, endpoint)
+    policy = load_retry_policy(get_current_backend_id())
+    hedge_won = None
+
+    def attempt(timeout):
+        nonlocal hedge_won
+        # レスポンスヘッダーを受信するまで（TTFB）が遅い場合はヘッジする。
+        # 本文の受信を始めた後は重複送信しない
+        response, hedge_won = get_request_hedger().send(
+            url,
+            lambda: send_compressed(
+                method,
+                url,
+                base_url=base_url,
+                proxy_url=proxy_url,
+                data=data,
+                headers=headers,
+                compress=policy.compress_requests,
+                timeout=timeout,
+                stream=True
+            ),
+            enabled=policy.hedge_enabled and policy.is_retryable(method, retryable),
+            percentile=policy.hedge_percentile,
+            max_ratio=policy.hedge_max_ratio
+        )
+        return response
+
+    try:
+        # ストリームは途中から再送できないため、リトライせずタイムアウトとブレーカーのみ適用する
+        response = send_with_retry(
+            attempt,
+            policy=policy,
+            breaker=get_circuit_breakers().get(base_url, policy),
+            retryable=False
+        )
+    except Exception as e:
+        return iter([{"error": f"リクエストエラー: {str(e)}"}])
+
+    if response.status_code in STREAM_UNSUPPORTED_STATUS:
+        response.close()
+        return None
+
+    if meta is not None:
+        meta["status_code"] = response.status_code
+        meta["hedge_won"] = hedge_won
+        meta.update(getattr(response, "timings", {}))
+
+    # エラー応答はイベントとして流さず、本文をエラーとして返す（空の回答が保存・キャッシュされないように）
+    if response.status_code >= 400:
+        try:
+            body = response.text
+            if meta is not None:
+                _record_stream_metrics(response, data, {"bytes": len(response.content or b"")}, meta)
+        except Exception as e:
+            # 本文の受信中に接続が切れた場合も、他の失敗と同じくエラーイベントとして返す
+            body = f"エラー応答の受信中にエラーが発生しました: {str(e)}"
+        finally:
+            response.close()
+        return iter([{"error": f"HTTP {response.status_code}: {body}"}])
+
+    return iter_stream_events(response, data, meta)
+
+class StreamCollector:
+    """ストリーミングのチャンクを集約し、本文の差分テキストだけを順に取り出す
+
+    チャンクは `{"delta": {"content": ...}, "context": {...}}` 形式を想定し、
+    それ以外のトップレベルのキー（data_points, thoughts, session_state等）はそのまま保持する。
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.context = {}
+        self.extra = {}
+
+    def text_deltas(self, chunks):
+        """チャンクを消費しながら本文の差分テキストをyieldする"""
+        for chunk in chunks:
+            if not isinstance(chunk, dict):
+                continue
+            # 非ストリーミングのレスポンス形式もそのまま受け付ける
+            if "message" in chunk and "delta" not in chunk:
+                chunk = {**chunk, "delta": chunk["message"]}
+            if "answer" in chunk and "delta" not in chunk:
+                chunk = {**chunk, "delta": {"content": chunk["answer"]}}
+
+            if isinstance(chunk.get("context"), dict):
+                self.context.update(chunk["context"])
+            for key, value in chunk.items():
+                if key not in ("delta", "context", "message", "answer"):
+                    self.extra[key] = value
+
+            delta = chunk.get("delta") or {}
+            text = delta.get("content") if isinstance(delta, dict) else None
+            if text:
+                self.content += text
+                yield text
+
+    def chat_response(self):
+        """/chat 形式のレスポンスとして返す"""
+        return {
+            **self.extra,
+            "message": {"role": "assistant", "content": self.content},
+            "context": self.context
+        }
+
+    def qa_response(self):
+        """/ask 形式のレスポンスとして返す"""
+        response = {**self.context, **self.extra}
+        if self.content or "error" not in response:
+            response["answer"] = self.content
+        return response
@@ -1,5 +1,25 @@
+import asyncio
+import json
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from ..api_utils import amake_request
+
+async def run_in_thread(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking backend call in a worker thread without blocking the event loop
+    
+    The caller's Streamlit script context is attached to the worker thread so
+    that st.session_state stays accessible from the offloaded call.
+    """
+    ctx = get_script_run_ctx()
+    
+    def call():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args)
+    
+    return await asyncio.to_thread(call)
 
 class ChatBackend(ABC):
     """Base class for chat backend implementations"""
@@ -19,6 +39,30 @@ class ChatBackend(ABC):
         """Handle chat interaction with the backend"""
         pass
     
+    def stream_chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Stream the chat response as chunks of the form {"delta": {...}, "context": {...}}
+        
+        Backends without a streaming endpoint fall back to handle_chat and
+        yield the whole response as a single chunk.
+        """
+        response = self.handle_chat(messages, settings)
+        chunk = {key: value for key, value in response.items() if key != "message"}
+        chunk["delta"] = response.get("message", {})
+        yield chunk
+    
+    async def ahandle_chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of handle_chat
+        
+        The default adapter offloads handle_chat to a worker thread. Backends
+        can override this with a native implementation using amake_request.
+        """
+        return await run_in_thread(self.handle_chat, messages, settings)
+    
+    async def acreate_qa(self, question: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Q&A payload and send it to /ask over the async transport"""
+        payload = self.create_qa_request(question, settings)
+        return await amake_request("POST", "/ask", json.dumps(payload))
+    
     @abstractmethod
     def get_name(self) -> str:
         """Get the display name of this backend"""
@@ -1,7 +1,7 @@
 import streamlit as st
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
 from . import ChatBackend
-from ..api_utils import make_request
+from ..api_utils import make_request, stream_request
 import json
 
 class AzureOpenAIBackend(ChatBackend):
@@ -258,15 +258,19 @@ class AzureOpenAIBackend(ChatBackend):
         
         return settings
     
-    def handle_chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle chat interaction with Azure OpenAI backend"""
-        payload = {
+    def _create_chat_payload(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the /chat request payload"""
+        return {
             "messages": messages,
             "context": {
                 "overrides": settings
             },
             "session_state": st.session_state.get("current_session_state", "")
         }
+    
+    def handle_chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle chat interaction with Azure OpenAI backend"""
+        payload = self._create_chat_payload(messages, settings)
         
         response = make_request("POST", "/chat", json.dumps(payload))
         
@@ -278,4 +282,21 @@ class AzureOpenAIBackend(ChatBackend):
             return response
         else:
             error_msg = response.get("error", "Unknown error occurred")
-            raise Exception(f"Chat request failed: {error_msg}")
\ No newline at end of file
+            raise Exception(f"Chat request failed: {error_msg}")
+    
+    def stream_chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Stream chat response chunks from the /chat/stream endpoint"""
+        payload = self._create_chat_payload(messages, settings)
+        
+        chunks = stream_request("POST", "/chat/stream", json.dumps(payload))
+        if chunks is None:
+            # ストリーミング非対応のバックエンドは通常のリクエストにフォールバック
+            yield from super().stream_chat(messages, settings)
+            return
+        
+        for chunk in chunks:
+            if "error" in chunk:
+                raise Exception(f"Chat request failed: {chunk['error']}")
+            if "session_state" in chunk:
+                st.session_state.current_session_state = chunk["session_state"]
+            yield chunk
@@ -0,0 +1,191 @@
+import gzip
+import threading
+import zlib
+from typing import Any, Dict, Optional, Set, Tuple
+
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# これより小さいリクエストボディは圧縮しない（圧縮のオーバーヘッドの方が大きいため）
+MIN_COMPRESS_BYTES = 1024
+
+# レスポンスとして受け入れる圧縮形式（urllib3がデコードできるもの）
+RESPONSE_ACCEPT_ENCODING = ACCEPT_ENCODING
+
+
+def _available_encoders():
+    """利用できるリクエストボディの圧縮形式（優先順）"""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=5)
+    encoders["gzip"] = lambda body: gzip.compress(body, compresslevel=6)
+    return encoders
+
+
+def parse_accept_encoding(value: Optional[str]) -> Set[str]:
+    """Accept-Encodingヘッダーから受け入れ可能な形式を取り出す（q=0は除外）"""
+    encodings = set()
+    for part in (value or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(token)
+    return encodings
+
+
+def decode_body(data: bytes, content_encoding: Optional[str]) -> bytes:
+    """Content-Encodingに従ってレスポンスボディを展開する"""
+    encodings = [e.strip().lower() for e in (content_encoding or "").split(",") if e.strip()]
+    for encoding in reversed(encodings):
+        if encoding in ("gzip", "x-gzip"):
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+        elif encoding == "br" and brotli is not None:
+            data = brotli.decompress(data)
+        elif encoding == "zstd" and zstandard is not None:
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        elif encoding != "identity":
+            raise ValueError(f"未対応のContent-Encodingです: {encoding}")
+    return data
+
+
+def read_body(response) -> int:
+    """stream=Trueで受信したレスポンスの本文を読み込み、受信した（圧縮された）バイト数を返す
+
+    urllib3はチャンク転送時に圧縮前のバイト数を数えないため、未展開のまま読み込んでから展開する。
+    読み込んだ本文は通常のレスポンスと同じく response.content / response.json() で参照できる。
+    """
+    try:
+        wire = response.raw.read(decode_content=False) or b""
+    finally:
+        response.raw.release_conn()
+    response._content = decode_body(wire, response.headers.get("Content-Encoding"))
+    response._content_consumed = True
+    return len(wire)
+
+
+class CompressionNegotiator:
+    """リクエストボディの圧縮形式の選択と圧縮効果の集計
+
+    バックエンドがレスポンスのAccept-Encodingヘッダーで通知した形式だけを使い、
+    415が返った形式はそのターゲットURLでは以後使わない。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CompressionNegotiator, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._encoders = _available_encoders()
+        self._advertised: Dict[str, Set[str]] = {}
+        self._rejected: Dict[str, Set[str]] = {}
+        self._counters = {
+            "requests": 0,
+            "compressed_requests": 0,
+            "request_bytes": 0,
+            "request_wire_bytes": 0,
+            "responses": 0,
+            "response_bytes": 0,
+            "response_wire_bytes": 0,
+        }
+
+    def observe(self, target_url: str, response):
+        """レスポンスヘッダーからバックエンドが受け付ける圧縮形式を記録する"""
+        header = response.headers.get("Accept-Encoding")
+        if header is None:
+            return
+        with self._lock:
+            self._advertised[target_url] = parse_accept_encoding(header)
+
+    def reject(self, target_url: str, encoding: str):
+        """415が返った圧縮形式を以後使わないようにする"""
+        with self._lock:
+            self._rejected.setdefault(target_url, set()).add(encoding)
+
+    def choose(self, target_url: str) -> Optional[str]:
+        """target_urlへのリクエストに使う圧縮形式（使えるものがなければNone）"""
+        with self._lock:
+            advertised = self._advertised.get(target_url, set())
+            rejected = self._rejected.get(target_url, set())
+        for encoding in self._encoders:
+            if encoding in advertised and encoding not in rejected:
+                return encoding
+        return None
+
+    def encode(self, target_url: str, body: Any, enabled: bool = True) -> Tuple[Any, Optional[str]]:
+        """リクエストボディを必要に応じて圧縮する
+
+        Returns:
+            tuple: (送信するボディ, Content-Encoding。圧縮しない場合はNone)
+        """
+        if not enabled or body is None:
+            return body, None
+        raw = body.encode("utf-8") if isinstance(body, str) else body
+        if not isinstance(raw, (bytes, bytearray)) or len(raw) < MIN_COMPRESS_BYTES:
+            return body, None
+        encoding = self.choose(target_url)
+        if encoding is None:
+            return body, None
+        return self._encoders[encoding](bytes(raw)), encoding
+
+    def record_request(self, raw_bytes: int, wire_bytes: int):
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["request_bytes"] += raw_bytes
+            self._counters["request_wire_bytes"] += wire_bytes
+            if wire_bytes != raw_bytes:
+                self._counters["compressed_requests"] += 1
+
+    def record_response(self, raw_bytes: int, wire_bytes: int):
+        with self._lock:
+            self._counters["responses"] += 1
+            self._counters["response_bytes"] += raw_bytes
+            self._counters["response_wire_bytes"] += wire_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """圧縮の統計情報を取得する
+
+        Returns:
+            dict: 送受信それぞれの展開後/実際のバイト数と、削減率（*_savings）
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        for direction in ("request", "response"):
+            raw = counters[f"{direction}_bytes"]
+            wire = counters[f"{direction}_wire_bytes"]
+            counters[f"{direction}_savings"] = 1 - wire / raw if raw else 0.0
+        counters["encoders"] = list(self._encoders)
+        return counters
+
+
+def get_compression_negotiator() -> CompressionNegotiator:
+    """プロセス共有のCompressionNegotiatorを取得する"""
+    return CompressionNegotiator()
@@ -1,18 +1,571 @@
 import sqlite3
 import json
+import atexit
+import glob
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+import weakref
 import pandas as pd
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.payload_store import (
+    PAYLOAD_BLOB_MIN, compress_text, content_hash, decompress_value, get_payload_blob_cache, make_ref, ref_hash
+)
+
+DB_PATH = 'config.db'
+
+# 接続ごとに設定するPRAGMA
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# 接続ごとにキャッシュするプリペアドステートメントの数
+STATEMENT_CACHE_SIZE = 256
+
+class _ConnectionHolder:
+    """スレッドごとの接続を保持し、スレッド終了時（参照が消えた時）に閉じる"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def __del__(self):
+        self.close()
+
+class ConnectionManager:
+    """config.dbへの接続をスレッドごとに1つ保持して再利用する
+
+    接続はWALモード・synchronous=NORMAL・mmap・ページキャッシュを設定して開き、
+    スレッドの終了時とプロセスの終了時に閉じる。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ConnectionManager, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._holders = weakref.WeakSet()
+        self.opened = 0
+        atexit.register(self.close_all)
+
+    def _connect(self):
+        # 接続は作成したスレッドでのみ使うが、終了時にclose_allから閉じられるようにする
+        conn = sqlite3.connect(
+            DB_PATH,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        # 圧縮・共有ブロブにした値をSQLの中で展開する（履歴の表示や全文検索の索引で使う）
+        conn.create_function(
+            "payload_text", 1, lambda value: _resolve_payload(conn, value), deterministic=True
+        )
+        return conn
+
+    def get(self):
+        """現在のスレッドの接続を取得する（なければ作成する）"""
+        holder = getattr(self._local, "holder", None)
+        if holder is None or holder.conn is None:
+            holder = _ConnectionHolder(self._connect())
+            self._local.holder = holder
+            with self._lock:
+                self._holders.add(holder)
+                self.opened += 1
+        return holder.conn
+
+    def open(self):
+        """スレッドの接続とは別の接続を開く（呼び出し側で閉じること）"""
+        return self._connect()
+
+    def close(self):
+        """現在のスレッドの接続を閉じる"""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            holder.close()
+            self._local.holder = None
+
+    def close_all(self):
+        """すべてのスレッドの接続を閉じる"""
+        with self._lock:
+            holders = list(self._holders)
+        for holder in holders:
+            holder.close()
+
+def get_connection_manager():
+    """プロセス共有のConnectionManagerを取得する"""
+    return ConnectionManager()
 
 def get_db_connection():
-    """データベース接続を取得し、コンテキストマネージャとして使用できるようにする"""
-    return sqlite3.connect('config.db', detect_types=sqlite3.PARSE_DECLTYPES)
-
-def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
+    """データベース接続を取得し、コンテキストマネージャとして使用できるようにする
+
+    接続はスレッドごとに再利用されるため、呼び出し側で閉じないこと。
+    `with` ブロックはトランザクションのコミット/ロールバックのみを行う。
+    """
+    return get_connection_manager().get()
+
+# 書き込みキューの上限（一杯の場合は呼び出し元が空くまで待つ）
+WRITE_QUEUE_SIZE = 1000
+# 1回のコミットにまとめる書き込みの最大件数
+WRITE_BATCH_SIZE = 200
+# ロックの競合でコミットに失敗した場合に再試行する回数
+WRITE_RETRIES = 3
+# flush で書き込みの完了を待つ最大時間（秒）
+WRITE_FLUSH_TIMEOUT = 10.0
+
+def _current_session_key():
+    """書き込みと読み込みを対応付けるキー（Streamlitのセッション、なければスレッド）"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        return ctx.session_id
+    return f"thread-{threading.get_ident()}"
+
+class WriteBehindWriter:
+    """履歴・チャットの書き込みをバックグラウンドのスレッドでまとめてコミットする
+
+    書き込みは上限付きのキューに積んで呼び出し元にすぐ戻り、専用のスレッドがキューに溜まった分を
+    1つのトランザクションでコミットする（グループコミット）。キューが一杯の時は空くまで呼び出し元を待たせる。
+    読み込みの前には flush() で、同じセッションが積んだ書き込みがコミットされるのを待つ。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(WriteBehindWriter, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        # キューに積む順番と連番の順番を一致させる（コミット済みの連番を1つの値で管理するため）
+        self._submit_lock = threading.Lock()
+        self._thread = None
+        self._last_seq = 0
+        self._committed_seq = 0
+        self._pending = {}
+        self._errors = {}
+        self._counters = {
+            "submitted": 0,
+            "committed": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "commit_seconds": 0.0,
+            "max_queue_depth": 0,
+            "blocked": 0,
+            "blocked_seconds": 0.0,
+            "flush_waits": 0,
+            "flush_wait_seconds": 0.0,
+            "flush_timeouts": 0,
+        }
+        atexit.register(self.flush_all)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, write, error_message):
+        """書き込みをキューに積む
+
+        Args:
+            write: カーソルを受け取って書き込みを行う関数
+            error_message (str): 書き込みに失敗した時に flush で通知するメッセージ
+        """
+        self._ensure_thread()
+        session = _current_session_key()
+        with self._submit_lock:
+            with self._lock:
+                self._last_seq += 1
+                seq = self._last_seq
+                self._pending[session] = seq
+            job = (seq, session, write, error_message)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                start = time.monotonic()
+                self._queue.put(job)
+                with self._lock:
+                    self._counters["blocked"] += 1
+                    self._counters["blocked_seconds"] += time.monotonic() - start
+        with self._lock:
+            self._counters["submitted"] += 1
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], self._queue.qsize())
+        return seq
+
+    def flush(self, session=None, timeout=WRITE_FLUSH_TIMEOUT):
+        """sessionが積んだ書き込みがすべてコミットされるまで待つ
+
+        Returns:
+            list: 前回の flush 以降に失敗したsessionの書き込みのエラーメッセージ
+        """
+        session = session or _current_session_key()
+        with self._lock:
+            target = self._pending.get(session, 0)
+            if self._committed_seq < target:
+                start = time.monotonic()
+                self._counters["flush_waits"] += 1
+                if not self._committed.wait_for(lambda: self._committed_seq >= target, timeout):
+                    self._counters["flush_timeouts"] += 1
+                self._counters["flush_wait_seconds"] += time.monotonic() - start
+            if self._committed_seq >= target:
+                self._pending.pop(session, None)
+            return self._errors.pop(session, [])
+
+    def flush_all(self, timeout=WRITE_FLUSH_TIMEOUT):
+        """キューに積まれたすべての書き込みがコミットされるまで待つ"""
+        with self._lock:
+            target = self._last_seq
+            self._committed.wait_for(lambda: self._committed_seq >= target, timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 前回のコミット中に溜まった書き込みを同じトランザクションにまとめる
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            start = time.monotonic()
+            try:
+                failures = self._commit(batch)
+            except Exception as e:
+                # 想定外の例外でもスレッドを止めない（止まるとflushがタイムアウトまで待たされる）。
+                # 開いたままのトランザクションを戻し、バッチ全体を失敗として通知する
+                try:
+                    get_db_connection().rollback()
+                except sqlite3.Error:
+                    pass
+                failures = [(session, f"{error_message}: {str(e)}") for _, session, _, error_message in batch]
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._committed_seq = batch[-1][0]
+                for session, message in failures:
+                    self._errors.setdefault(session, []).append(message)
+                self._counters["committed"] += len(batch) - len(failures)
+                self._counters["failed"] += len(failures)
+                self._counters["batches"] += 1
+                self._counters["max_batch_size"] = max(self._counters["max_batch_size"], len(batch))
+                self._counters["commit_seconds"] += elapsed
+                self._committed.notify_all()
+
+    def _commit(self, batch):
+        """batchを1つのトランザクションで書き込み、失敗した書き込みの(セッション, メッセージ)を返す
+
+        1件の失敗で他の書き込みが失われないよう、書き込みごとにセーブポイントを置く。
+        """
+        conn = get_db_connection()
+        error = None
+        for attempt in range(WRITE_RETRIES):
+            failures = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                c = conn.cursor()
+                for _, session, write, error_message in batch:
+                    c.execute('SAVEPOINT write_job')
+                    try:
+                        write(c)
+                    except Exception as e:
+                        c.execute('ROLLBACK TO write_job')
+                        failures.append((session, f"{error_message}: {str(e)}"))
+                    c.execute('RELEASE write_job')
+                conn.commit()
+                return failures
+            except sqlite3.Error as e:
+                conn.rollback()
+                error = e
+                time.sleep(0.1 * (attempt + 1))
+        return [(session, f"{error_message}: {str(error)}") for _, session, _, error_message in batch]
+
+    def stats(self):
+        """書き込みキューの統計情報を取得する"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters["queue_depth"] = self._queue.qsize()
+        counters["queue_size"] = WRITE_QUEUE_SIZE
+        counters["avg_batch_size"] = (
+            (counters["committed"] + counters["failed"]) / counters["batches"] if counters["batches"] else 0.0
+        )
+        counters["avg_commit_ms"] = (
+            counters["commit_seconds"] * 1000 / counters["batches"] if counters["batches"] else 0.0
+        )
+        return counters
+
+def get_db_writer():
+    """プロセス共有のWriteBehindWriterを取得する"""
+    return WriteBehindWriter()
+
+def flush_pending_writes():
+    """このセッションの書き込みがコミットされるのを待ち、失敗した書き込みがあれば警告を表示する"""
+    for message in get_db_writer().flush():
+        st.warning(message)
+
+# save_request の metrics から保存する通信の付帯情報のカラム
+#   hedge_won: NULL=ヘッジなし, 0=元のリクエストが先着, 1=ヘッジが先着
+#   *_bytes: 展開後のバイト数, *_wire_bytes: 圧縮後の実際の転送量
+#   *_ms: フェーズごとの所要時間（dns/connect/proxy_connect/tlsは新規接続時のみ）
+REQUEST_METRIC_COLUMNS = {
+    'hedge_won': 'INTEGER',
+    'request_bytes': 'INTEGER',
+    'request_wire_bytes': 'INTEGER',
+    'response_bytes': 'INTEGER',
+    'response_wire_bytes': 'INTEGER',
+    'dns_ms': 'REAL',
+    'connect_ms': 'REAL',
+    'proxy_connect_ms': 'REAL',
+    'tls_ms': 'REAL',
+    'ttfb_ms': 'REAL',
+    'download_ms': 'REAL',
+    'total_ms': 'REAL'
+}
+
+# 履歴の表示用に書き込み時に作成するカラム（derive_request_columns の戻り値の順）
+DERIVED_REQUEST_COLUMNS = {
+    'question': 'TEXT',
+    'answer': 'TEXT',
+    'thoughts': 'TEXT',
+    'error': 'TEXT',
+    'data_points_text': 'TEXT',
+    'effective_prompt_template': 'TEXT'
+}
+
+# 値を共有ブロブ（payload_blobs）に保存する表示用カラム。読み込む時は payload_text() で展開する
+SHARED_PAYLOAD_COLUMNS = ('data_points_text', 'effective_prompt_template')
+
+# 共有ブロブへの参照を保存するカラム（テーブル -> カラム）
+PAYLOAD_REF_COLUMNS = {
+    'requests': ('prompt_template', 'response_data_points') + SHARED_PAYLOAD_COLUMNS,
+    'chat_messages': ('context_data_points',),
+}
+
+# 履歴一覧で取得する表示用カラム（表示名 -> SQLの式）
+HISTORY_COLUMNS = {
+    'request_time': 'request_time',
+    'request_name': 'request_name',
+    'url': 'url',
+    'status_code': 'status_code',
+    'backend_id': 'backend_id',
+    'memo': 'memo',
+    'question': 'question',
+    'answer': 'answer',
+    'thoughts': 'thoughts',
+    'error': 'error',
+    'data_points': 'payload_text(data_points_text)',
+    'prompt_template': 'payload_text(effective_prompt_template)'
+}
+
+HISTORY_SELECT_COLUMNS = ','.join(
+    f'\n            {expression}' + (f' AS {name}' if expression != name else '')
+    for name, expression in HISTORY_COLUMNS.items()
+)
+
+def _ensure_columns(cursor, table, columns):
+    """既存のテーブルに不足しているカラムを追加する
+
+    Args:
+        cursor: sqlite3のカーソル
+        table (str): テーブル名
+        columns (dict): カラム名 -> 型定義
+    """
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+def _column_expression(column, prefix=''):
+    """SQLでカラムの元のテキストを取得する式（prefixは 'new.' などの修飾）"""
+    expression = f'{prefix}{column}'
+    return f'payload_text({expression})' if column in SHARED_PAYLOAD_COLUMNS else expression
+
+def _resolve_payload(conn, value):
+    """保存形式の値を元のテキストに戻す（payload_text() の実装）"""
+    digest = ref_hash(value)
+    if digest is None:
+        return decompress_value(value)
+    cache = get_payload_blob_cache()
+    text = cache.get(digest)
+    if text is None:
+        row = conn.execute('SELECT data FROM payload_blobs WHERE hash = ?', (digest,)).fetchone()
+        if row is None:
+            # アーカイブの行の参照は、アタッチ中のアーカイブのブロブから探す
+            schemas = [
+                name for _, name, _ in conn.execute('PRAGMA database_list').fetchall()
+                if name.startswith(f'{ARCHIVE_SCHEMA}_')
+            ]
+            for schema in schemas:
+                try:
+                    row = conn.execute(f'SELECT data FROM {schema}.payload_blobs WHERE hash = ?', (digest,)).fetchone()
+                except sqlite3.OperationalError:
+                    row = None
+                if row is not None:
+                    break
+        if row is None:
+            return None
+        text = decompress_value(row[0])
+        cache.put(digest, text)
+    return text
+
+def _store_blob(cursor, text):
+    """テキストをpayload_blobsに保存して参照を返す（短いテキストはそのまま返す）"""
+    if text is None or isinstance(text, bytes) or len(text) < PAYLOAD_BLOB_MIN:
+        return text
+    digest = content_hash(text)
+    cursor.execute(
+        'INSERT OR IGNORE INTO payload_blobs (hash, data, size) VALUES (?, ?, ?)',
+        (digest, compress_text(text), len(text.encode('utf-8')))
+    )
+    return make_ref(digest)
+
+def _encode_json_payload(cursor, payload):
+    """レスポンスやチャットのコンテキストを保存形式にする
+
+    data_pointsは同じ内容が多くの行で繰り返されるため共有ブロブに分け、残りを圧縮する。
+
+    Returns:
+        tuple: (data_pointsを除いたJSONの保存形式, data_pointsのJSONの保存形式。なければNone)
+    """
+    if not isinstance(payload, dict):
+        return compress_text(json.dumps(payload, ensure_ascii=False)), None
+    payload = dict(payload)
+    data_points = None
+    if 'data_points' in payload:
+        data_points = _store_blob(cursor, json.dumps(payload.pop('data_points'), ensure_ascii=False))
+    return compress_text(json.dumps(payload, ensure_ascii=False)), data_points
+
+def _decode_json_payload(payload_text, data_points_text):
+    """_encode_json_payload で分けたJSONを1つのdictに戻す"""
+    payload = json.loads(payload_text) if payload_text else None
+    if data_points_text is not None and isinstance(payload, dict):
+        payload['data_points'] = json.loads(data_points_text)
+    return payload
+
+def _create_fts_index(c, fts_table, table, columns):
+    """external contentのFTS5テーブルと、tableの変更を反映するトリガーを作成し、索引を作り直す"""
+    column_list = ', '.join(columns)
+    new_values = ', '.join(_column_expression(column, 'new.') for column in columns)
+    old_values = ', '.join(_column_expression(column, 'old.') for column in columns)
+    c.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {column_list},
+            content='{table}',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    ''')
+    # 既存の行を索引に登録する
+    c.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+def _create_requests_fts_index(c, schema='main'):
+    """履歴の全文検索の索引（本文を自身に保存するFTS5テーブル）と、削除・更新を反映するトリガーを作成する
+
+    data_points_textの元のテキストは payload_text() でしか展開できず、この関数はアプリの接続にしか登録されない。
+    索引への追加は書き込み時にPythonで展開したテキストで行い（_index_requests）、
+    トリガーはそのままのカラムだけを参照する。アプリ以外の接続から行を更新・削除しても失敗しない。
+    """
+    table, columns = FULL_TEXT_INDEXES['requests_fts']
+    plain_columns = [column for column in columns if column not in SHARED_PAYLOAD_COLUMNS]
+    c.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.requests_fts USING fts5(
+            {', '.join(columns)},
+            tokenize='trigram'
+        )
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {schema}.requests_fts_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM requests_fts WHERE rowid = old.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {schema}.requests_fts_update AFTER UPDATE OF {', '.join(plain_columns)} ON {table} BEGIN
+            UPDATE requests_fts SET {', '.join(f'{column} = new.{column}' for column in plain_columns)}
+            WHERE rowid = old.id;
+        END
+    ''')
 
-    # Create tables
+def _index_requests(c, rows, schema='main'):
+    """履歴の行を全文検索の索引に登録する
+
+    Args:
+        rows: (id, FULL_TEXT_INDEXES['requests_fts'] のカラムの値...) のリスト。
+            共有ブロブのカラムは展開したテキストでも保存形式の値でもよい
+    """
+    columns = FULL_TEXT_INDEXES['requests_fts'][1]
+    shared = [column in SHARED_PAYLOAD_COLUMNS for column in columns]
+    c.executemany(
+        f'''INSERT INTO {schema}.requests_fts (rowid, {', '.join(columns)})
+            VALUES (?, {', '.join('?' * len(columns))})''',
+        [
+            (row[0],) + tuple(
+                _resolve_payload(c, value) if is_shared and isinstance(value, bytes) else value
+                for is_shared, value in zip(shared, row[1:])
+            )
+            for row in rows
+        ]
+    )
+
+def _reindex_requests(c, schema='main'):
+    """schemaのrequestsの全行を索引に登録する"""
+    columns = FULL_TEXT_INDEXES['requests_fts'][1]
+    last_id = 0
+    while True:
+        rows = c.execute(f'''
+            SELECT id, {', '.join(columns)} FROM {schema}.requests
+            WHERE id > ? ORDER BY id LIMIT 500
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        _index_requests(c, rows, schema)
+        last_id = rows[-1][0]
+
+def _migrate_baseline(c):
+    """v1: マイグレーション導入前からあるテーブル"""
     c.execute('''
         CREATE TABLE IF NOT EXISTS settings (
             key TEXT PRIMARY KEY,
@@ -84,8 +637,233 @@ def init_db():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+def _migrate_cache_and_metrics(c):
+    """v2: レスポンスキャッシュと通信の付帯情報のカラム"""
+    # Simple Q&Aのレスポンスキャッシュ（永続化層）
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            url TEXT,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+    _ensure_columns(c, 'requests', REQUEST_METRIC_COLUMNS)
+
+def _migrate_hot_query_indexes(c):
+    """v3: 履歴・チャットの検索と並べ替えに使うインデックス"""
+    # load_requests_summary（request_time順）と履歴のページング
+    c.execute('CREATE INDEX IF NOT EXISTS idx_requests_time_id ON requests (request_time, id)')
+    # update_request_memo / delete_request
+    c.execute('CREATE INDEX IF NOT EXISTS idx_requests_name ON requests (request_name)')
+    # load_chat_messages（thread_idで絞り込み、created_at順）
+    c.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_thread_time ON chat_messages (thread_id, created_at)')
+    # load_chat_threads（updated_at順）
+    c.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_updated ON chat_threads (updated_at)')
+    # save_cached_response の期限切れエントリの削除
+    c.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created_at)')
+
+def _migrate_request_backend(c):
+    """v4: リクエストのバックエンドIDと、履歴の絞り込み用インデックス"""
+    _ensure_columns(c, 'requests', {'backend_id': 'TEXT'})
+    c.execute('CREATE INDEX IF NOT EXISTS idx_requests_backend_time_id ON requests (backend_id, request_time, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_requests_status_time_id ON requests (status_code, request_time, id)')
+
+def _migrate_materialized_history(c):
+    """v5: 履歴の表示用カラムを追加し、既存の行を埋める"""
+    _ensure_columns(c, 'requests', DERIVED_REQUEST_COLUMNS)
+    assignments = ', '.join(f'{column} = ?' for column in DERIVED_REQUEST_COLUMNS)
+    last_id = 0
+    while True:
+        rows = c.execute('''
+            SELECT id, post_data, response, prompt_template FROM requests
+            WHERE id > ? AND question IS NULL
+            ORDER BY id LIMIT 500
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        c.executemany(
+            f'UPDATE requests SET {assignments} WHERE id = ?',
+            [derive_request_columns(post_data, response, prompt_template) + (row_id,)
+             for row_id, post_data, response, prompt_template in rows]
+        )
+        last_id = rows[-1][0]
+
+# 全文検索の対象（FTS5テーブル -> (元のテーブル, 検索するカラム)）
+FULL_TEXT_INDEXES = {
+    'requests_fts': ('requests', ('question', 'answer', 'memo', 'data_points_text', 'request_name')),
+    'chat_messages_fts': ('chat_messages', ('content',)),
+}
+
+# trigramトークナイザが索引を使えない（3文字未満の）検索語はLIKEで検索する
+FTS_MIN_TERM_LENGTH = 3
+
+def _migrate_full_text_search(c):
+    """v6: 履歴とチャットメッセージの全文検索用のFTS5テーブルと同期用のトリガー
+
+    日本語は単語の区切りがないため、trigramトークナイザで3文字ずつ索引を作る。
+    チャットメッセージは本文を元のテーブルから参照する（external content）。
+    履歴はv7で共有ブロブの参照に置き換わるカラムがあるため、展開したテキストを索引自身に保存する。
+    """
+    table, columns = FULL_TEXT_INDEXES['chat_messages_fts']
+    _create_fts_index(c, 'chat_messages_fts', table, columns)
+    _create_requests_fts_index(c)
+    _reindex_requests(c)
+
+def _migrate_payload_storage(c):
+    """v7: 大きな値の圧縮と、繰り返し現れる値の共有ブロブ化
+
+    data_points・プロンプトテンプレートはpayload_blobsに内容のハッシュをキーとして1件だけ保存し、
+    行にはその参照を保存する。POSTデータ・レスポンス・コンテキストはzlibで圧縮する。
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS payload_blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    _ensure_columns(c, 'requests', {'response_data_points': 'BLOB'})
+    _ensure_columns(c, 'chat_messages', {'context_data_points': 'BLOB'})
+
+    # 全文検索の索引は展開したテキストを保持しており、値の保存形式が変わっても作り直す必要はない
+    last_id = 0
+    while True:
+        rows = c.execute('''
+            SELECT id, post_data, response, prompt_template, data_points_text, effective_prompt_template
+            FROM requests WHERE id > ? ORDER BY id LIMIT 500
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, post_data, response, prompt_template, data_points_text, effective_prompt_template in rows:
+            response_data_points = None
+            if isinstance(response, str):
+                try:
+                    response_dict = json.loads(response)
+                except json.JSONDecodeError:
+                    response_dict = None
+                if isinstance(response_dict, dict):
+                    response, response_data_points = _encode_json_payload(c, response_dict)
+                else:
+                    response = compress_text(response)
+            updates.append((
+                post_data if isinstance(post_data, bytes) else compress_text(post_data),
+                response,
+                response_data_points,
+                _store_blob(c, prompt_template),
+                _store_blob(c, data_points_text),
+                _store_blob(c, effective_prompt_template),
+                row_id
+            ))
+        c.executemany('''
+            UPDATE requests
+            SET post_data = ?, response = ?, response_data_points = COALESCE(?, response_data_points),
+                prompt_template = ?, data_points_text = ?, effective_prompt_template = ?
+            WHERE id = ?
+        ''', updates)
+        last_id = rows[-1][0]
+
+    last_id = 0
+    while True:
+        rows = c.execute('''
+            SELECT id, context FROM chat_messages
+            WHERE id > ? AND typeof(context) = 'text' ORDER BY id LIMIT 500
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, context in rows:
+            try:
+                context_dict = json.loads(context)
+            except json.JSONDecodeError:
+                context_dict = None
+            if isinstance(context_dict, dict):
+                updates.append(_encode_json_payload(c, context_dict) + (row_id,))
+            else:
+                updates.append((compress_text(context), None, row_id))
+        c.executemany(
+            'UPDATE chat_messages SET context = ?, context_data_points = ? WHERE id = ?',
+            updates
+        )
+        last_id = rows[-1][0]
+
+    rows = c.execute("SELECT cache_key, response FROM response_cache WHERE typeof(response) = 'text'").fetchall()
+    c.executemany(
+        'UPDATE response_cache SET response = ? WHERE cache_key = ?',
+        [(compress_text(response), cache_key) for cache_key, response in rows]
+    )
+
+def _migrate_incremental_vacuum(c):
+    """v8: 履歴をアーカイブに移した後の空き領域を少しずつ返せるようにする（適用後のVACUUMで有効になる）"""
+    c.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+def _migrate_requests_revision(c):
+    """v9: 履歴の更新・削除のたびに増えるリビジョン（概要のキャッシュの無効化に使う）
+
+    追加は max(id) と件数で検出できるため、トリガーは更新と削除のみに設定する。
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS requests_revision
+                 (id INTEGER PRIMARY KEY CHECK (id = 1),
+                  revision INTEGER NOT NULL)''')
+    c.execute('INSERT OR IGNORE INTO requests_revision (id, revision) VALUES (1, 0)')
+    for event in ('UPDATE', 'DELETE'):
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS requests_revision_{event.lower()} AFTER {event} ON requests BEGIN
+                UPDATE requests_revision SET revision = revision + 1 WHERE id = 1;
+            END
+        ''')
+
+# スキーママイグレーション（バージョン, 説明, 適用する関数）。
+# 適用済みのバージョンは PRAGMA user_version に記録する。既存の定義は変更せず、末尾に追加すること
+MIGRATIONS = [
+    (1, "baseline", _migrate_baseline),
+    (2, "response cache and request metrics", _migrate_cache_and_metrics),
+    (3, "indexes for hot queries", _migrate_hot_query_indexes),
+    (4, "request backend id", _migrate_request_backend),
+    (5, "materialized history columns", _migrate_materialized_history),
+    (6, "full-text search", _migrate_full_text_search),
+    (7, "compressed and shared payload storage", _migrate_payload_storage),
+    (8, "incremental auto-vacuum", _migrate_incremental_vacuum),
+    (9, "requests revision counter", _migrate_requests_revision),
+]
+
+# 適用後にVACUUMでファイルを縮めるマイグレーション（既存の行を書き換えて空き領域が大きくできるもの）
+VACUUM_AFTER_MIGRATIONS = {7, 8}
+
+def get_schema_version(conn=None):
+    """適用済みのスキーマバージョンを取得する"""
+    conn = conn or get_db_connection()
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def init_db():
+    """未適用のスキーママイグレーションを順に適用する
+
+    各マイグレーションは書き込みロックを取ったトランザクション内でバージョンを確認してから適用するため、
+    複数のセッションから同時に呼ばれても二重に適用されない。
+    """
+    conn = get_db_connection()
+    if get_schema_version(conn) >= MIGRATIONS[-1][0]:
+        return
+
+    applied = set()
+    for version, description, migrate in MIGRATIONS:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if get_schema_version(conn) < version:
+                migrate(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+                applied.add(version)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise sqlite3.Error(f"スキーマのマイグレーション（v{version}: {description}）に失敗しました: {str(e)}")
+
+    if applied & VACUUM_AFTER_MIGRATIONS:
+        conn.execute('VACUUM')
+    # 追加したインデックスの統計情報を更新する
+    conn.execute('PRAGMA optimize')
 
 def initialize_session_state():
     """基本的なデータベース関連のセッション状態を初期化する"""
@@ -250,6 +1028,52 @@ def load_last_used_urls():
         except sqlite3.Error as e:
             raise sqlite3.Error(f"最後に使用したURLの読み込みに失敗しました: {str(e)}")
 
+# save_setting のたびに増える設定の版数を保持するキー
+SETTINGS_REVISION_KEY = 'settings_revision'
+
+def save_setting(key, value):
+    """任意の設定値をJSONとして保存する（設定の版数も1つ進める）"""
+    if not key or not isinstance(key, str):
+        raise ValueError("keyは空にできません")
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                     (key, json.dumps(value, ensure_ascii=False)))
+            # 他のセッションがキャッシュした設定を破棄できるよう、同じトランザクションで版数を進める
+            c.execute('''INSERT INTO settings (key, value) VALUES (?, '1')
+                         ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)''',
+                      (SETTINGS_REVISION_KEY,))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise sqlite3.Error(f"設定の保存に失敗しました: {str(e)}")
+
+def get_settings_revision():
+    """設定の版数を取得する（save_setting で保存するたびに増える）"""
+    return load_setting(SETTINGS_REVISION_KEY, 0)
+
+def load_setting(key, default=None):
+    """保存された設定値を読み込む（未保存の場合はdefaultを返す）"""
+    if not key or not isinstance(key, str):
+        raise ValueError("keyは空にできません")
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute('SELECT value FROM settings WHERE key = ?', (key,))
+            result = c.fetchone()
+        except sqlite3.Error as e:
+            raise sqlite3.Error(f"設定の読み込みに失敗しました: {str(e)}")
+
+    if not result or result[0] is None:
+        return default
+    try:
+        return json.loads(result[0])
+    except json.JSONDecodeError:
+        return result[0]
+
 def get_all_post_data():
     """すべての保存されたPOSTデータを取得する"""
     with get_db_connection() as conn:
@@ -311,8 +1135,13 @@ def import_post_data(import_data):
             conn.rollback()
             raise sqlite3.Error(f"データのインポートに失敗しました: {str(e)}")
 
-def save_request(target_url, post_data, response, proxy_url=None, request_name=None):
-    """リクエスト情報をデータベースに保存する"""
+def save_request(target_url, post_data, response, proxy_url=None, request_name=None, metrics=None, backend_id=None):
+    """リクエスト情報をデータベースに保存する
+
+    Args:
+        metrics (dict, optional): make_request の meta に書き込まれた通信の付帯情報
+        backend_id (str, optional): リクエストを送信したバックエンドのID
+    """
     if not target_url or not isinstance(target_url, str):
         raise ValueError("target_urlは必須で、文字列である必要があります")
     if not post_data or not isinstance(post_data, str):
@@ -331,41 +1160,101 @@ def save_request(target_url, post_data, response, proxy_url=None, request_name=N
             raise ValueError("responseは文字列またはdict型である必要があります")
         
         status_code = response_dict.get('status_code', 0)
-        response_str = json.dumps(response_dict)
     except json.JSONDecodeError as e:
         raise ValueError(f"responseのJSON形式が不正です: {str(e)}")
     except Exception as e:
         raise ValueError(f"responseの処理中にエラーが発生しました: {str(e)}")
 
+    metrics = dict(metrics or {})
+    if metrics.get('hedge_won') is not None:
+        metrics['hedge_won'] = int(bool(metrics['hedge_won']))
+    metric_values = tuple(metrics.get(column) for column in REQUEST_METRIC_COLUMNS)
+
+    prompt_template = ""
+    try:
+        prompt_template = extract_prompt_template(json.loads(post_data)) or ""
+    except (json.JSONDecodeError, AttributeError) as e:
+        st.error(f"prompt_templateの抽出中にエラーが発生しました: {str(e)}")
+
+    def write(c):
+        derived = derive_request_columns(post_data, response_dict, prompt_template)
+        derived_values = tuple(
+            _store_blob(c, value) if column in SHARED_PAYLOAD_COLUMNS else value
+            for column, value in zip(DERIVED_REQUEST_COLUMNS, derived)
+        )
+        response_value, response_data_points = _encode_json_payload(c, response_dict)
+
+        extra_columns = ', '.join(list(REQUEST_METRIC_COLUMNS) + list(DERIVED_REQUEST_COLUMNS))
+        placeholders = ', '.join('?' * (10 + len(REQUEST_METRIC_COLUMNS) + len(DERIVED_REQUEST_COLUMNS)))
+        c.execute(f'''
+            INSERT INTO requests
+            (request_time, request_name, url, proxy_url, post_data, response, response_data_points, status_code,
+             prompt_template, backend_id, {extra_columns})
+            VALUES ({placeholders})
+        ''', (request_time, request_name, target_url, proxy_url, compress_text(post_data), response_value,
+              response_data_points, status_code, _store_blob(c, prompt_template), backend_id)
+            + metric_values + derived_values)
+        # 索引には共有ブロブの参照ではなく元のテキストを登録する
+        text = dict(zip(DERIVED_REQUEST_COLUMNS, derived), request_name=request_name, memo=None)
+        _index_requests(c, [(c.lastrowid,) + tuple(text[column] for column in FULL_TEXT_INDEXES['requests_fts'][1])])
+
+    # 書き込みはバックグラウンドでまとめてコミットする（失敗は次の読み込み時に警告として表示される）
+    get_db_writer().submit(write, "リクエスト情報の保存に失敗しました")
+
+def load_cached_response(cache_key, min_created_at=0.0):
+    """キャッシュされたレスポンスを読み込む（min_created_atより古いものは無視する）
+
+    Returns:
+        tuple | None: (レスポンス, 保存した時刻)。見つからない場合はNone
+    """
+    if not cache_key or not isinstance(cache_key, str):
+        raise ValueError("cache_keyは空にできません")
+
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
-            prompt_template = ""
-            try:
-                post_data_dict = json.loads(post_data)
-                if isinstance(post_data_dict, dict):
-                    if ('prompts' in post_data_dict and
-                        isinstance(post_data_dict['prompts'], dict) and
-                        'prompt_template' in post_data_dict['prompts']):
-                        prompt_template = str(post_data_dict['prompts']['prompt_template'])
-                    elif 'prompt_template' in post_data_dict:
-                        prompt_template = str(post_data_dict['prompt_template'])
-                    elif ('overrides' in post_data_dict and
-                          isinstance(post_data_dict['overrides'], dict) and
-                          'prompt_template' in post_data_dict['overrides']):
-                        prompt_template = str(post_data_dict['overrides']['prompt_template'])
-            except (json.JSONDecodeError, AttributeError) as e:
-                st.error(f"prompt_templateの抽出中にエラーが発生しました: {str(e)}")
+            c.execute(
+                'SELECT payload_text(response), created_at FROM response_cache WHERE cache_key = ? AND created_at >= ?',
+                (cache_key, min_created_at)
+            )
+            result = c.fetchone()
+            return (json.loads(result[0]), result[1]) if result else None
+        except sqlite3.Error as e:
+            raise sqlite3.Error(f"キャッシュの読み込みに失敗しました: {str(e)}")
+        except json.JSONDecodeError:
+            return None
 
-            c.execute('''
-                INSERT INTO requests
-                (request_time, request_name, url, proxy_url, post_data, response, status_code, prompt_template)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (request_time, request_name, target_url, proxy_url, post_data, response_str, status_code, prompt_template))
+def save_cached_response(cache_key, url, response, created_at, prune_before=None):
+    """レスポンスをキャッシュに保存する（prune_beforeより古いエントリは削除する）"""
+    if not cache_key or not isinstance(cache_key, str):
+        raise ValueError("cache_keyは空にできません")
+    if not isinstance(response, dict):
+        raise ValueError("responseはdict型である必要があります")
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(
+                'INSERT OR REPLACE INTO response_cache (cache_key, url, response, created_at) VALUES (?, ?, ?, ?)',
+                (cache_key, url, compress_text(json.dumps(response, ensure_ascii=False)), created_at)
+            )
+            if prune_before is not None:
+                c.execute('DELETE FROM response_cache WHERE created_at < ?', (prune_before,))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise sqlite3.Error(f"キャッシュの保存に失敗しました: {str(e)}")
+
+def clear_response_cache():
+    """レスポンスキャッシュを全件削除する"""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute('DELETE FROM response_cache')
             conn.commit()
         except sqlite3.Error as e:
             conn.rollback()
-            raise sqlite3.Error(f"リクエスト情報の保存に失敗しました: {str(e)}")
+            raise sqlite3.Error(f"キャッシュの削除に失敗しました: {str(e)}")
 
 # 新しい関数群
 
@@ -419,17 +1308,13 @@ def save_chat_thread(thread_id, name):
     if not name or not isinstance(name, str):
         raise ValueError("nameは空にできません")
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute('''
-                INSERT OR REPLACE INTO chat_threads (id, name, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            ''', (thread_id, name))
-            conn.commit()
-        except sqlite3.Error as e:
-            conn.rollback()
-            raise sqlite3.Error(f"チャットスレッドの保存に失敗しました: {str(e)}")
+    def write(c):
+        c.execute('''
+            INSERT OR REPLACE INTO chat_threads (id, name, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (thread_id, name))
+
+    get_db_writer().submit(write, "チャットスレッドの保存に失敗しました")
 
 def save_chat_message(thread_id, role, content, context=None):
     """チャットメッセージを保存"""
@@ -440,29 +1325,27 @@ def save_chat_message(thread_id, role, content, context=None):
     if not content or not isinstance(content, str):
         raise ValueError("contentは空にできません")
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            context_json = json.dumps(context) if context else None
-            c.execute('''
-                INSERT INTO chat_messages (thread_id, role, content, context)
-                VALUES (?, ?, ?, ?)
-            ''', (thread_id, role, content, context_json))
-            
-            # スレッドの更新時刻を更新
-            c.execute('''
-                UPDATE chat_threads
-                SET updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (thread_id,))
-            
-            conn.commit()
-        except sqlite3.Error as e:
-            conn.rollback()
-            raise sqlite3.Error(f"チャットメッセージの保存に失敗しました: {str(e)}")
+    def write(c):
+        context_value, context_data_points = (
+            _encode_json_payload(c, context) if context else (None, None)
+        )
+        c.execute('''
+            INSERT INTO chat_messages (thread_id, role, content, context, context_data_points)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (thread_id, role, content, context_value, context_data_points))
+
+        # スレッドの更新時刻を更新
+        c.execute('''
+            UPDATE chat_threads
+            SET updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (thread_id,))
+
+    get_db_writer().submit(write, "チャットメッセージの保存に失敗しました")
 
 def load_chat_threads():
     """保存されているチャットスレッド一覧を取得"""
+    flush_pending_writes()
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
@@ -485,11 +1368,12 @@ def load_chat_messages(thread_id):
     if not thread_id or not isinstance(thread_id, str):
         raise ValueError("thread_idは空にできません")
 
+    flush_pending_writes()
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
             c.execute('''
-                SELECT role, content, context, created_at
+                SELECT role, content, payload_text(context), payload_text(context_data_points), created_at
                 FROM chat_messages
                 WHERE thread_id = ?
                 ORDER BY created_at ASC
@@ -497,8 +1381,8 @@ def load_chat_messages(thread_id):
             return [{
                 "role": row[0],
                 "content": row[1],
-                "context": json.loads(row[2]) if row[2] else None,
-                "created_at": row[3].strftime('%Y-%m-%d %H:%M:%S') if row[3] else None
+                "context": _decode_json_payload(row[2], row[3]),
+                "created_at": row[4].strftime('%Y-%m-%d %H:%M:%S') if row[4] else None
             } for row in c.fetchall()]
         except sqlite3.Error as e:
             raise sqlite3.Error(f"チャットメッセージの取得に失敗しました: {str(e)}")
@@ -508,6 +1392,7 @@ def delete_chat_thread(thread_id):
     if not thread_id or not isinstance(thread_id, str):
         raise ValueError("thread_idは空にできません")
 
+    flush_pending_writes()
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
@@ -517,115 +1402,632 @@ def delete_chat_thread(thread_id):
             conn.rollback()
             raise sqlite3.Error(f"チャットスレッドの削除に失敗しました: {str(e)}")
 
-def load_requests_summary():
-    """保存されたリクエスト情報の概要を取得する"""
-    query = '''
-        SELECT
-            request_time,
-            request_name,
-            url,
-            status_code,
-            post_data,
-            response,
-            memo,
-            prompt_template,
-            COALESCE(
-                prompt_template,
-                json_extract(post_data, '$.prompts.prompt_template'),
-                json_extract(post_data, '$.prompt_template'),
-                json_extract(post_data, '$.overrides.prompt_template'),
-                ''
-            ) as effective_prompt_template
-        FROM requests
-        ORDER BY request_time DESC
-    '''
-
-    with get_db_connection() as conn:
-        try:
-            df = pd.read_sql_query(query, conn, parse_dates=['request_time'])
-        except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
-            raise sqlite3.Error(f"リクエスト情報の読み込みに失敗しました: {str(e)}")
-
-    if not df.empty:
-        # レスポンスカラムの処理
-        def extract_response_data(row):
-            """レスポンスデータから必要な情報を抽出する"""
+def extract_response_fields(response):
+    """レスポンスから履歴に表示する情報（error/answer/thoughts/data_points）を抽出する"""
+    try:
+        # レスポンスデータの解析
+        if isinstance(response, str):
             try:
-                # レスポンスデータの解析
-                if isinstance(row['response'], str):
-                    try:
-                        response = json.loads(row['response'])
-                    except json.JSONDecodeError:
-                        return {
-                            'error': 'JSONの解析に失敗しました',
-                            'answer': '',
-                            'thoughts': '',
-                            'data_points': ''
-                        }
-                elif isinstance(row['response'], dict):
-                    response = row['response']
-                else:
-                    return {
-                        'error': '不正なレスポンス形式です',
-                        'answer': '',
-                        'thoughts': '',
-                        'data_points': ''
-                    }
-
-                # データポイントの処理
-                try:
-                    data_points = response.get('data_points', [])
-                    if not isinstance(data_points, list):
-                        data_points = []
-                    data_points_str = "\n=========================\n".join([f"{i+1}. {point}" for i, point in enumerate(data_points)])
-                except Exception:
-                    data_points_str = ""
-
-                return {
-                    'error': str(response.get('error', '')),
-                    'answer': str(response.get('answer', '')),
-                    'thoughts': str(response.get('thoughts', '')),
-                    'data_points': data_points_str
-                }
-            except Exception as e:
+                response = json.loads(response)
+            except json.JSONDecodeError:
                 return {
-                    'error': f"データの処理中にエラーが発生しました: {str(e)}",
+                    'error': 'JSONの解析に失敗しました',
                     'answer': '',
                     'thoughts': '',
                     'data_points': ''
                 }
+        elif not isinstance(response, dict):
+            return {
+                'error': '不正なレスポンス形式です',
+                'answer': '',
+                'thoughts': '',
+                'data_points': ''
+            }
 
-        # レスポンスデータの処理
-        response_data = df.apply(extract_response_data, axis=1)
-        for key in ['error', 'answer', 'thoughts', 'data_points']:
-            df[key] = response_data.apply(lambda x: x.get(key, ''))
+        # データポイントの処理
+        try:
+            data_points = response.get('data_points', [])
+            if not isinstance(data_points, list):
+                data_points = []
+            data_points_str = "\n=========================\n".join([f"{i+1}. {point}" for i, point in enumerate(data_points)])
+        except Exception:
+            data_points_str = ""
+
+        return {
+            'error': str(response.get('error', '')),
+            'answer': str(response.get('answer', '')),
+            'thoughts': str(response.get('thoughts', '')),
+            'data_points': data_points_str
+        }
+    except Exception as e:
+        return {
+            'error': f"データの処理中にエラーが発生しました: {str(e)}",
+            'answer': '',
+            'thoughts': '',
+            'data_points': ''
+        }
+
+def extract_prompt_template(post_data_dict):
+    """POSTデータからプロンプトテンプレートを抽出する（見つからない場合はNone）"""
+    if not isinstance(post_data_dict, dict):
+        return None
+    if isinstance(post_data_dict.get('prompts'), dict) and 'prompt_template' in post_data_dict['prompts']:
+        return str(post_data_dict['prompts']['prompt_template'])
+    if 'prompt_template' in post_data_dict:
+        return str(post_data_dict['prompt_template'])
+    if isinstance(post_data_dict.get('overrides'), dict) and 'prompt_template' in post_data_dict['overrides']:
+        return str(post_data_dict['overrides']['prompt_template'])
+    return None
+
+def extract_post_data_fields(post_data, prompt_template=None):
+    """POSTデータから履歴に表示する質問とプロンプトテンプレートを抽出する
+
+    Args:
+        post_data (str): 保存するPOSTデータ（JSON文字列）
+        prompt_template (str, optional): requests.prompt_templateの値。Noneの場合はPOSTデータから取得する
+    """
+    try:
+        if not isinstance(post_data, str):
+            return {"question": "不正なPOSTデータ", "prompt_template": ""}
 
-        # POSTデータからquestionとprompt_templateを抽出
-        def extract_post_data(post_data, row):
-            """POSTデータから必要な情報を抽出する"""
-            try:
-                if not isinstance(post_data, str):
-                    return {"question": "不正なPOSTデータ", "prompt_template": ""}
-                    
-                data = json.loads(post_data)
-                if not isinstance(data, dict):
-                    return {"question": "不正なPOSTデータ形式", "prompt_template": ""}
-                
-                # 質問とプロンプトテンプレートを取得
-                question = str(data.get('question', ''))
-                prompt_template = str(row['effective_prompt_template'])
-                
-                return {"question": question, "prompt_template": prompt_template}
-            except json.JSONDecodeError:
-                return {"question": "JSONの解析に失敗", "prompt_template": ""}
-            except Exception as e:
-                return {"question": f"エラー: {str(e)}", "prompt_template": ""}
+        data = json.loads(post_data)
+        if not isinstance(data, dict):
+            return {"question": "不正なPOSTデータ形式", "prompt_template": ""}
+
+        # 質問とプロンプトテンプレートを取得
+        question = str(data.get('question', ''))
+        if prompt_template is None:
+            prompt_template = extract_prompt_template(data)
+
+        return {"question": question, "prompt_template": prompt_template or ""}
+    except json.JSONDecodeError:
+        return {"question": "JSONの解析に失敗", "prompt_template": ""}
+    except Exception as e:
+        return {"question": f"エラー: {str(e)}", "prompt_template": ""}
+
+def derive_request_columns(post_data, response, prompt_template=None):
+    """DERIVED_REQUEST_COLUMNS の値を順に返す"""
+    response_fields = extract_response_fields(response)
+    post_data_fields = extract_post_data_fields(post_data, prompt_template)
+    return (
+        post_data_fields['question'],
+        response_fields['answer'],
+        response_fields['thoughts'],
+        response_fields['error'],
+        response_fields['data_points'],
+        post_data_fields['prompt_template']
+    )
+
+class RequestsSummaryCache:
+    """履歴の概要（load_requests_summary の結果）のプロセス共有キャッシュ
+
+    Streamlitは操作のたびにスクリプトを再実行するため、requestsテーブルが変わった場合のみ読み込み直す。
+    変更は (max(id), 件数, 更新・削除のリビジョン) の透かしで検出し、
+    追加のみの場合は増えた行だけを読み込んで先頭に追加する。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RequestsSummaryCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self._watermark = None
+        # キャッシュの内容が変わるたびに増える番号（DataFrame.attrs['summary_version'] に設定する）
+        self._version = 0
+        self.hits = 0
+        self.appends = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _query(condition=''):
+        metric_columns = ',\n            '.join(REQUEST_METRIC_COLUMNS)
+        return f'''
+            SELECT{HISTORY_SELECT_COLUMNS},
+                {metric_columns}
+            FROM requests
+            {condition}
+            ORDER BY request_time DESC
+        '''
+
+    def load(self):
+        with self._lock, get_db_connection() as conn:
+            # 透かしと行を同じスナップショットで読む
+            conn.execute('BEGIN')
+            watermark = conn.execute('''
+                SELECT coalesce(max(id), 0), count(*), (SELECT revision FROM requests_revision WHERE id = 1)
+                FROM requests
+            ''').fetchone()
+
+            if self._frame is not None and watermark == self._watermark:
+                self.hits += 1
+            elif self._is_append(watermark):
+                added = pd.read_sql_query(
+                    self._query('WHERE id > ?'), conn, params=(self._watermark[0],), parse_dates=['request_time']
+                )
+                if len(added) == watermark[1] - self._watermark[1]:
+                    self._frame = self._prepend(added)
+                    self.appends += 1
+                else:
+                    self._frame = pd.read_sql_query(self._query(), conn, parse_dates=['request_time'])
+                    self.reloads += 1
+                self._update(watermark)
+            else:
+                self._frame = pd.read_sql_query(self._query(), conn, parse_dates=['request_time'])
+                self.reloads += 1
+                self._update(watermark)
+
+            frame = self._frame.copy()
+            frame.attrs['summary_version'] = self._version
+        return frame
+
+    def _is_append(self, watermark):
+        # 更新・削除がなく、IDが増えている場合は追加のみ
+        return (
+            self._frame is not None
+            and watermark[2] == self._watermark[2]
+            and watermark[0] > self._watermark[0]
+            and watermark[1] > self._watermark[1]
+        )
+
+    def _prepend(self, added):
+        frame = pd.concat([added, self._frame], ignore_index=True)
+        if not frame['request_time'].is_monotonic_decreasing:
+            frame = frame.sort_values('request_time', ascending=False, kind='stable', ignore_index=True)
+        return frame
+
+    def _update(self, watermark):
+        self._watermark = watermark
+        self._version += 1
 
-        post_data_info = df.apply(lambda row: extract_post_data(row['post_data'], row), axis=1)
-        df['question'] = post_data_info.apply(lambda x: x['question'])
-        df['prompt_template'] = post_data_info.apply(lambda x: x['prompt_template'])
+    def clear(self):
+        with self._lock:
+            self._frame = None
+            self._watermark = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": 0 if self._frame is None else len(self._frame),
+                "hits": self.hits,
+                "appends": self.appends,
+                "reloads": self.reloads,
+            }
 
-    return df
+def get_requests_summary_cache():
+    """プロセス共有のRequestsSummaryCacheを取得する"""
+    return RequestsSummaryCache()
+
+def load_requests_summary():
+    """保存されたリクエスト情報の概要を取得する（変更がなければキャッシュから返す）"""
+    flush_pending_writes()
+    try:
+        return get_requests_summary_cache().load()
+    except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        raise sqlite3.Error(f"リクエスト情報の読み込みに失敗しました: {str(e)}")
+
+def _like_pattern(text):
+    """部分一致用のLIKEのパターン（ESCAPE '\\' と合わせて使う）"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def _history_conditions(name_filter=None, date_from=None, date_to=None, status_code=None, backend_id=None):
+    """履歴の絞り込み条件のWHERE句の条件とパラメータを作成する"""
+    conditions = []
+    params = []
+    if name_filter:
+        conditions.append("request_name LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(name_filter))
+    if date_from:
+        conditions.append("request_time >= ?")
+        params.append(date_from.strftime('%Y-%m-%d 00:00:00'))
+    if date_to:
+        conditions.append("request_time <= ?")
+        params.append(date_to.strftime('%Y-%m-%d 23:59:59'))
+    if status_code is not None:
+        conditions.append("status_code = ?")
+        params.append(int(status_code))
+    if backend_id:
+        conditions.append("backend_id = ?")
+        params.append(backend_id)
+    return conditions, params
+
+# 保存期間を過ぎた履歴を移す月ごとのアーカイブ（requests_YYYY-MM.db）の置き場所
+ARCHIVE_DIR = 'archives'
+# 読み込み時にアーカイブをアタッチするスキーマ名の接頭辞（アタッチごとに連番を付ける）
+ARCHIVE_SCHEMA = 'archive'
+_archive_aliases = itertools.count(1)
+
+def list_archives():
+    """アーカイブの一覧を新しい月から順に返す
+
+    Returns:
+        list: (月 'YYYY-MM', ファイルパス) のリスト
+    """
+    archives = []
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, 'requests_*.db')):
+        found = re.fullmatch(r'requests_(\d{4}-\d{2})\.db', os.path.basename(path))
+        if found:
+            archives.append((found.group(1), path))
+    return sorted(archives, reverse=True)
+
+def _archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f'requests_{month}.db')
+
+def _month_range(month):
+    """'YYYY-MM' の月の初日と翌月の初日"""
+    first = datetime.strptime(month, '%Y-%m').date()
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first, following
+
+def _history_sources(include_archives=False, date_from=None, date_to=None, newest_first=True):
+    """履歴を読み込むDB（'main' またはアーカイブのパス）を期間の順に返す（期間外のアーカイブは除く）"""
+    sources = ['main']
+    if include_archives:
+        for month, path in list_archives():
+            first, following = _month_range(month)
+            if (date_to is None or first <= date_to) and (date_from is None or following > date_from):
+                sources.append(path)
+    return sources if newest_first else sources[::-1]
+
+@contextmanager
+def _history_schema(conn, source):
+    """sourceのテーブルを参照するスキーマ名を返す（アーカイブはこの間だけアタッチする）
+
+    iter_requests のジェネレータが中断している間も同じ接続で別の読み込みができるよう、
+    アタッチごとに別のスキーマ名を使う。
+    """
+    if source == 'main':
+        yield 'main'
+        return
+    schema = f'{ARCHIVE_SCHEMA}_{next(_archive_aliases)}'
+    conn.execute(f'ATTACH DATABASE ? AS {schema}', (source,))
+    try:
+        yield schema
+    finally:
+        conn.execute(f'DETACH DATABASE {schema}')
+
+def _concat_frames(frames):
+    """DBごとに読み込んだ結果を1つのDataFrameにする"""
+    non_empty = [frame for frame in frames if not frame.empty]
+    if len(non_empty) <= 1:
+        return (non_empty or frames)[0].reset_index(drop=True)
+    return pd.concat(non_empty, ignore_index=True)
+
+def load_requests_page(page_size=50, cursor=None, direction="next", name_filter=None,
+                       date_from=None, date_to=None, status_code=None, backend_id=None, include_archives=False):
+    """保存されたリクエスト情報を1ページ分取得する
+
+    (request_time, id)によるキーセットページングで、絞り込みもSQL側で行うため、
+    テーブル全体の件数に関わらず1ページ分の行だけを読み込む。
+
+    Args:
+        page_size (int): 1ページの件数
+        cursor (tuple, optional): 基準となる行の(request_time, id)。Noneの場合は最新のページ
+        direction (str): "next"はcursorより古い行、"prev"はcursorより新しい行を取得する
+        name_filter (str, optional): リクエスト名の部分一致（大文字小文字を区別しない）
+        date_from (date, optional): この日付以降
+        date_to (date, optional): この日付以前
+        status_code (int, optional): ステータスコード
+        backend_id (str, optional): バックエンドID
+        include_archives (bool): アーカイブに移した古い履歴も含めるか
+
+    Returns:
+        tuple: (DataFrame, dict)。DataFrameは新しい順に並べた1ページ分の行。
+            dictはページ情報（first/last: 先頭・末尾の行の(request_time, id)、
+            has_next/has_prev: より古い/新しいページがあるか）
+    """
+    if direction not in ("next", "prev"):
+        raise ValueError("directionは'next'または'prev'である必要があります")
+
+    conditions, params = _history_conditions(name_filter, date_from, date_to, status_code, backend_id)
+
+    older = direction == "next"
+    if cursor is not None:
+        conditions.append("(request_time, id) < (?, ?)" if older else "(request_time, id) > (?, ?)")
+        params.extend(cursor)
+    order = "DESC" if older else "ASC"
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    metric_columns = ',\n            '.join(REQUEST_METRIC_COLUMNS)
+
+    def build_query(schema):
+        return f"""
+            SELECT
+                id,
+                CAST(request_time AS TEXT) AS cursor_time,{HISTORY_SELECT_COLUMNS},
+                {metric_columns}
+            FROM {schema}.requests
+            {where}
+            ORDER BY request_time {order}, id {order}
+            LIMIT ?
+        """
+
+    # ライブのDBとアーカイブは期間で分かれているため、ページの向きに並べたDBから順に必要な件数だけ読む
+    flush_pending_writes()
+    frames = []
+    remaining = int(page_size) + 1
+    with get_db_connection() as conn:
+        try:
+            for source in _history_sources(include_archives, date_from, date_to, newest_first=older):
+                with _history_schema(conn, source) as schema:
+                    frame = pd.read_sql_query(
+                        build_query(schema), conn, params=params + [remaining], parse_dates=['request_time']
+                    )
+                frames.append(frame)
+                remaining -= len(frame)
+                if remaining <= 0:
+                    break
+        except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+            raise sqlite3.Error(f"リクエスト情報の読み込みに失敗しました: {str(e)}")
+    df = _concat_frames(frames)
+
+    has_more = len(df) > page_size
+    df = df.iloc[:page_size]
+    if not older:
+        df = df.iloc[::-1]
+    df = df.reset_index(drop=True)
+
+    page = {
+        "first": (df.iloc[0]['cursor_time'], int(df.iloc[0]['id'])) if not df.empty else None,
+        "last": (df.iloc[-1]['cursor_time'], int(df.iloc[-1]['id'])) if not df.empty else None,
+        "has_next": has_more if older else True,
+        "has_prev": cursor is not None if older else has_more,
+    }
+    return df, page
+
+def iter_requests(columns, chunk_size=1000, name_filter=None, date_from=None, date_to=None,
+                  status_code=None, backend_id=None, include_archives=False):
+    """条件に合う履歴を新しい順にchunk_size件ずつ読み込むジェネレータ
+
+    全件を一度に読み込まないため、件数に関わらずメモリ使用量はchunk_size件分に収まる。
+
+    Args:
+        columns (list): 取得するカラム（HISTORY_COLUMNS と REQUEST_METRIC_COLUMNS のキー）
+        chunk_size (int): 1回に読み込む件数
+        その他: load_requests_page と同じ絞り込み条件
+
+    Yields:
+        DataFrame: chunk_size件以下の行
+    """
+    unknown = [column for column in columns if column not in HISTORY_COLUMNS and column not in REQUEST_METRIC_COLUMNS]
+    if not columns or unknown:
+        raise ValueError(f"取得できないカラムが指定されています: {', '.join(unknown)}")
+
+    conditions, params = _history_conditions(name_filter, date_from, date_to, status_code, backend_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    select = ', '.join(f'{HISTORY_COLUMNS.get(column, column)} AS {column}' for column in columns)
+
+    flush_pending_writes()
+    # 中断している間も読み込みのトランザクションが開いたままになるため、スレッドの接続とは別の接続で読む
+    # （同じ接続では、その間に他の読み込みがアタッチしたアーカイブをデタッチできない）
+    conn = get_connection_manager().open()
+    try:
+        for source in _history_sources(include_archives, date_from, date_to):
+            with _history_schema(conn, source) as schema:
+                c = conn.cursor()
+                try:
+                    c.execute(f'''
+                        SELECT {select} FROM {schema}.requests
+                        {where}
+                        ORDER BY request_time DESC, id DESC
+                    ''', params)
+                    while True:
+                        rows = c.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield pd.DataFrame.from_records(rows, columns=columns)
+                except sqlite3.Error as e:
+                    raise sqlite3.Error(f"リクエスト情報の読み込みに失敗しました: {str(e)}")
+                finally:
+                    # アーカイブをデタッチする前にカーソルを閉じる
+                    c.close()
+    finally:
+        conn.close()
+
+# 検索結果の抜粋で一致箇所を囲む記号
+SNIPPET_MARKERS = ('【', '】')
+# 抜粋に含める一致箇所の前後の文字数の目安
+SNIPPET_CONTEXT = 32
+
+def split_search_terms(query):
+    """検索語を空白で分割し、FTS5で検索する語とLIKEで検索する（短い）語に分ける
+
+    Returns:
+        tuple: (FTS5のMATCHに渡すクエリ。該当する語がなければNone, LIKEで検索する語のリスト)
+    """
+    terms = list(dict.fromkeys((query or '').split()))
+    fts_terms = [term for term in terms if len(term) >= FTS_MIN_TERM_LENGTH]
+    like_terms = [term for term in terms if len(term) < FTS_MIN_TERM_LENGTH]
+    # 各語をフレーズとして引用し、FTS5の演算子として解釈されないようにする
+    match = ' '.join('"' + term.replace('"', '""') + '"' for term in fts_terms) or None
+    return match, like_terms
+
+def _like_any(columns, term):
+    """いずれかのカラムにtermを含む、という条件とパラメータ"""
+    condition = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns)
+    return f"({condition})", [_like_pattern(term)] * len(columns)
+
+def _like_snippet(texts, terms):
+    """LIKEで一致した行の抜粋を作成する（最初に一致した箇所の前後を切り出す）"""
+    open_mark, close_mark = SNIPPET_MARKERS
+    for text in texts:
+        if not text:
+            continue
+        lowered = text.lower()
+        for term in terms:
+            pos = lowered.find(term.lower())
+            if pos < 0:
+                continue
+            start = max(pos - SNIPPET_CONTEXT // 2, 0)
+            end = min(pos + len(term) + SNIPPET_CONTEXT // 2, len(text))
+            return (
+                ('…' if start > 0 else '')
+                + text[start:pos] + open_mark + text[pos:pos + len(term)] + close_mark
+                + text[pos + len(term):end]
+                + ('…' if end < len(text) else '')
+            )
+    return None
+
+def search_requests(query, limit=50, name_filter=None, date_from=None, date_to=None,
+                    status_code=None, backend_id=None, include_archives=False):
+    """保存されたリクエストを質問・回答・メモ・参照情報・リクエスト名から全文検索する
+
+    3文字以上の語はFTS5（trigram）の索引で検索して関連度（bm25）順に並べ、
+    3文字未満の語しかない場合はLIKEで検索して新しい順に並べる。
+    空白で区切った語はすべてを含む行だけが一致する。
+    アーカイブも検索する場合、bm25は索引ごとの統計で計算されてDBをまたいで比較できないため、
+    各DBの関連度の上位を合わせて新しい順に並べる。
+
+    Args:
+        query (str): 検索語
+        limit (int): 取得する最大件数
+        その他: load_requests_page と同じ絞り込み条件
+
+    Returns:
+        DataFrame: load_requests_page と同じカラムに、一致箇所の抜粋（snippet）と
+            関連度（rank。小さいほど関連が高い。DBごとの値で、LIKEのみで検索した場合はNaN）を加えたもの
+    """
+    match, like_terms = split_search_terms(query)
+    if match is None and not like_terms:
+        raise ValueError("検索語を入力してください")
+
+    columns = FULL_TEXT_INDEXES['requests_fts'][1]
+    expressions = [_column_expression(column) for column in columns]
+    conditions, params = _history_conditions(name_filter, date_from, date_to, status_code, backend_id)
+    for term in like_terms:
+        condition, term_params = _like_any(expressions, term)
+        conditions.append(condition)
+        params.extend(term_params)
+
+    metric_columns = ',\n            '.join(REQUEST_METRIC_COLUMNS)
+    select = f"""
+        SELECT
+            id,
+            CAST(request_time AS TEXT) AS cursor_time,{HISTORY_SELECT_COLUMNS},
+            {metric_columns},
+            {', '.join(f'{_column_expression(column)} AS match_{column}' for column in columns)}"""
+
+    def build_query(schema):
+        if match is None:
+            return f"""{select}
+            FROM {schema}.requests
+            WHERE {' AND '.join(conditions)}
+            ORDER BY request_time DESC, id DESC
+            LIMIT ?
+            """
+        return f"""{select},
+            matches.snippet,
+            matches.match_rank AS rank
+        FROM {schema}.requests
+        JOIN (
+            SELECT
+                rowid AS match_id,
+                snippet(requests_fts, -1, ?, ?, '…', {SNIPPET_CONTEXT}) AS snippet,
+                bm25(requests_fts) AS match_rank
+            FROM {schema}.requests_fts
+            WHERE requests_fts MATCH ?
+        ) AS matches ON matches.match_id = requests.id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY matches.match_rank, request_time DESC
+        LIMIT ?
+        """
+
+    if match is not None:
+        params = list(SNIPPET_MARKERS) + [match] + params
+    params.append(int(limit))
+
+    flush_pending_writes()
+    frames = []
+    with get_db_connection() as conn:
+        try:
+            for source in _history_sources(include_archives, date_from, date_to):
+                with _history_schema(conn, source) as schema:
+                    frames.append(pd.read_sql_query(build_query(schema), conn, params=params, parse_dates=['request_time']))
+        except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+            raise sqlite3.Error(f"リクエスト情報の検索に失敗しました: {str(e)}")
+    df = _concat_frames(frames)
+    if len(frames) > 1:
+        # 各DBの上位を合わせて新しい順に並べ直す
+        df = df.sort_values(['request_time', 'id'], ascending=False).head(int(limit)).reset_index(drop=True)
+
+    match_columns = [f'match_{column}' for column in columns]
+    if match is None:
+        df['snippet'] = [
+            _like_snippet(row, like_terms) for row in df[match_columns].itertuples(index=False)
+        ]
+        df['rank'] = float('nan')
+    return df.drop(columns=match_columns)
+
+def search_chat_messages(query, limit=20):
+    """チャットメッセージを全文検索する
+
+    検索語の扱いは search_requests と同じ。削除されたスレッドのメッセージは含めない。
+
+    Returns:
+        list: 関連度順（LIKEのみの場合は新しい順）のメッセージ
+            （thread_id, thread_name, role, snippet, created_at）
+    """
+    match, like_terms = split_search_terms(query)
+    if match is None and not like_terms:
+        raise ValueError("検索語を入力してください")
+
+    conditions = []
+    params = []
+    for term in like_terms:
+        condition, term_params = _like_any(('m.content',), term)
+        conditions.append(condition)
+        params.extend(term_params)
+
+    if match is not None:
+        open_mark, close_mark = SNIPPET_MARKERS
+        query_sql = f"""
+            SELECT m.thread_id, t.name, m.role, matches.snippet, m.created_at, m.content
+            FROM (
+                SELECT
+                    rowid AS match_id,
+                    snippet(chat_messages_fts, 0, ?, ?, '…', {SNIPPET_CONTEXT}) AS snippet,
+                    bm25(chat_messages_fts) AS match_rank
+                FROM chat_messages_fts
+                WHERE chat_messages_fts MATCH ?
+            ) AS matches
+            JOIN chat_messages AS m ON m.id = matches.match_id
+            JOIN chat_threads AS t ON t.id = m.thread_id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY matches.match_rank, m.created_at DESC
+            LIMIT ?
+        """
+        params = [open_mark, close_mark, match] + params
+    else:
+        query_sql = f"""
+            SELECT m.thread_id, t.name, m.role, NULL, m.created_at, m.content
+            FROM chat_messages AS m
+            JOIN chat_threads AS t ON t.id = m.thread_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT ?
+        """
+    params.append(int(limit))
+
+    flush_pending_writes()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(query_sql, params)
+            return [{
+                "thread_id": row[0],
+                "thread_name": row[1],
+                "role": row[2],
+                "snippet": row[3] if match is not None else _like_snippet((row[5],), like_terms),
+                "created_at": row[4].strftime('%Y-%m-%d %H:%M:%S') if row[4] else None
+            } for row in c.fetchall()]
+        except sqlite3.Error as e:
+            raise sqlite3.Error(f"チャットメッセージの検索に失敗しました: {str(e)}")
 
 def update_request_memo(request_name, memo):
     """リクエストのメモを更新する"""
@@ -634,6 +2036,7 @@ def update_request_memo(request_name, memo):
     if not isinstance(memo, str):
         raise ValueError("memoは文字列である必要があります")
 
+    flush_pending_writes()
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
@@ -652,6 +2055,7 @@ def delete_request(request_name):
     if not request_name or not isinstance(request_name, str):
         raise ValueError("request_nameは空にできません")
 
+    flush_pending_writes()
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
@@ -659,4 +2063,147 @@ def delete_request(request_name):
             conn.commit()
         except sqlite3.Error as e:
             conn.rollback()
-            raise sqlite3.Error(f"リクエストの削除に失敗しました: {str(e)}")
\ No newline at end of file
+            raise sqlite3.Error(f"リクエストの削除に失敗しました: {str(e)}")
+
+def _referenced_blobs(conn, schema='main', table='requests', condition='1', params=()):
+    """条件に合う行が参照している共有ブロブのハッシュ"""
+    digests = set()
+    for column in PAYLOAD_REF_COLUMNS[table]:
+        rows = conn.execute(
+            f"SELECT {column} FROM {schema}.{table} WHERE {condition} AND typeof({column}) = 'blob'", params
+        )
+        digests.update(digest for digest in (ref_hash(row[0]) for row in rows) if digest)
+    return digests
+
+def _ensure_archive_schema(conn, schema):
+    """schemaにアタッチしたアーカイブにライブのDBと同じ形のrequestsテーブルと全文検索の索引を作成する"""
+    table_sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'requests'").fetchone()[0]
+    conn.execute(re.sub(r'^CREATE TABLE\s+"?requests"?', f'CREATE TABLE IF NOT EXISTS {schema}.requests', table_sql))
+    # アーカイブの作成後にライブのDBに追加されたカラムを追加する
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(requests)')}
+    for row in conn.execute('PRAGMA main.table_info(requests)').fetchall():
+        if row[1] not in existing:
+            conn.execute(f'ALTER TABLE {schema}.requests ADD COLUMN {row[1]} {row[2]}')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.payload_blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_requests_time_id ON requests (request_time, id)')
+    _create_requests_fts_index(conn, schema)
+    conn.commit()
+
+def archive_old_requests(retention_days, now=None):
+    """保存期間を過ぎた履歴を月ごとのアーカイブに移し、ライブのDBの空き領域を返す
+
+    行は月ごとに「アーカイブへのコピー」「ライブのDBからの削除」の2つのトランザクションで移す。
+    途中で中断しても次回の実行で重複なく移し直せる。
+
+    Args:
+        retention_days (int): ライブのDBに残す日数
+        now (datetime, optional): 基準の時刻（省略時は現在時刻）
+
+    Returns:
+        dict: moved（月 -> 移した件数）, pruned_blobs（削除した共有ブロブの件数）, freed_pages（返したページ数）
+    """
+    if not isinstance(retention_days, int) or retention_days < 1:
+        raise ValueError("retention_daysは1以上の整数である必要があります")
+
+    cutoff = ((now or datetime.now()) - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    get_db_writer().flush_all()
+    conn = get_db_connection()
+    months = [row[0] for row in conn.execute(
+        "SELECT DISTINCT strftime('%Y-%m', request_time) FROM requests WHERE request_time < ? ORDER BY 1", (cutoff,)
+    ) if row[0]]
+
+    moved = {}
+    if months:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for month in months:
+        first, following = _month_range(month)
+        condition = 'request_time >= ? AND request_time < ? AND request_time < ?'
+        params = (first.strftime('%Y-%m-%d 00:00:00'), following.strftime('%Y-%m-%d 00:00:00'), cutoff)
+        with _history_schema(conn, _archive_path(month)) as schema:
+            try:
+                _ensure_archive_schema(conn, schema)
+                columns = ', '.join(row[1] for row in conn.execute('PRAGMA main.table_info(requests)').fetchall())
+
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {schema}.requests ({columns})
+                    SELECT {columns} FROM main.requests WHERE {condition}
+                ''', params)
+                digests = list(_referenced_blobs(conn, 'main', 'requests', condition, params))
+                for i in range(0, len(digests), 500):
+                    chunk = digests[i:i + 500]
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO {schema}.payload_blobs (hash, data, size)
+                        SELECT hash, data, size FROM main.payload_blobs WHERE hash IN ({', '.join('?' * len(chunk))})
+                    ''', chunk)
+                # 索引の行はライブのDBの索引から移す（前回の中断で移し済みの行は除く）
+                fts_columns = ', '.join(FULL_TEXT_INDEXES['requests_fts'][1])
+                conn.execute(f'''
+                    INSERT INTO {schema}.requests_fts (rowid, {fts_columns})
+                    SELECT rowid, {fts_columns} FROM main.requests_fts
+                    WHERE rowid IN (SELECT id FROM main.requests WHERE {condition})
+                      AND rowid NOT IN (SELECT rowid FROM {schema}.requests_fts)
+                ''', params)
+                conn.commit()
+
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.execute(f'''
+                    DELETE FROM main.requests
+                    WHERE {condition} AND id IN (SELECT id FROM {schema}.requests)
+                ''', params)
+                moved[month] = cursor.rowcount
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise sqlite3.Error(f"履歴のアーカイブ（{month}）に失敗しました: {str(e)}")
+
+    pruned = prune_payload_blobs() if moved else 0
+    freed = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute('PRAGMA incremental_vacuum').fetchall()
+    return {"moved": moved, "pruned_blobs": pruned, "freed_pages": freed}
+
+def prune_payload_blobs():
+    """ライブのDBのどの行からも参照されていない共有ブロブを削除する
+
+    Returns:
+        int: 削除した件数
+    """
+    conn = get_db_connection()
+    try:
+        # 参照の確認と削除の間に、既存のブロブを参照する行が書き込まれないようにする
+        conn.execute('BEGIN IMMEDIATE')
+        referenced = set()
+        for table in PAYLOAD_REF_COLUMNS:
+            referenced |= _referenced_blobs(conn, 'main', table)
+        unused = [(row[0],) for row in conn.execute('SELECT hash FROM payload_blobs') if row[0] not in referenced]
+        conn.executemany('DELETE FROM payload_blobs WHERE hash = ?', unused)
+        conn.commit()
+        return len(unused)
+    except sqlite3.Error as e:
+        conn.rollback()
+        raise sqlite3.Error(f"共有データの削除に失敗しました: {str(e)}")
+
+def get_storage_stats():
+    """ライブのDBとアーカイブのファイルサイズを取得する
+
+    Returns:
+        dict: live_bytes, live_rows, archives（月, ファイルパス, バイト数のリスト）
+    """
+    flush_pending_writes()
+    conn = get_db_connection()
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return {
+        "live_bytes": page_count * page_size,
+        "live_rows": conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0],
+        "archives": [
+            {"month": month, "path": path, "bytes": os.path.getsize(path)}
+            for month, path in list_archives()
+        ],
+    }
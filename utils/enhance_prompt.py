@@ -1,9 +1,36 @@
-from utils.kwmatch import match_keywords
+from utils.kwmatch import match_keywords, get_tokenizer_registry, load_keyword_index
+import os
 import pandas as pd
 import re
 
 # 辞書ファイルExcel(A列からC列のみを利用する)
-df = pd.read_excel("utils/辞書データ.xlsx", usecols="A:C", converters={'Title': str, '概要': str, '詳細・経緯など': str})
+DICTIONARY_PATH = "utils/辞書データ.xlsx"
+# Titleのキーワード索引（辞書ファイルが変わった場合のみ作り直し、各プロセスはメモリマップで共有する）
+KEYWORD_INDEX_PATH = "utils/辞書データ.kwidx"
+
+# 辞書データと、それを読み込んだ時点の辞書ファイルの(mtime, size)
+df: pd.DataFrame = None
+_df_stamp = None
+
+def load_dictionary() -> pd.DataFrame:
+    """辞書データを取得する（辞書ファイルが更新されていれば読み直す）"""
+    global df, _df_stamp
+    stat = os.stat(DICTIONARY_PATH)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if stamp != _df_stamp:
+        df = pd.read_excel(DICTIONARY_PATH, usecols="A:C", converters={'Title': str, '概要': str, '詳細・経緯など': str})
+        _df_stamp = stamp
+    return df
+
+load_dictionary()
+
+# キーワード抽出に使うトークナイザ（起動時にバックグラウンドで辞書を読み込んでおく）
+REFINE_TOKENIZER_TYPE = "sudachi"
+REFINE_TOKENIZER_ARGS = {"mode": "C"}
+
+def warm_up_tokenizer() -> bool:
+    """キーワード抽出用のトークナイザをバックグラウンドで準備する"""
+    return get_tokenizer_registry().warm_up(REFINE_TOKENIZER_TYPE, **REFINE_TOKENIZER_ARGS)
 
 def refine_query(query: str) -> str:
     """質問を辞書データを使って改善する"""
@@ -11,15 +38,20 @@ def refine_query(query: str) -> str:
         return query
         
     # キーワードを抽出
-    possible_kws = df['Title'].to_list()
-    keywords = match_keywords(query, keyword_list=possible_kws, tokenizer_type="sudachi", mode="C")
+    # 索引を作り直す場合は、索引に記録する辞書ファイルと同じ内容から作る
+    keyword_index = load_keyword_index(
+        KEYWORD_INDEX_PATH, DICTIONARY_PATH, lambda: load_dictionary()['Title'].to_list()
+    )
+    keywords = match_keywords(
+        query, keyword_index=keyword_index, tokenizer_type=REFINE_TOKENIZER_TYPE, **REFINE_TOKENIZER_ARGS
+    )
     
     if not keywords:
         return query
         
     # 質問の後ろに補足として説明をつける
     replaced_query = query + "\n\n【以下用語の補足】\n"
-    _df: pd.DataFrame = df.copy()
+    _df: pd.DataFrame = load_dictionary().copy()
     _df.fillna("---", inplace=True)
     replacements = []
     
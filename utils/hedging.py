@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# パーセンタイルを計算するために保持する直近のレイテンシ件数
+LATENCY_WINDOW = 200
+# ヘッジを開始するのに必要な最小サンプル数
+MIN_LATENCY_SAMPLES = 20
+
+
+def _close_response(future):
+    """採用されなかったレスポンスを閉じてコネクションをプールに返す"""
+    try:
+        response = future.result()
+    except Exception:
+        return
+    close = getattr(response, "close", None)
+    if close is not None:
+        close()
+
+
+class LatencyTracker:
+    """キーごとの直近レイテンシを保持し、パーセンタイルを求める"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def percentile(self, key: str, pct: float, min_samples: int = MIN_LATENCY_SAMPLES) -> Optional[float]:
+        """直近のレイテンシのpctパーセンタイル（サンプル不足の場合はNone）"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * pct / 100.0), len(samples) - 1)
+        return samples[index]
+
+
+class RequestHedger:
+    """ヘッジリクエストによるテールレイテンシ対策
+
+    直近レイテンシの指定パーセンタイルを過ぎても応答がなければ同じリクエストをもう1本送り、
+    先に成功した方を採用する。追加で送るリクエストはmax_ratio（全リクエストに対する割合）までに抑える。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RequestHedger, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        self.latencies = LatencyTracker()
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def _reserve_hedge(self, max_ratio: float) -> bool:
+        """追加リクエストの上限内であればヘッジ枠を確保する"""
+        with self._lock:
+            if self._hedges + 1 > max_ratio * self._requests:
+                return False
+            self._hedges += 1
+            return True
+
+    def send(
+        self,
+        key: str,
+        send: Callable[[], Any],
+        *,
+        enabled: bool,
+        percentile: float,
+        max_ratio: float,
+    ) -> Tuple[Any, Optional[bool]]:
+        """必要に応じてヘッジしながらsendを実行する
+
+        Args:
+            key: レイテンシを集計する単位（URLなど）
+            send: レスポンス（status_code属性を持つ）を返す関数
+            enabled: ヘッジを有効にするか（無効でもレイテンシは記録する）
+            percentile: ヘッジを送るまでの待ち時間に使うパーセンタイル
+            max_ratio: 全リクエストに対するヘッジの上限割合
+
+        Returns:
+            tuple: (レスポンス, ヘッジ側が勝ったか。ヘッジを送らなかった場合はNone)
+        """
+        with self._lock:
+            self._requests += 1
+        start = time.monotonic()
+
+        delay = self.latencies.percentile(key, percentile) if enabled else None
+        if delay is None:
+            response = send()
+            self.latencies.record(key, time.monotonic() - start)
+            return response, None
+
+        primary = self._executor.submit(send)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._reserve_hedge(max_ratio):
+            response = primary.result()
+            self.latencies.record(key, time.monotonic() - start)
+            return response, None
+
+        hedge = self._executor.submit(send)
+        is_hedge = {primary: False, hedge: True}
+        pending = set(is_hedge)
+        chosen = None
+        fallback = None
+        error = None
+        while pending and chosen is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if response.status_code < 500:
+                    chosen = future
+                    break
+                fallback = fallback or future
+
+        chosen = chosen or fallback
+        for future in is_hedge:
+            if future is not chosen:
+                future.add_done_callback(_close_response)
+        if chosen is None:
+            raise error
+
+        self.latencies.record(key, time.monotonic() - start)
+        if is_hedge[chosen]:
+            with self._lock:
+                self._hedge_wins += 1
+        return chosen.result(), is_hedge[chosen]
+
+    def stats(self) -> Dict[str, Any]:
+        """ヘッジの統計情報を取得する"""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "hedge_ratio": self._hedges / self._requests if self._requests else 0.0,
+            }
+
+
+def get_request_hedger() -> RequestHedger:
+    """プロセス共有のRequestHedgerを取得する"""
+    return RequestHedger()
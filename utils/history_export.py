@@ -0,0 +1,158 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.db_utils import REQUEST_METRIC_COLUMNS, iter_requests
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 1回に読み込んで書き出す件数
+EXPORT_CHUNK_SIZE = 1000
+# エクスポートファイルを作成する一時ディレクトリ
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "qa_history_exports")
+# これより古いエクスポートファイルは次のエクスポート時に削除する（秒）
+EXPORT_MAX_AGE = 24 * 60 * 60
+
+# 形式 -> (表示名, 拡張子, MIMEタイプ)
+EXPORT_FORMATS = {
+    "csv": ("CSV", ".csv", "text/csv;charset=utf-8-sig"),
+    "jsonl": ("JSON Lines", ".jsonl", "application/x-ndjson"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+}
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def available_export_formats() -> List[str]:
+    """この環境で使えるエクスポート形式（Parquetはpyarrowが必要）"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pq is not None]
+
+
+def _normalize_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    if "request_time" in chunk.columns:
+        chunk["request_time"] = pd.to_datetime(chunk["request_time"], errors="coerce")
+    return chunk
+
+
+def _write_csv(path: str, chunks, on_chunk, columns: List[str]):
+    # BOMは先頭に1回だけ書く（Excelで文字化けしないようにする）
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, header=header, index=False, date_format=DATETIME_FORMAT)
+            header = False
+            on_chunk(len(chunk))
+        if header:
+            # 該当なしでもヘッダー行は出力する
+            pd.DataFrame(columns=columns).to_csv(f, index=False)
+
+
+def _write_jsonl(path: str, chunks, on_chunk):
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            if "request_time" in chunk.columns:
+                chunk["request_time"] = chunk["request_time"].dt.strftime(DATETIME_FORMAT)
+            text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+            # pandasのバージョンによって末尾の改行の有無が異なるため、空行ができないようにそろえる
+            if text and not text.endswith("\n"):
+                text += "\n"
+            f.write(text)
+            on_chunk(len(chunk))
+
+
+def _arrow_schema(columns: List[str]):
+    """チャンクごとに型が揺れないよう、カラムの型を固定したスキーマ"""
+    fields = []
+    for column in columns:
+        if column == "request_time":
+            arrow_type = pa.timestamp("s")
+        elif column == "status_code":
+            arrow_type = pa.int64()
+        else:
+            arrow_type = {"INTEGER": pa.int64(), "REAL": pa.float64()}.get(
+                REQUEST_METRIC_COLUMNS.get(column), pa.string()
+            )
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_parquet(path: str, chunks, on_chunk, columns: List[str]):
+    schema = _arrow_schema(columns)
+    # チャンクごとに行グループとして書き出す
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            on_chunk(len(chunk))
+
+
+def _cleanup_old_exports(now: float):
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_history(
+    fmt: str,
+    columns: List[str],
+    filters: Optional[Dict] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Tuple[str, int]:
+    """条件に合う履歴を一時ファイルに書き出す
+
+    SQLiteからchunk_size件ずつ読み込んでファイルに追記するため、履歴の件数に関わらずメモリ使用量は一定。
+
+    Args:
+        fmt: "csv" / "jsonl" / "parquet"
+        columns: 書き出すカラム
+        filters: db_utils.iter_requests に渡す絞り込み条件
+        progress: チャンクを書き出すたびに、それまでの件数を受け取る関数
+
+    Returns:
+        tuple: (作成したファイルのパス, 書き出した件数)
+    """
+    if fmt not in available_export_formats():
+        raise ValueError(f"未対応のエクスポート形式です: {fmt}")
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    now = time.time()
+    _cleanup_old_exports(now)
+
+    _, suffix, _ = EXPORT_FORMATS[fmt]
+    prefix = f"qa_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=EXPORT_DIR)
+    os.close(fd)
+
+    total = 0
+
+    def on_chunk(rows: int):
+        nonlocal total
+        total += rows
+        if progress is not None:
+            progress(total)
+
+    chunks = (_normalize_chunk(chunk) for chunk in iter_requests(columns, chunk_size=chunk_size, **(filters or {})))
+    try:
+        if fmt == "csv":
+            _write_csv(path, chunks, on_chunk, columns)
+        elif fmt == "jsonl":
+            _write_jsonl(path, chunks, on_chunk)
+        else:
+            _write_parquet(path, chunks, on_chunk, columns)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, total
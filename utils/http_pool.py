@@ -0,0 +1,342 @@
+import asyncio
+import atexit
+import copy
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.compression import RESPONSE_ACCEPT_ENCODING
+from utils.phase_timing import TimedHTTPAdapter, connection_count
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_KEEPALIVE_TIMEOUT = 60.0
+
+
+def _iter_connection_pools(adapter: HTTPAdapter):
+    """アダプタが保持しているurllib3のコネクションプールを列挙する"""
+    managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+    for manager in managers:
+        pools = manager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                yield pool
+
+
+class _PooledSession:
+    """(target_url, proxy_url)ごとに保持するSessionと利用状況"""
+
+    def __init__(self, proxy_url: str, pool_maxsize: int):
+        self.session = requests.Session()
+        self.adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        # レスポンスは常に圧縮形式をネゴシエートする
+        self.session.headers["Accept-Encoding"] = RESPONSE_ACCEPT_ENCODING
+        if proxy_url:
+            self.session.proxies = {"http": proxy_url, "https": proxy_url}
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def open_connections(self) -> int:
+        """待機中のオープンコネクション数を返す"""
+        idle = 0
+        for pool in _iter_connection_pools(self.adapter):
+            queue = getattr(pool.pool, "queue", None) if pool.pool is not None else None
+            if queue is not None:
+                idle += sum(1 for conn in list(queue) if conn is not None and conn.sock is not None)
+        return idle
+
+    def close(self):
+        self.session.close()
+
+
+class SessionPool:
+    """プロセス全体で共有するkeep-alive付きHTTPセッションプール
+
+    ターゲットURLとプロキシURLの組み合わせごとに `requests.Session` を1つ保持し、
+    すべてのStreamlitセッションから再利用する。keepalive_timeoutを超えて
+    使われなかったセッションは次回アクセス時に破棄される。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SessionPool, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str, str], _PooledSession] = {}
+        self.pool_maxsize = DEFAULT_POOL_MAXSIZE
+        self.keepalive_timeout = DEFAULT_KEEPALIVE_TIMEOUT
+        # 破棄済みセッションの統計値
+        self._closed_requests = 0
+        self._sessions_created = 0
+
+    def configure(self, pool_maxsize: Optional[int] = None, keepalive_timeout: Optional[float] = None):
+        """プールサイズとkeep-aliveタイムアウトを設定する
+
+        プールサイズが変わった場合は既存のセッションを閉じ、次回から新しい設定で作り直す。
+        """
+        with self._lock:
+            if keepalive_timeout is not None:
+                self.keepalive_timeout = float(keepalive_timeout)
+            if pool_maxsize is not None and int(pool_maxsize) != self.pool_maxsize:
+                self.pool_maxsize = int(pool_maxsize)
+                for key in list(self._sessions.keys()):
+                    self._discard(key)
+
+    def _discard(self, key: Tuple[str, str]):
+        """セッションを閉じて統計値を引き継ぐ（ロック取得済みで呼ぶこと）"""
+        entry = self._sessions.pop(key)
+        self._closed_requests += entry.requests
+        entry.close()
+
+    def _prune_idle(self, now: float):
+        """keep-aliveタイムアウトを過ぎたセッションを破棄する（ロック取得済みで呼ぶこと）"""
+        for key, entry in list(self._sessions.items()):
+            if now - entry.last_used > self.keepalive_timeout:
+                self._discard(key)
+
+    def get_session(self, target_url: str, proxy_url: str = "") -> requests.Session:
+        """(target_url, proxy_url)に対応するSessionを取得する"""
+        key = (target_url or "", proxy_url or "")
+        now = time.monotonic()
+        with self._lock:
+            self._prune_idle(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = _PooledSession(key[1], self.pool_maxsize)
+                self._sessions[key] = entry
+                self._sessions_created += 1
+            entry.last_used = now
+            entry.requests += 1
+            return entry.session
+
+    def request(self, method: str, url: str, *, target_url: str, proxy_url: str = "", **kwargs) -> requests.Response:
+        """プール済みのSessionを使ってリクエストを送信する"""
+        session = self.get_session(target_url, proxy_url)
+        return session.request(method=method, url=url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """プールの統計情報を取得する
+
+        Returns:
+            dict: requests（総リクエスト数）、connections（確立したコネクション数）、
+                reuse_ratio（コネクション再利用率）、open_connections（待機中のコネクション数）、
+                sessions（保持中のセッション数）
+        """
+        with self._lock:
+            total_requests = self._closed_requests
+            open_connections = 0
+            for entry in self._sessions.values():
+                total_requests += entry.requests
+                open_connections += entry.open_connections()
+            sessions = len(self._sessions)
+            sessions_created = self._sessions_created
+        # 切断後の再接続も含めて、実際にTCP接続した回数を数える
+        total_connections = connection_count()
+
+        reused = max(total_requests - total_connections, 0)
+        return {
+            "requests": total_requests,
+            "connections": total_connections,
+            "reuse_ratio": reused / total_requests if total_requests else 0.0,
+            "open_connections": open_connections,
+            "sessions": sessions,
+            "sessions_created": sessions_created,
+            "pool_maxsize": self.pool_maxsize,
+            "keepalive_timeout": self.keepalive_timeout,
+        }
+
+    def close_all(self):
+        """保持しているすべてのセッションを閉じる"""
+        with self._lock:
+            for key in list(self._sessions.keys()):
+                self._discard(key)
+
+
+def get_session_pool() -> SessionPool:
+    """プロセス共有のSessionPoolを取得する"""
+    return SessionPool()
+
+
+class AsyncClientPool:
+    """asyncio用のHTTPクライアントプール
+
+    httpx.AsyncClientは作成したイベントループでしか使えないが、Streamlitでは asyncio.run のたびに
+    ループが変わる。ループごとにクライアントを作るとループの破棄時に閉じられず、ソケットが残る。
+    そのためクライアントはこのプール専用のイベントループ（バックグラウンドスレッド）で
+    (target_url, proxy_url)単位に保持し、呼び出し元のループからはリクエストをそのループに渡して待つ。
+    プールサイズとkeep-aliveタイムアウトはSessionPoolの設定に合わせる。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AsyncClientPool, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (target_url, proxy_url) -> AsyncClient（専用ループのスレッドからのみ参照する）
+        self._clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+        atexit.register(self.close_all)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="async-http", daemon=True).start()
+            return self._loop
+
+    def _get_client(self, key: Tuple[str, str]) -> httpx.AsyncClient:
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            session_pool = get_session_pool()
+            client = httpx.AsyncClient(
+                proxy=key[1] or None,
+                limits=httpx.Limits(
+                    max_connections=session_pool.pool_maxsize,
+                    max_keepalive_connections=session_pool.pool_maxsize,
+                    keepalive_expiry=session_pool.keepalive_timeout
+                )
+            )
+            self._clients[key] = client
+        return client
+
+    async def _send(self, method: str, url: str, key: Tuple[str, str], kwargs: Dict[str, Any]) -> httpx.Response:
+        return await self._get_client(key).request(method, url, **kwargs)
+
+    async def _close_clients(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    async def request(self, method: str, url: str, *, target_url: str, proxy_url: str = "", **kwargs) -> httpx.Response:
+        """プール済みのAsyncClientを使ってリクエストを送信する（本文まで読み込んだレスポンスを返す）"""
+        key = (target_url or "", proxy_url or "")
+        future = asyncio.run_coroutine_threadsafe(self._send(method, url, key, kwargs), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def aclose(self):
+        """保持しているクライアントをすべて閉じる"""
+        future = asyncio.run_coroutine_threadsafe(self._close_clients(), self._ensure_loop())
+        await asyncio.wrap_future(future)
+
+    def close_all(self, timeout: float = 5.0):
+        """保持しているクライアントを閉じて専用のイベントループを止める"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_clients(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def get_async_client_pool() -> AsyncClientPool:
+    """プロセス共有のAsyncClientPoolを取得する"""
+    return AsyncClientPool()
+
+
+class _InFlightCall:
+    """実行中の上流リクエスト1件分の結果を待ち合わせるための状態"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """同一内容のリクエストを1回の上流呼び出しに集約する
+
+    同じキーの呼び出しが実行中であれば、後続の呼び出しは新たにリクエストを送らず
+    先行する呼び出しの完了を待ち、その結果（のコピー）を受け取る。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SingleFlight, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple, _InFlightCall] = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    @staticmethod
+    def make_key(method: str, url: str, body: Any = None) -> Tuple[str, str, str]:
+        """(method, url, body)から集約用のキーを作成する"""
+        if body is None:
+            body = b""
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        elif not isinstance(body, (bytes, bytearray)):
+            body = repr(body).encode("utf-8")
+        return (method.upper(), url, hashlib.sha256(body).hexdigest())
+
+    def do(self, key: Tuple, func: Callable[[], Any]) -> Any:
+        """keyに対する呼び出しが実行中ならその結果を待ち、なければfuncを実行する"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._executed += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func()
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """集約の統計情報を取得する
+
+        Returns:
+            dict: executed（実際に送信した呼び出し数）、coalesced（集約された呼び出し数）、
+                in_flight（実行中の呼び出し数）
+        """
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+def get_single_flight() -> SingleFlight:
+    """プロセス共有のSingleFlightを取得する"""
+    return SingleFlight()
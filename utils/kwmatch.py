@@ -1,5 +1,121 @@
+import hashlib
+import heapq
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import islice
+from functools import lru_cache
 from konoha import WordTokenizer
-from typing import List, Dict, Tuple, Set
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Optional, Sized, Tuple, Set
+
+class _TokenizerEntry:
+    def __init__(self):
+        # build_lock: only one thread loads the dictionary; lock: tokenizers are not thread-safe
+        self.build_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.tokenizer: Optional[WordTokenizer] = None
+        self.build_seconds = 0.0
+        self.uses = 0
+        self.error = ""
+
+class TokenizerRegistry:
+    """Process-wide WordTokenizer instances keyed by (tokenizer_type, tokenizer_args).
+
+    Building a tokenizer loads its system dictionary (hundreds of ms for Sudachi), so each
+    configuration is built once and reused by every session. Calls on one instance are
+    serialized with a per-instance lock.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TokenizerRegistry, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, _TokenizerEntry] = {}
+
+    @staticmethod
+    def _key(tokenizer_type: str, tokenizer_args: Dict[str, Any]) -> Tuple:
+        return (tokenizer_type, tuple(sorted(tokenizer_args.items())))
+
+    def _entry(self, tokenizer_type: str, tokenizer_args: Dict[str, Any]) -> _TokenizerEntry:
+        key = self._key(tokenizer_type, tokenizer_args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _TokenizerEntry()
+        if entry.tokenizer is None:
+            with entry.build_lock:
+                if entry.tokenizer is None:
+                    started = time.perf_counter()
+                    try:
+                        entry.tokenizer = WordTokenizer(tokenizer_type, **tokenizer_args)
+                    except Exception as e:
+                        entry.error = str(e)
+                        raise
+                    entry.build_seconds = time.perf_counter() - started
+                    entry.error = ""
+        return entry
+
+    def tokenize(self, sentence: str, tokenizer_type: str, **tokenizer_args):
+        """Tokenizes sentence with the shared tokenizer for this configuration."""
+        entry = self._entry(tokenizer_type, tokenizer_args)
+        with entry.lock:
+            entry.uses += 1
+            return entry.tokenizer.tokenize(sentence)
+
+    def warm_up(self, tokenizer_type: str, **tokenizer_args) -> bool:
+        """Builds the tokenizer in a background thread if it is not built yet.
+
+        Returns:
+            bool: True if a build was started.
+        """
+        key = self._key(tokenizer_type, tokenizer_args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.tokenizer is not None or entry.build_lock.locked()):
+                return False
+
+        def build():
+            try:
+                self._entry(tokenizer_type, tokenizer_args)
+            except Exception:
+                # the error is kept in stats() and the build is retried on first use
+                pass
+
+        threading.Thread(target=build, name=f"tokenizer-warm-up-{tokenizer_type}", daemon=True).start()
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Build time and reuse counts per tokenizer configuration."""
+        with self._lock:
+            items = list(self._entries.items())
+        return [
+            {
+                "tokenizer_type": key[0],
+                "tokenizer_args": dict(key[1]),
+                "ready": entry.tokenizer is not None,
+                "build_seconds": entry.build_seconds,
+                "uses": entry.uses,
+                "reuses": max(entry.uses - 1, 0),
+                "error": entry.error,
+            }
+            for key, entry in items
+        ]
+
+def get_tokenizer_registry() -> TokenizerRegistry:
+    """Returns the process-wide TokenizerRegistry."""
+    return TokenizerRegistry()
 
 def get_tokenizer_names(sentence_splits, tokenizer_type: str) -> Set[str]:
     if tokenizer_type == "nagisa":
@@ -7,65 +123,343 @@ def get_tokenizer_names(sentence_splits, tokenizer_type: str) -> Set[str]:
         return {n.surface for n in sentence_splits if n.postag not in skip_tags}
     return {str(n) for n in sentence_splits}
 
-def find_possible_matches(sentence: str, keyword_list: List[str]) -> Set[str]:
-    return {str(k) for k in keyword_list if str(k) in sentence}
+# On-disk keyword index: header, then the automaton arrays as native uint32, then the keywords as UTF-8
+INDEX_MAGIC = b"KWIX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("=4s8I32s")
+_NONE = 0xFFFFFFFF
 
-def find_positions(sentence: str, possible_matches: Set[str]) -> Dict[int, List[str]]:
-    positions_matches = {}
-    for m in possible_matches:
-        possible_positions = [
-            i for i in range(len(sentence)) if sentence.startswith(m, i)
-        ]
-        for p in possible_positions:
-            positions_matches.setdefault(p, []).append(m)
-    return positions_matches
-
-def find_overlapping_ranges(
-    ranges: List[Tuple[int, int, str]]
-) -> List[Tuple[Tuple[int, int, str], Tuple[int, int, str]]]:
-    overlapping_ranges = []
-    for i in range(len(ranges)):
-        for j in range(i + 1, len(ranges)):
-            if ranges[j][0] < ranges[i][1]:
-                overlapping_ranges.append((ranges[i], ranges[j]))
-    return overlapping_ranges
-
-def remove_overlapping_positions(
-    positions_matches: Dict[int, List[str]],
-    overlapping_ranges: List[Tuple[Tuple[int, int, str], Tuple[int, int, str]]],
-) -> None:
-    to_remove_range = [
-        min(c, key=lambda tup: len(tup[-1]))[0] for c in overlapping_ranges
-    ]
-    for k in to_remove_range:
-        positions_matches.pop(k, None)
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurrence in one pass over a sentence.
+
+    Built once per keyword list (see get_keyword_automaton); searching is linear in the
+    sentence length plus the number of hits, independent of the number of keywords.
+    Transitions are kept as flat arrays (CSR: each state's edges sorted by character), so the
+    same code searches an automaton built in memory or one memory-mapped from save() output.
+    """
+
+    def __init__(self, keyword_list: List[str]):
+        # keyword ids follow first appearance in keyword_list
+        keywords = list(dict.fromkeys(str(k) for k in keyword_list))
+
+        goto: List[Dict[int, int]] = [{}]
+        term = [_NONE]
+        for kid, k in enumerate(keywords):
+            if not k:
+                continue
+            state = 0
+            for ch in k:
+                nxt = goto[state].get(ord(ch))
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ord(ch)] = nxt
+                    goto.append({})
+                    term.append(_NONE)
+                state = nxt
+            term[state] = kid
+
+        # fail: longest proper suffix state; out: nearest suffix state that ends a keyword
+        fail = [0] * len(goto)
+        out = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in goto[state].items():
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[nxt] = f
+                out[nxt] = f if term[f] != _NONE else out[f]
+                queue.append(nxt)
+
+        offsets = array("I", [0])
+        chars = array("I")
+        targets = array("I")
+        for edges in goto:
+            for c in sorted(edges):
+                chars.append(c)
+                targets.append(edges[c])
+            offsets.append(len(chars))
+
+        encoded = [k.encode("utf-8") for k in keywords]
+        keyword_offsets = array("I", [0])
+        for b in encoded:
+            keyword_offsets.append(keyword_offsets[-1] + len(b))
+
+        self._set_arrays(
+            offsets, chars, targets, array("I", fail), array("I", out), array("I", term),
+            keyword_offsets, array("I", [len(k) for k in keywords]), b"".join(encoded),
+            keywords.index("") if "" in keywords else _NONE,
+        )
+        # set when the automaton is backed by an index file (see save/load)
+        self.path: Optional[str] = None
+        self.source_hash: Optional[bytes] = None
+
+    def _set_arrays(self, offsets, chars, targets, fail, out, term, keyword_offsets, keyword_lengths, blob, empty_id):
+        self.offsets, self.chars, self.targets = offsets, chars, targets
+        self.fail, self.out, self.term = fail, out, term
+        self.keyword_offsets, self.keyword_lengths, self.blob = keyword_offsets, keyword_lengths, blob
+        # the empty keyword is "in" every sentence and starts at every index
+        self.empty_id = empty_id
+        self._keywords: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.keyword_lengths)
+
+    def keyword(self, kid: int) -> str:
+        k = self._keywords.get(kid)
+        if k is None:
+            k = self._keywords[kid] = bytes(self.blob[self.keyword_offsets[kid]:self.keyword_offsets[kid + 1]]).decode("utf-8")
+        return k
+
+    def keywords(self) -> List[str]:
+        return [self.keyword(kid) for kid in range(len(self))]
+
+    def _iter_ids(self, sentence: str) -> Iterator[Tuple[int, int]]:
+        offsets, chars, targets = self.offsets, self.chars, self.targets
+        fail, out, term, lengths = self.fail, self.out, self.term, self.keyword_lengths
+        empty_id = self.empty_id
+        state = 0
+        for i, ch in enumerate(sentence):
+            if empty_id != _NONE:
+                yield i, empty_id
+            c = ord(ch)
+            while True:
+                lo, hi = offsets[state], offsets[state + 1]
+                j = bisect_left(chars, c, lo, hi)
+                if j < hi and chars[j] == c:
+                    state = targets[j]
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            s = state if term[state] != _NONE else out[state]
+            while s:
+                kid = term[s]
+                yield i - lengths[kid] + 1, kid
+                s = out[s]
+
+    def iter_matches(self, sentence: str) -> Iterator[Tuple[int, str]]:
+        """Yields (start position, keyword) for every occurrence, ordered by end position."""
+        for p, kid in self._iter_ids(sentence):
+            yield p, self.keyword(kid)
+
+    def find_positions(self, sentence: str) -> Dict[int, List[str]]:
+        """Maps each start position in sentence to the keywords that occur there."""
+        hits: Dict[int, List[int]] = {}
+        for p, kid in self._iter_ids(sentence):
+            hits.setdefault(kid, []).append(p)
+        if self.empty_id != _NONE:
+            hits.setdefault(self.empty_id, [])
+        # build the set in keyword_list order so the lists come out in the order of the original
+        # set-of-substrings implementation
+        by_keyword = {self.keyword(kid): hits[kid] for kid in sorted(hits)}
+        possible_matches = {k for k in by_keyword}
+        positions_matches = {}
+        for m in possible_matches:
+            for p in by_keyword[m]:
+                positions_matches.setdefault(p, []).append(m)
+        return positions_matches
+
+    def _sections(self):
+        return (
+            self.offsets, self.chars, self.targets, self.fail, self.out, self.term,
+            self.keyword_offsets, self.keyword_lengths,
+        )
+
+    def save(self, path: str, source_hash: bytes) -> None:
+        """Writes the index to path (atomically), tagged with the hash of the dictionary it was built from."""
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, INDEX_VERSION, array("I").itemsize, len(self.fail), len(self.chars),
+            len(self), len(self.blob), self.empty_id, 0, source_hash,
+        )
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                for section in self._sections():
+                    f.write(memoryview(section).cast("B"))
+                f.write(self.blob)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.path = path
+        self.source_hash = source_hash
+
+    @classmethod
+    def load(cls, path: str, source_hash: bytes) -> Optional["KeywordAutomaton"]:
+        """Memory-maps an index written by save(); None if it is missing, corrupt or built from another source.
+
+        The arrays are read straight from the mapping, so processes loading the same file share its pages.
+        """
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        view = memoryview(mapped)
+        try:
+            (magic, version, itemsize, n_states, n_edges, n_keywords, blob_len, empty_id, _,
+             stored_hash) = INDEX_HEADER.unpack_from(view)
+        except struct.error:
+            return None
+        sizes = (n_states + 1, n_edges, n_edges, n_states, n_states, n_states, n_keywords + 1, n_keywords)
+        expected = INDEX_HEADER.size + sum(sizes) * itemsize + blob_len
+        if (magic, version, itemsize, stored_hash) != (INDEX_MAGIC, INDEX_VERSION, array("I").itemsize, source_hash) \
+                or len(view) != expected:
+            return None
+
+        sections = []
+        offset = INDEX_HEADER.size
+        for size in sizes:
+            sections.append(view[offset:offset + size * itemsize].cast("I"))
+            offset += size * itemsize
+        automaton = cls.__new__(cls)
+        automaton._set_arrays(*sections, view[offset:offset + blob_len], empty_id)
+        automaton.path = path
+        automaton.source_hash = source_hash
+        return automaton
+
+@lru_cache(maxsize=8)
+def _compile_keywords(keywords: Tuple[str, ...]) -> KeywordAutomaton:
+    return KeywordAutomaton(list(keywords))
+
+def get_keyword_automaton(keyword_list: List[str]) -> KeywordAutomaton:
+    """Returns the compiled automaton for keyword_list, building it only the first time."""
+    return _compile_keywords(tuple(str(k) for k in keyword_list))
+
+_index_lock = threading.Lock()
+# index_path -> ((mtime_ns, size) of the source file, automaton)
+_loaded_indexes: Dict[str, Tuple[Tuple[int, int], KeywordAutomaton]] = {}
+
+def _file_hash(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+def load_keyword_index(
+    index_path: str, source_path: str, load_keywords: Callable[[], List[str]]
+) -> KeywordAutomaton:
+    """Returns the keyword automaton for a dictionary file, memory-mapped from index_path.
+
+    The index is rebuilt (by calling load_keywords) only when the SHA-256 of source_path differs
+    from the one stored in the index. Within a process the result is reused until the source
+    file's mtime or size changes. If the index cannot be written, the in-memory automaton is used.
+    """
+    stat = os.stat(source_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        loaded = _loaded_indexes.get(index_path)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+        source_hash = _file_hash(source_path)
+        automaton = KeywordAutomaton.load(index_path, source_hash)
+        if automaton is None:
+            automaton = KeywordAutomaton(load_keywords())
+            try:
+                automaton.save(index_path, source_hash)
+                automaton = KeywordAutomaton.load(index_path, source_hash) or automaton
+            except OSError:
+                pass
+        _loaded_indexes[index_path] = (stamp, automaton)
+        return automaton
+
+def find_covered_positions(ranges: List[Tuple[int, int, str]]) -> Set[int]:
+    """Start positions of ranges that lose to an overlapping range, in O(n log n).
+
+    Of every pair of ranges where the later one starts before the earlier one's end, the shorter
+    range (the earlier one on a tie) is dropped; this finds them without enumerating the pairs.
+    ranges must be sorted by start position.
+    """
+    starts = [r[0] for r in ranges]
+    lengths = [len(r[2]) for r in ranges]
+    covered = set()
+
+    # sparse table for the longest match among ranges[lo:hi]
+    table = [lengths]
+    width = 1
+    while 2 * width <= len(ranges):
+        prev = table[-1]
+        table.append([max(prev[i], prev[i + width]) for i in range(len(prev) - width)])
+        width *= 2
+
+    # a range is dropped by any later range starting inside it that is at least as long
+    for i, (start, end, _) in enumerate(ranges):
+        lo = i + 1
+        hi = bisect_left(starts, end, lo)
+        if lo < hi:
+            level = (hi - lo).bit_length() - 1
+            if max(table[level][lo], table[level][hi - (1 << level)]) >= lengths[i]:
+                covered.add(start)
+
+    # ... and by any earlier range still open at its start that is longer
+    open_ranges: List[Tuple[int, int]] = []
+    for j, (start, end, _) in enumerate(ranges):
+        while open_ranges and open_ranges[0][1] <= start:
+            heapq.heappop(open_ranges)
+        if open_ranges and -open_ranges[0][0] > lengths[j]:
+            covered.add(start)
+        heapq.heappush(open_ranges, (-lengths[j], end))
+    return covered
 
 def get_unique_candidates(positions_matches: Dict[int, List[str]]) -> List[str]:
-    unique_candidates = []
+    unique_candidates = {}
     for v in positions_matches.values():
-        if len(v) == 1:
-            if v[0] not in unique_candidates:
-                unique_candidates.append(v[0])
-        else:
-            longest = max(v, key=len)
-            if longest not in unique_candidates:
-                unique_candidates.append(longest)
-    return unique_candidates
+        unique_candidates.setdefault(v[0] if len(v) == 1 else max(v, key=len))
+    return list(unique_candidates)
 
 def filter_candidates(unique_candidates: List[str], names: Set[str]) -> List[str]:
-    to_remove = [c for c in unique_candidates if len(c) == 1 and c not in names]
-    for c in unique_candidates:
-        if c not in to_remove:
-            for name in names:
-                if c in name and c != name:
-                    to_remove.append(c)
-                    break
+    """Drops one-character candidates that are not tokens and candidates that are part of a longer token.
+
+    Candidates contained in a token are found with one automaton pass per token instead of
+    testing every candidate against every token.
+    """
+    to_remove = {c for c in unique_candidates if len(c) == 1 and c not in names}
+    automaton = KeywordAutomaton(unique_candidates)
+    for name in names:
+        for _, c in automaton.iter_matches(name):
+            if c != name:
+                to_remove.add(c)
     return [u for u in unique_candidates if u not in to_remove]
 
+def _match_with(
+    sentence: str, automaton: KeywordAutomaton, tokenizer_type: str, tokenizer_args: Dict[str, Any]
+) -> List[str]:
+    sentence_splits = get_tokenizer_registry().tokenize(sentence, tokenizer_type, **tokenizer_args)
+    names = get_tokenizer_names(sentence_splits, tokenizer_type)
+
+    positions_matches = automaton.find_positions(sentence)
+    ranges = sorted(
+        [
+            (k, k + len(max(v, key=len)) - 1, max(v, key=len))
+            for k, v in positions_matches.items()
+        ],
+        key=lambda x: x[0],
+    )
+    for k in find_covered_positions(ranges):
+        positions_matches.pop(k, None)
+
+    unique_candidates = get_unique_candidates(positions_matches)
+
+    return filter_candidates(unique_candidates, names)
+
+def _resolve_automaton(
+    keyword_list: Optional[List[str]], keyword_index: Optional[KeywordAutomaton]
+) -> KeywordAutomaton:
+    if (keyword_list is None) == (keyword_index is None):
+        raise ValueError("Specify exactly one of keyword_list and keyword_index")
+    return keyword_index if keyword_index is not None else get_keyword_automaton(keyword_list)
+
 def match_keywords(
     sentence: str,
     *,
-    keyword_list: List[str],
+    keyword_list: Optional[List[str]] = None,
+    keyword_index: Optional[KeywordAutomaton] = None,
     tokenizer_type: str = "nagisa",
     **tokenizer_args,
 ) -> List[str]:
@@ -73,29 +467,109 @@ def match_keywords(
     Args:
         sentence (str): The input sentence in which to search for keywords.
         keyword_list (List[str]): A list of keywords to match in the sentence.
+        keyword_index (KeywordAutomaton, optional): A prebuilt index (e.g. from load_keyword_index)
+            to use instead of keyword_list.
         tokenizer_type (str, optional): The type of tokenizer to use. Defaults to "nagisa".
         **tokenizer_args: Additional arguments to pass to the tokenizer.
     Returns:
         List[str]: A list of matched keywords found in the sentence.
     """
-    tokenizer: WordTokenizer = WordTokenizer(tokenizer_type, **tokenizer_args)
+    automaton = _resolve_automaton(keyword_list, keyword_index)
+    return _match_with(sentence, automaton, tokenizer_type, tokenizer_args)
 
-    sentence_splits = tokenizer.tokenize(sentence)
-    names = get_tokenizer_names(sentence_splits, tokenizer_type)
+# Sentences sent to a worker at a time when the input has no len()
+DEFAULT_BATCH_CHUNKSIZE = 32
+# Chunks submitted ahead per worker; at most processes * this many chunks of the input are read but not yet yielded
+CHUNKS_IN_FLIGHT_PER_PROCESS = 2
 
-    possible_matches = find_possible_matches(sentence, keyword_list)
+# Per-process state of match_keywords_many workers: (automaton, tokenizer_type, tokenizer_args)
+_worker_state: Optional[Tuple[KeywordAutomaton, str, Dict[str, Any]]] = None
 
-    positions_matches = find_positions(sentence, possible_matches)
-    ranges = sorted(
-        [
-            (k, k + len(max(v, key=len)) - 1, max(v, key=len))
-            for k, v in positions_matches.items()
-        ],
-        key=lambda x: x[0],
-    )
-    overlapping_ranges = find_overlapping_ranges(ranges)
-    remove_overlapping_positions(positions_matches, overlapping_ranges)
-    
-    unique_candidates = get_unique_candidates(positions_matches)
+def _init_worker(
+    keywords: Tuple[str, ...], index: Optional[Tuple[str, bytes]],
+    tokenizer_type: str, tokenizer_args: Dict[str, Any],
+) -> None:
+    # Must not raise: Pool replaces a worker whose initializer fails, forever, and the tasks never run.
+    global _worker_state
+    # map the same index file as the parent so all workers share its pages
+    automaton = KeywordAutomaton.load(*index) if index is not None else None
+    if automaton is None:
+        # no index, or it was replaced after the parent checked it
+        automaton = _compile_keywords(keywords)
+    _worker_state = (automaton, tokenizer_type, tokenizer_args)
 
-    return filter_candidates(unique_candidates, names)
+def _match_chunk_in_worker(sentences: List[str]) -> List[List[str]]:
+    # the tokenizer is built by the first chunk, so a failure to build it reaches the caller as the task's error
+    automaton, tokenizer_type, tokenizer_args = _worker_state
+    return [_match_with(sentence, automaton, tokenizer_type, tokenizer_args) for sentence in sentences]
+
+def match_keywords_many(
+    sentences: Iterable[str],
+    *,
+    keyword_list: Optional[List[str]] = None,
+    keyword_index: Optional[KeywordAutomaton] = None,
+    tokenizer_type: str = "nagisa",
+    processes: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    **tokenizer_args,
+) -> Iterator[List[str]]:
+    """Matches keywords in many sentences across a process pool.
+    Each worker compiles the keyword automaton and builds the tokenizer once, then handles
+    sentences in chunks. Results are yielded in input order as they become available.
+    The input is read only CHUNKS_IN_FLIGHT_PER_PROCESS chunks per worker ahead of the results
+    that have been consumed, so a large lazy iterable is never held in memory at once.
+    Args:
+        sentences (Iterable[str]): The sentences to search. May be a lazy iterable.
+        keyword_list (List[str]): A list of keywords to match in the sentences.
+        keyword_index (KeywordAutomaton, optional): A prebuilt index to use instead of keyword_list.
+            Workers memory-map it when it is backed by a file.
+        tokenizer_type (str, optional): The type of tokenizer to use. Defaults to "nagisa".
+        processes (int, optional): Number of worker processes. Defaults to os.cpu_count();
+            1 runs in the calling process without a pool.
+        chunksize (int, optional): Sentences sent to a worker at a time.
+        **tokenizer_args: Additional arguments to pass to the tokenizer.
+    Yields:
+        List[str]: The matched keywords of each sentence, same as match_keywords. The order within
+            a list follows set iteration in the worker, so it can differ from the calling process
+            unless PYTHONHASHSEED is fixed.
+    """
+    automaton = _resolve_automaton(keyword_list, keyword_index)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for sentence in sentences:
+            yield _match_with(sentence, automaton, tokenizer_type, tokenizer_args)
+        return
+
+    if chunksize is None:
+        if isinstance(sentences, Sized):
+            chunksize = max(1, -(-len(sentences) // (processes * 4)))
+        else:
+            chunksize = DEFAULT_BATCH_CHUNKSIZE
+
+    index = (automaton.path, automaton.source_hash) if automaton.path is not None else None
+    if index is not None and KeywordAutomaton.load(*index) is None:
+        # the file has since been rebuilt for another source or removed; workers compile the keywords instead
+        index = None
+    keywords = tuple(automaton.keywords())
+    # spawn, not fork: the app process has running threads (DB writer, warm-ups) whose locks a fork would copy
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        processes, initializer=_init_worker, initargs=(keywords, index, tokenizer_type, tokenizer_args)
+    ) as pool:
+        # Pool.imap would read the whole input up front; submit chunks only as results are consumed
+        remaining = iter(sentences)
+        pending = deque()
+
+        def submit() -> bool:
+            chunk = list(islice(remaining, chunksize))
+            if chunk:
+                pending.append(pool.apply_async(_match_chunk_in_worker, (chunk,)))
+            return bool(chunk)
+
+        for _ in range(processes * CHUNKS_IN_FLIGHT_PER_PROCESS):
+            if not submit():
+                break
+        while pending:
+            results = pending.popleft().get()
+            submit()
+            yield from results
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+
+# これより短いテキストは圧縮しない（zlibのヘッダーの方が大きくなりやすいため）
+PAYLOAD_COMPRESS_MIN = 256
+# これより短いテキストは共有ブロブにせず、行に直接保存する（参照自体が65バイトあるため）
+PAYLOAD_BLOB_MIN = 256
+# 展開済みのブロブをプロセス内に保持する件数
+PAYLOAD_CACHE_SIZE = 1024
+
+# 保存形式の先頭1バイト。TEXT型の値は従来どおりの平文として扱う
+COMPRESSED_PREFIX = b"Z"  # zlibで圧縮したUTF-8テキスト
+REF_PREFIX = b"H"  # payload_blobsのハッシュ（SHA-256の16進表記）への参照
+
+StoredValue = Union[str, bytes, None]
+
+
+def content_hash(text: str) -> str:
+    """テキストの内容から決まるブロブのキー"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text: Optional[str]) -> StoredValue:
+    """テキストを保存形式にする（短いもの・縮まないものは平文のまま）"""
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    if len(raw) < PAYLOAD_COMPRESS_MIN:
+        return text
+    compressed = COMPRESSED_PREFIX + zlib.compress(raw, 6)
+    return compressed if len(compressed) < len(raw) else text
+
+
+def make_ref(digest: str) -> bytes:
+    return REF_PREFIX + digest.encode("ascii")
+
+
+def ref_hash(value: StoredValue) -> Optional[str]:
+    """値がブロブへの参照ならハッシュを返す"""
+    if isinstance(value, bytes) and value[:1] == REF_PREFIX:
+        return value[1:].decode("ascii")
+    return None
+
+
+def decompress_value(value: StoredValue) -> Optional[str]:
+    """compress_textで保存した値を元のテキストに戻す（参照は解決しない）"""
+    if value is None or isinstance(value, str):
+        return value
+    if value[:1] == COMPRESSED_PREFIX:
+        return zlib.decompress(value[1:]).decode("utf-8")
+    if value[:1] == REF_PREFIX:
+        raise ValueError("ブロブへの参照はpayload_blobsから解決する必要があります")
+    raise ValueError(f"未対応の保存形式です: {value[:1]!r}")
+
+
+class PayloadBlobCache:
+    """展開済みのブロブのLRUキャッシュ
+
+    ブロブは内容のハッシュをキーとしていて変更されないため、無効化は不要。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PayloadBlobCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(digest)
+            if text is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self._hits += 1
+            return text
+
+    def put(self, digest: str, text: str):
+        with self._lock:
+            self._entries[digest] = text
+            self._entries.move_to_end(digest)
+            while len(self._entries) > PAYLOAD_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+def get_payload_blob_cache() -> PayloadBlobCache:
+    """プロセス共有のPayloadBlobCacheを取得する"""
+    return PayloadBlobCache()
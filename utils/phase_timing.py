@@ -0,0 +1,150 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+# 接続確立までのフェーズ（名前 -> 記録するキー）
+CONNECTION_PHASES = ("dns", "connect", "proxy_connect", "tls")
+
+_local = threading.local()
+_connect_lock = threading.Lock()
+_connects = 0
+
+
+class PhaseTimings:
+    """1回の送信で計測したフェーズごとの所要時間（秒）"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {phase: 0.0 for phase in CONNECTION_PHASES}
+
+    def add(self, phase: str, seconds: float):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + max(seconds, 0.0)
+
+    def connection_seconds(self) -> float:
+        """接続確立にかかった時間の合計"""
+        return sum(self.seconds[phase] for phase in CONNECTION_PHASES)
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        """`<phase>_ms` をキーとするミリ秒単位のdictを返す"""
+        return {f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in self.seconds.items()}
+
+
+@contextmanager
+def collect_phases():
+    """このスレッドで行う接続のフェーズごとの時間を計測する"""
+    timings = PhaseTimings()
+    previous = getattr(_local, "timings", None)
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def _current() -> Optional[PhaseTimings]:
+    return getattr(_local, "timings", None)
+
+
+def _record(phase: str, seconds: float):
+    timings = _current()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def connection_count() -> int:
+    """計測対象のコネクションで新たにTCP接続した回数"""
+    with _connect_lock:
+        return _connects
+
+
+class _TimedConnectionMixin:
+    """名前解決・TCP接続・プロキシのCONNECTにかかった時間を記録する"""
+
+    def _new_conn(self):
+        global _connects
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        except OSError:
+            # 名前解決のエラーはurllib3の例外に変換させる
+            addresses = [host]
+        resolved = time.perf_counter()
+        _record("dns", resolved - start)
+
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except NewConnectionError as e:
+                    error = e
+            else:
+                raise error
+        finally:
+            self._dns_host = host
+
+        _record("connect", time.perf_counter() - resolved)
+        with _connect_lock:
+            _connects += 1
+        return sock
+
+    def _tunnel(self):
+        start = time.perf_counter()
+        super()._tunnel()
+        _record("proxy_connect", time.perf_counter() - start)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        timings = _current()
+        before = timings.connection_seconds() if timings is not None else 0.0
+        start = time.perf_counter()
+        super().connect()
+        if timings is not None:
+            # 接続全体の時間から名前解決・TCP接続・CONNECTを除いた残りがTLSハンドシェイク
+            elapsed = time.perf_counter() - start
+            timings.add("tls", elapsed - (timings.connection_seconds() - before))
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+TIMED_POOL_CLASSES = {
+    "http": TimedHTTPConnectionPool,
+    "https": TimedHTTPSConnectionPool,
+}
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """接続フェーズを計測するコネクションを使うHTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKSプロキシは専用のコネクションクラスを使うため対象外
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+        return manager
@@ -0,0 +1,196 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+
+# ヘルスチェックの間隔（秒）
+PROBE_INTERVAL = 15.0
+# ヘルスチェックのタイムアウト（秒）
+PROBE_TIMEOUT = 5.0
+# 失敗したプロキシを候補から外す時間（秒）
+EJECT_COOLDOWN = 60.0
+# レイテンシの指数移動平均の重み
+LATENCY_EWMA_ALPHA = 0.3
+
+# プロキシ自体への接続失敗とみなす例外
+PROXY_FAILURES = (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout)
+# 非同期トランスポート（httpx）での同じ例外
+ASYNC_PROXY_FAILURES = (httpx.ProxyError, httpx.ConnectTimeout)
+
+
+class ProxyState:
+    """プロキシ1件分のヘルスチェック結果"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.ejected_until = 0.0
+        self.failures = 0
+        self.last_checked: Optional[float] = None
+        self.last_error = ""
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def record_latency(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = LATENCY_EWMA_ALPHA * seconds + (1 - LATENCY_EWMA_ALPHA) * self.latency
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "proxy_url": self.url,
+            "healthy": self.is_available(now),
+            "latency_ms": self.latency * 1000 if self.latency is not None else None,
+            "failures": self.failures,
+            "ejected_for": max(self.ejected_until - now, 0.0),
+            "last_error": self.last_error,
+        }
+
+
+class ProxyPool:
+    """ターゲットURLごとのプロキシ一覧とヘルスチェック
+
+    バックグラウンドスレッドで各プロキシ経由のレイテンシを定期的に計測し、
+    リクエストは利用可能なプロキシのうち最も速いものから順に試す。
+    接続に失敗したプロキシはEJECT_COOLDOWNの間、候補の末尾に回す。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProxyPool, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._proxies: Dict[str, List[ProxyState]] = {}
+        self._wakeup = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def configure(self, target_url: str, proxy_urls: List[str]):
+        """target_urlで使うプロキシ一覧を設定する（計測済みの状態は引き継ぐ）"""
+        urls = list(dict.fromkeys(url for url in proxy_urls if url))
+        with self._lock:
+            current = self._proxies.get(target_url, [])
+            if [state.url for state in current] == urls:
+                return
+            known = {state.url: state for state in current}
+            if urls:
+                self._proxies[target_url] = [known.get(url) or ProxyState(url) for url in urls]
+            else:
+                self._proxies.pop(target_url, None)
+        if urls:
+            self._ensure_prober()
+            self._wakeup.set()
+
+    def candidates(self, target_url: str, default: str = "") -> List[str]:
+        """リクエストに使うプロキシを試す順に返す
+
+        利用可能なものをレイテンシの昇順に並べ、除外中のものは復帰が近い順に末尾へ回す。
+        プロキシ一覧が設定されていなければ[default]を返す。
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = list(self._proxies.get(target_url, []))
+        if not states:
+            return [default]
+        available = [s for s in states if s.is_available(now)]
+        ejected = [s for s in states if not s.is_available(now)]
+        available.sort(key=lambda s: s.latency if s.latency is not None else float("inf"))
+        ejected.sort(key=lambda s: s.ejected_until)
+        return [s.url for s in available + ejected]
+
+    def select(self, target_url: str, default: str = "") -> str:
+        """現在最も速い利用可能なプロキシを返す"""
+        return self.candidates(target_url, default)[0]
+
+    def _find(self, target_url: str, proxy_url: str) -> Optional[ProxyState]:
+        for state in self._proxies.get(target_url, []):
+            if state.url == proxy_url:
+                return state
+        return None
+
+    def record_success(self, target_url: str, proxy_url: str, latency: Optional[float] = None):
+        with self._lock:
+            state = self._find(target_url, proxy_url)
+            if state is None:
+                return
+            state.failures = 0
+            state.ejected_until = 0.0
+            state.last_error = ""
+            if latency is not None:
+                state.record_latency(latency)
+
+    def record_failure(self, target_url: str, proxy_url: str, error: Exception):
+        """接続に失敗したプロキシを一定時間候補から外す"""
+        with self._lock:
+            state = self._find(target_url, proxy_url)
+            if state is None:
+                return
+            state.failures += 1
+            state.ejected_until = time.monotonic() + EJECT_COOLDOWN
+            state.last_error = str(error)
+
+    def _ensure_prober(self):
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="proxy-prober", daemon=True)
+            self._prober.start()
+
+    def _probe(self, target_url: str, proxy_url: str):
+        """プロキシ経由でターゲットURLに接続し、応答までの時間を計測する
+
+        HTTPステータスに関わらず応答が返ればプロキシは正常とみなす。
+        """
+        start = time.monotonic()
+        try:
+            response = requests.head(
+                target_url,
+                proxies={"http": proxy_url, "https": proxy_url},
+                timeout=PROBE_TIMEOUT,
+                allow_redirects=False
+            )
+            response.close()
+        except requests.RequestException as e:
+            self.record_failure(target_url, proxy_url, e)
+        else:
+            self.record_success(target_url, proxy_url, time.monotonic() - start)
+        finally:
+            with self._lock:
+                state = self._find(target_url, proxy_url)
+                if state is not None:
+                    state.last_checked = time.time()
+
+    def _probe_loop(self):
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                targets = [
+                    (target_url, state.url)
+                    for target_url, states in self._proxies.items()
+                    for state in states
+                ]
+            for target_url, proxy_url in targets:
+                self._probe(target_url, proxy_url)
+            self._wakeup.wait(PROBE_INTERVAL)
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """ターゲットURLごとのプロキシの状態を取得する"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                target_url: [state.snapshot(now) for state in states]
+                for target_url, states in self._proxies.items()
+            }
+
+
+def get_proxy_pool() -> ProxyPool:
+    """プロセス共有のProxyPoolを取得する"""
+    return ProxyPool()
@@ -0,0 +1,311 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import requests
+
+# バックエンドごとの通信設定のデフォルト値
+DEFAULT_RESILIENCE_SETTINGS = {
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "deadline": 60.0,
+    "max_retries": 2,
+    "backoff_base": 0.5,
+    "backoff_max": 8.0,
+    "retry_post": False,
+    "breaker_failure_threshold": 5,
+    "breaker_reset_timeout": 30.0,
+    "hedge_enabled": False,
+    "hedge_percentile": 95.0,
+    "hedge_max_ratio": 0.1,
+    "compress_requests": True,
+}
+
+# リトライ対象のステータスコード
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+# 冪等なHTTPメソッド
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているためリクエストを送信しなかった"""
+
+
+class DeadlineExceededError(Exception):
+    """リクエスト全体の制限時間を超過した"""
+
+
+class RetryPolicy:
+    """タイムアウト・リトライ・制限時間の設定"""
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        merged = {**DEFAULT_RESILIENCE_SETTINGS, **(settings or {})}
+        self.connect_timeout = float(merged["connect_timeout"])
+        self.read_timeout = float(merged["read_timeout"])
+        self.deadline = float(merged["deadline"])
+        self.max_retries = int(merged["max_retries"])
+        self.backoff_base = float(merged["backoff_base"])
+        self.backoff_max = float(merged["backoff_max"])
+        self.retry_post = bool(merged["retry_post"])
+        self.breaker_failure_threshold = int(merged["breaker_failure_threshold"])
+        self.breaker_reset_timeout = float(merged["breaker_reset_timeout"])
+        self.hedge_enabled = bool(merged["hedge_enabled"])
+        self.hedge_percentile = float(merged["hedge_percentile"])
+        self.hedge_max_ratio = float(merged["hedge_max_ratio"])
+        self.compress_requests = bool(merged["compress_requests"])
+
+    def is_retryable(self, method: str, retryable: Optional[bool] = None) -> bool:
+        """リトライしてよい呼び出しかどうか（明示指定がなければメソッドの冪等性で判断）"""
+        if retryable is not None:
+            return retryable
+        return method.upper() in IDEMPOTENT_METHODS or (method.upper() == "POST" and self.retry_post)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """attempt回目のリトライ前の待ち時間（full jitter付き指数バックオフ）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def timeout(self, remaining: float):
+        """残り時間を超えない(connect, read)タイムアウトを返す"""
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+
+class CircuitBreaker:
+    """target_url単位のサーキットブレーカー
+
+    連続してfailure_threshold回失敗すると開き（open）、reset_timeoutの間は即座に失敗させる。
+    経過後は1件だけ試行を通し（half_open）、成功すれば閉じ、失敗すれば再び開く。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """リクエストを送信してよいか判定する"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "rejected": self.rejected,
+            }
+
+
+class CircuitBreakerRegistry:
+    """プロセス共有のサーキットブレーカー一覧（target_urlごと）"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CircuitBreakerRegistry, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, target_url: str, policy: RetryPolicy) -> CircuitBreaker:
+        """target_urlのブレーカーを取得する（設定はpolicyの値に追従する）"""
+        with self._lock:
+            breaker = self._breakers.get(target_url)
+            if breaker is None:
+                breaker = CircuitBreaker(policy.breaker_failure_threshold, policy.breaker_reset_timeout)
+                self._breakers[target_url] = breaker
+            breaker.failure_threshold = policy.breaker_failure_threshold
+            breaker.reset_timeout = policy.breaker_reset_timeout
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {url: breaker.snapshot() for url, breaker in breakers.items()}
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """プロセス共有のCircuitBreakerRegistryを取得する"""
+    return CircuitBreakerRegistry()
+
+
+def _retry_after(response) -> Optional[float]:
+    """Retry-Afterヘッダー（秒数指定のみ）を読み取る"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _RetryState:
+    """send_with_retry / asend_with_retry の1回の呼び出しにおける制限時間・試行回数の管理"""
+
+    def __init__(self, policy: RetryPolicy, breaker: CircuitBreaker, retryable: bool):
+        self.policy = policy
+        self.breaker = breaker
+        self.retryable = retryable
+        self.deadline = time.monotonic() + policy.deadline
+        self.attempt = 0
+
+    def next_timeout(self):
+        """次の試行の(connect, read)タイムアウトを返す
+
+        Raises:
+            DeadlineExceededError: 制限時間を過ぎた場合
+            CircuitOpenError: ブレーカーが開いている場合
+        """
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"制限時間（{self.policy.deadline:.0f}秒）を超過しました")
+        if not self.breaker.allow():
+            raise CircuitOpenError("バックエンドが一時的に利用できません（サーキットブレーカー作動中）")
+        return self.policy.timeout(remaining)
+
+    def next_delay(self, response=None, error: Optional[BaseException] = None) -> Optional[float]:
+        """試行の結果をブレーカーに記録し、次の試行までの待ち時間を返す
+
+        Returns:
+            float | None: 待ち時間。Noneの場合はresponseをそのまま返して終了する
+
+        Raises:
+            error: 接続エラーでリトライできない場合
+            DeadlineExceededError: 待つと制限時間を超える場合（レスポンスがない時のみ）
+        """
+        if error is not None:
+            self.breaker.record_failure()
+        else:
+            # 429はバックエンドの障害ではないためブレーカーの失敗には数えない
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if response.status_code not in RETRYABLE_STATUS:
+                return None
+
+        if not self.retryable or self.attempt >= self.policy.max_retries:
+            if response is not None:
+                return None
+            raise error
+
+        delay = _retry_after(response)
+        if delay is None:
+            delay = self.policy.backoff_delay(self.attempt)
+        if time.monotonic() + delay >= self.deadline:
+            if response is not None:
+                return None
+            raise DeadlineExceededError(f"制限時間（{self.policy.deadline:.0f}秒）内に接続できませんでした: {error}")
+        self.attempt += 1
+        return delay
+
+
+def send_with_retry(
+    send: Callable[[Any], requests.Response],
+    *,
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    retryable: bool,
+) -> requests.Response:
+    """タイムアウト・リトライ・制限時間・サーキットブレーカーを適用して送信する
+
+    Args:
+        send: (connect, read)タイムアウトを受け取りレスポンスを返す関数
+        policy: 適用するRetryPolicy
+        breaker: target_urlのCircuitBreaker
+        retryable: リトライしてよい呼び出しかどうか
+
+    Returns:
+        requests.Response: 最後に受信したレスポンス
+
+    Raises:
+        CircuitOpenError: ブレーカーが開いている場合
+        DeadlineExceededError: 制限時間内に応答を得られなかった場合
+        requests.RequestException: リトライしても接続できなかった場合
+    """
+    state = _RetryState(policy, breaker, retryable)
+    while True:
+        timeout = state.next_timeout()
+        response = None
+        try:
+            response = send(timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = state.next_delay(error=e)
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            delay = state.next_delay(response)
+        if delay is None:
+            return response
+        time.sleep(delay)
+
+
+async def asend_with_retry(
+    send: Callable[[Any], Awaitable[httpx.Response]],
+    *,
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    retryable: bool,
+) -> httpx.Response:
+    """send_with_retry の非同期版（sendは(connect, read)タイムアウトを受け取るコルーチン関数）
+
+    Raises:
+        CircuitOpenError: ブレーカーが開いている場合
+        DeadlineExceededError: 制限時間内に応答を得られなかった場合
+        httpx.TransportError: リトライしても接続できなかった場合
+    """
+    state = _RetryState(policy, breaker, retryable)
+    while True:
+        timeout = state.next_timeout()
+        response = None
+        try:
+            response = await send(timeout)
+        except httpx.TransportError as e:
+            delay = state.next_delay(error=e)
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            delay = state.next_delay(response)
+        if delay is None:
+            return response
+        await asyncio.sleep(delay)
@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.db_utils import load_cached_response, save_cached_response, clear_response_cache
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+def make_cache_key(payload: Dict[str, Any], target_url: str) -> str:
+    """ペイロードとURLからキャッシュキーを作成する
+
+    キーの順序や空白の違いで別エントリにならないよう、ペイロードを正規化したJSONでハッシュ化する。
+    """
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    source = f"{target_url.rstrip('/')}\n{canonical}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Simple Q&Aのレスポンスキャッシュ
+
+    メモリ上のLRU（TTL付き）と、config.dbのresponse_cacheテーブルによる永続化層の2段構成。
+    プロセス内のすべてのStreamlitセッションで共有する。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResponseCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.ttl = DEFAULT_TTL
+        self.max_entries = DEFAULT_MAX_ENTRIES
+        self._counters = {
+            "memory_hits": 0,
+            "sqlite_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _remember(self, key: str, stored_at: float, response: Dict[str, Any]):
+        """メモリ層に登録し、上限を超えた古いエントリを追い出す"""
+        with self._lock:
+            self._entries[key] = (stored_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """キャッシュからレスポンスを取得する（見つからない場合はNone）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, response = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return copy.deepcopy(response)
+                del self._entries[key]
+
+        try:
+            cached = load_cached_response(key, now - self.ttl)
+        except Exception:
+            cached = None
+        if cached is None:
+            self._count("misses")
+            return None
+
+        # 保存した時刻のままメモリ層に載せる（読み込んだ時刻にするとTTLを過ぎても返し続けてしまう）
+        response, created_at = cached
+        self._count("sqlite_hits")
+        self._remember(key, created_at, response)
+        return copy.deepcopy(response)
+
+    def put(self, key: str, url: str, response: Dict[str, Any], status_code: Optional[int] = None):
+        """レスポンスをキャッシュに保存する
+
+        回答を含む成功レスポンスのみ保存する（エラーや2xx以外のステータスの本文は保存しない）。
+        status_codeが不明（None）の場合は本文のみで判断する。
+        """
+        if not isinstance(response, dict) or response.get("error") or not response.get("answer"):
+            return
+        if status_code is not None and not 200 <= status_code < 300:
+            return
+        now = time.time()
+        response = copy.deepcopy(response)
+        self._remember(key, now, response)
+        self._count("stores")
+        try:
+            save_cached_response(key, url, response, now, prune_before=now - self.ttl)
+        except Exception:
+            # 永続化に失敗してもメモリ層のキャッシュは有効
+            pass
+
+    def record_bypass(self):
+        """キャッシュを使わずに送信したリクエストを記録する"""
+        self._count("bypassed")
+
+    def clear(self):
+        """メモリ層と永続化層のキャッシュを削除する"""
+        with self._lock:
+            self._entries.clear()
+        clear_response_cache()
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット/ミスの統計情報を取得する"""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = len(self._entries)
+        hits = counters["memory_hits"] + counters["sqlite_hits"]
+        lookups = hits + counters["misses"]
+        counters["hits"] = hits
+        counters["hit_ratio"] = hits / lookups if lookups else 0.0
+        return counters
+
+
+def get_response_cache() -> ResponseCache:
+    """プロセス共有のResponseCacheを取得する"""
+    return ResponseCache()
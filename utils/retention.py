@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.db_utils import archive_old_requests
+
+# 保存期間（日数）の設定キー。0はアーカイブしない
+RETENTION_SETTING_KEY = "request_retention_days"
+DEFAULT_RETENTION_DAYS = 0
+# 自動でアーカイブを実行する間隔（秒）
+RETENTION_CHECK_INTERVAL = 6 * 60 * 60
+
+
+class RetentionManager:
+    """保存期間を過ぎた履歴のアーカイブを定期的にバックグラウンドで実行する"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RetentionManager, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_started: Optional[float] = None
+        self._last_finished: Optional[float] = None
+        self._last_result: Optional[Dict[str, Any]] = None
+        self._last_error = ""
+
+    def maybe_run(self, retention_days: int) -> bool:
+        """前回の実行からRETENTION_CHECK_INTERVALが経っていればバックグラウンドで実行する
+
+        Returns:
+            bool: 実行を開始したか
+        """
+        retention_days = int(retention_days or 0)
+        if retention_days < 1:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if self._last_started is not None and time.monotonic() - self._last_started < RETENTION_CHECK_INTERVAL:
+                return False
+            self._last_started = time.monotonic()
+            self._thread = threading.Thread(
+                target=self._run_in_background, args=(retention_days,), name="history-retention", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def run(self, retention_days: int) -> Dict[str, Any]:
+        """アーカイブを今すぐ実行する（呼び出し元のスレッドで実行する）"""
+        with self._lock:
+            self._last_started = time.monotonic()
+        try:
+            result = archive_old_requests(int(retention_days))
+        except Exception as e:
+            self._record(None, str(e))
+            raise
+        self._record(result, "")
+        return result
+
+    def _run_in_background(self, retention_days: int):
+        try:
+            self.run(retention_days)
+        except Exception:
+            # エラーは status() の last_error で確認する
+            pass
+
+    def _record(self, result: Optional[Dict[str, Any]], error: str):
+        with self._lock:
+            self._last_finished = time.time()
+            self._last_result = result
+            self._last_error = error
+
+    def status(self) -> Dict[str, Any]:
+        """直近の実行結果を取得する"""
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "last_finished": self._last_finished,
+                "last_result": self._last_result,
+                "last_error": self._last_error,
+            }
+
+
+def get_retention_manager() -> RetentionManager:
+    """プロセス共有のRetentionManagerを取得する"""
+    return RetentionManager()